@@ -0,0 +1,199 @@
+"""
+Helper functies voor analyses over de getypeerde tabbladen
+Zet voeding, activiteiten en stappen één keer per data versie in een in-memory
+SQLite database met een index op datum, en biedt vaste queries voor dagtotalen,
+periode-statistieken, statistieken per oefening en vergelijkingen met een vorige
+periode. Een periode-query is dan een index range scan in plaats van filteren en
+groeperen in pandas bij elke rerun
+"""
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import calorie_helper
+import schema_helper
+
+# Kolommen per tabel (naast 'day'); ontbrekende kolommen worden NULL
+TABLE_COLUMNS: Dict[str, List[str]] = {
+    'voeding': ['maaltijd', 'calorien', 'eiwit', 'koolhydraten', 'vetten', 'vezels'],
+    'activiteiten': ['activiteit', 'type', 'gewicht', 'afstand', 'duur_sec', 'sets', 'reps', 'calories_burned'],
+    'stappen': ['stappen', 'cardio'],
+}
+
+# Volume van een krachtoefening: gewicht × sets × reps (sets en reps als geheel getal)
+_VOLUME_SQL = ("COALESCE(gewicht, 0) * COALESCE(CAST(sets AS INTEGER), 0) * "
+               "COALESCE(CAST(reps AS INTEGER), 0)")
+
+def _day_text(value) -> str:
+    """Datum (string, date of datetime) als ISO tekst, zoals in de 'day' kolommen"""
+    return schema_helper.to_day(value).strftime('%Y-%m-%d')
+
+def _records(df: Optional[pd.DataFrame], columns: List[str]) -> List[tuple]:
+    """Rijen (day, kolommen...) met None voor lege waarden, in de volgorde van de DataFrame"""
+    if df is None or df.empty or 'datum' not in df.columns:
+        return []
+    days = schema_helper.date_values(df)
+    table = pd.DataFrame({'day': days.dt.strftime('%Y-%m-%d')}, index=df.index)
+    for col in columns:
+        table[col] = df[col] if col in df.columns else np.nan
+    table = table.astype(object)
+    return list(table.where(table.notna(), None).itertuples(index=False, name=None))
+
+class AnalyticsDB:
+    """
+    In-memory SQLite database met voeding, activiteiten en stappen van één sheet
+
+    Activiteiten krijgen bij het laden hun verbrande calorieën (vectorized MET
+    engine, zie calorie_helper) zodat periode-queries die kunnen optellen. De
+    database is read-only na het bouwen en kan door meerdere threads gebruikt worden.
+    """
+
+    def __init__(self, nutrition_df: Optional[pd.DataFrame], activities_df: Optional[pd.DataFrame],
+                 stappen_df: Optional[pd.DataFrame], gewicht_kg: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+        if activities_df is not None and not activities_df.empty:
+            activities_df = activities_df.copy()
+            activities_df['calories_burned'] = calorie_helper.estimate_calories_frame(activities_df, gewicht_kg)
+
+        frames = {'voeding': nutrition_df, 'activiteiten': activities_df, 'stappen': stappen_df}
+        with self._conn:
+            for table, columns in TABLE_COLUMNS.items():
+                self._conn.execute(f"CREATE TABLE {table} (day TEXT, {', '.join(columns)})")
+                self._conn.execute(f"CREATE INDEX {table}_by_day ON {table} (day)")
+                placeholders = ', '.join('?' * (len(columns) + 1))
+                self._conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})",
+                                       _records(frames[table], columns))
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        """Voer een query uit en geef het resultaat als DataFrame terug"""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def _one(self, sql: str, params: tuple = ()) -> tuple:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def daily_totals(self, start, end) -> pd.DataFrame:
+        """Voeding per dag (macro's en aantal maaltijden), met een DatetimeIndex 'datum_dt'"""
+        daily = self.query("""
+            SELECT day, SUM(calorien) AS calorien, SUM(eiwit) AS eiwit,
+                   SUM(koolhydraten) AS koolhydraten, SUM(vetten) AS vetten,
+                   SUM(vezels) AS vezels, COUNT(*) AS maaltijden
+            FROM voeding WHERE day BETWEEN ? AND ? GROUP BY day ORDER BY day
+        """, (_day_text(start), _day_text(end)))
+        daily.index = pd.DatetimeIndex(pd.to_datetime(daily.pop('day')), name='datum_dt')
+        return daily.fillna(0)
+
+    def period_totals(self, start, end, activity_type: Optional[str] = None) -> Dict[str, float]:
+        """
+        Totalen van de activiteiten in een periode (optioneel alleen 'Cardio' of 'Kracht')
+
+        Returns:
+            Dict met sessions, distance (km), duration_sec, calories en volume (kg)
+        """
+        sql = f"""
+            SELECT COUNT(*), COALESCE(SUM(afstand), 0), COALESCE(SUM(duur_sec), 0),
+                   COALESCE(SUM(calories_burned), 0), COALESCE(SUM({_VOLUME_SQL}), 0)
+            FROM activiteiten WHERE day BETWEEN ? AND ?"""
+        params = (_day_text(start), _day_text(end))
+        if activity_type:
+            sql += " AND type = ?"
+            params += (activity_type,)
+        sessions, distance, duration, calories, volume = self._one(sql, params)
+        return {'sessions': sessions, 'distance': distance, 'duration_sec': duration,
+                'calories': calories, 'volume': volume}
+
+    def compare_periods(self, start, end, prev_start, prev_end,
+                        activity_type: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """`period_totals` van een periode en van de vorige periode, plus het verschil"""
+        current = self.period_totals(start, end, activity_type)
+        previous = self.period_totals(prev_start, prev_end, activity_type)
+        change = {key: current[key] - previous[key] for key in current}
+        return {'current': current, 'previous': previous, 'change': change}
+
+    def exercise_stats(self, start, end, activity_type: Optional[str] = None) -> pd.DataFrame:
+        """
+        Statistieken per oefening in een periode, in volgorde van eerste keer gedaan
+
+        Kolommen: activiteit, count, max_weight, total_volume, distance, duration_sec, calories
+        """
+        sql = f"""
+            SELECT activiteit, COUNT(*) AS count, MAX(COALESCE(gewicht, 0)) AS max_weight,
+                   SUM({_VOLUME_SQL}) AS total_volume, COALESCE(SUM(afstand), 0) AS distance,
+                   COALESCE(SUM(duur_sec), 0) AS duration_sec,
+                   COALESCE(SUM(calories_burned), 0) AS calories
+            FROM activiteiten WHERE day BETWEEN ? AND ?"""
+        params = (_day_text(start), _day_text(end))
+        if activity_type:
+            sql += " AND type = ?"
+            params += (activity_type,)
+        sql += " GROUP BY activiteit ORDER BY MIN(rowid)"
+        return self.query(sql, params)
+
+    def period_stats(self, start, end, with_steps: bool = True) -> Dict[str, Any]:
+        """
+        Statistieken van een periode, zoals het dashboard ze toont
+
+        Cardio sessies zijn het aantal activiteiten van type 'Cardio'; als er stappen
+        data in de periode is (en `with_steps`), het aantal unieke dagen met een cardio
+        activiteit of met cardio 'ja' in de stappen.
+        """
+        start_day, end_day = _day_text(start), _day_text(end)
+        days = (schema_helper.to_day(end) - schema_helper.to_day(start)).days + 1
+        stats = {
+            'days': days,
+            'total_calories': 0,
+            'avg_calories': 0,
+            'total_protein': 0,
+            'avg_protein': 0,
+            'total_carbs': 0,
+            'total_fats': 0,
+            'total_calories_burned': 0,
+            'avg_calories_burned': 0,
+            'total_workouts': 0,
+            'cardio_sessions': 0,
+            'strength_sessions': 0
+        }
+
+        days_logged, total_cal, avg_cal, total_protein, avg_protein, total_carbs, total_fats = self._one("""
+            SELECT COUNT(*), SUM(calorien), AVG(calorien), SUM(eiwit), AVG(eiwit),
+                   SUM(koolhydraten), SUM(vetten)
+            FROM (SELECT COALESCE(SUM(calorien), 0) AS calorien, COALESCE(SUM(eiwit), 0) AS eiwit,
+                         COALESCE(SUM(koolhydraten), 0) AS koolhydraten, COALESCE(SUM(vetten), 0) AS vetten
+                  FROM voeding WHERE day BETWEEN ? AND ? GROUP BY day)
+        """, (start_day, end_day))
+        if days_logged:
+            stats.update({
+                'total_calories': total_cal,
+                'avg_calories': avg_cal,
+                'total_protein': total_protein,
+                'avg_protein': avg_protein,
+                'total_carbs': total_carbs,
+                'total_fats': total_fats,
+                'days_logged': days_logged,
+            })
+
+        totals = self.period_totals(start, end)
+        if totals['sessions']:
+            stats['total_calories_burned'] = totals['calories']
+            stats['avg_calories_burned'] = totals['calories'] / days
+            stats['total_workouts'] = totals['sessions']
+            stats['cardio_sessions'] = self.period_totals(start, end, 'Cardio')['sessions']
+
+            steps_rows = self._one("SELECT COUNT(*) FROM stappen WHERE day BETWEEN ? AND ?",
+                                   (start_day, end_day))[0]
+            if with_steps and steps_rows:
+                # Unieke cardio dagen uit activiteiten en uit de dagelijkse cardio indicator
+                stats['cardio_sessions'] = self._one("""
+                    SELECT COUNT(*) FROM (
+                        SELECT day FROM activiteiten WHERE day BETWEEN ? AND ? AND type = 'Cardio'
+                        UNION
+                        SELECT day FROM stappen WHERE day BETWEEN ? AND ? AND cardio = 'ja')
+                """, (start_day, end_day, start_day, end_day))[0]
+
+        return stats
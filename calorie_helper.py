@@ -0,0 +1,273 @@
+"""
+Helper functies voor het schatten van verbrande calorieën
+Bevat de MET berekening per activiteit en een vectorized variant die een hele
+DataFrame in één keer doorrekent (zelfde uitkomsten, zonder apply per rij)
+
+Benchmark: python calorie_helper.py [aantal_rijen]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+import schema_helper
+
+def _session_weight() -> float:
+    """Lichaamsgewicht uit de Streamlit sessie (default 106.2 kg)"""
+    import streamlit as st
+    return st.session_state.get('targets', {}).get('weight', 106.2)
+
+def estimate_calories_burned(activity_type, activiteit, afstand, duur, gewicht_kg=None, sets=None, reps=None, gewicht=None, methode=None):
+    """
+    Estimate calories burned based on activity type and duration
+    Using MET (Metabolic Equivalent of Task) values
+    Formula: Calories = MET × weight(kg) × time(hours)
+    
+    Args:
+        afstand: Distance in km (number, or text with decimal comma)
+        duur: Duration as seconds (typed 'duur_sec' column) or HH:MM:SS / MM:SS text
+        gewicht_kg: Body weight for calorie calculation
+        gewicht: Weight lifted (for strength training intensity adjustment)
+    """
+    # Use session state weight if not provided
+    if gewicht_kg is None:
+        gewicht_kg = _session_weight()
+
+    # Normalize string inputs to avoid AttributeError when calling .lower()
+    # Convert None to empty string and ensure consistent types
+    activity_type = '' if activity_type is None else str(activity_type)
+    activiteit = '' if activiteit is None else str(activiteit)
+    methode = None if methode is None else str(methode)
+
+    activity_type_l = activity_type.lower()
+    activiteit_l = activiteit.lower()
+    methode_l = methode.lower() if (methode is not None and methode != '') else None
+    
+    # Duration in hours (typed columns already hold seconds)
+    duur_sec = schema_helper.duration_seconds(duur)
+    hours = duur_sec / 3600 if pd.notna(duur_sec) else 0
+    
+    # For strength training without duration, estimate based on sets and reps
+    if hours == 0 and activity_type_l == 'kracht':
+        if pd.notna(sets) and pd.notna(reps):
+            try:
+                # Estimate: 5-6 seconds per rep (controlled movements) + 120 seconds rest between sets
+                total_sets = int(float(sets))
+                total_reps = int(float(reps))
+                work_time = total_sets * total_reps * 5.5  # 5.5 seconds per rep (controlled tempo)
+                rest_time = (total_sets - 1) * 120  # 120 seconds rest between sets (more realistic)
+                # Add setup time: ~30 seconds per exercise
+                setup_time = 30
+                total_seconds = work_time + rest_time + setup_time
+                hours = total_seconds / 3600
+            except:
+                # Default estimate: 6 minutes per exercise (more realistic)
+                hours = 6 / 60
+        else:
+            # If no sets/reps data, estimate 6 minutes per exercise
+            hours = 6 / 60
+    
+    if hours == 0:
+        return 0
+    
+    # Distance if available
+    distance_km = schema_helper.to_number(afstand)
+    if pd.isna(distance_km):
+        distance_km = 0
+    
+    # MET values for different activities (more realistic)
+    met_values = {
+        # Cardio activities
+        'walking': 3.5,
+        'cross trainer': 7.0,  # Moderate to vigorous elliptical
+        'running': 9.0,
+        'cycling': 7.5,
+        'swimming': 7.0,
+        
+        # Strength training (Kracht) - Conservative values matching egym reality
+        'strength': 4.5,  # General weight lifting (moderate intensity)
+        'negative': 5.0,  # Negative reps slightly higher
+        'regular': 4.5   # Regular machine training
+    }
+    
+    # Determine MET value based on activity
+    met = 5.0  # Default (moderate intensity)
+    
+    if activity_type_l == 'cardio':
+        # activiteit_l already normalized above
+        if 'cross' in activiteit_l or 'elliptical' in activiteit_l:
+            met = 7.0  # Moderate to vigorous intensity
+        elif 'walk' in activiteit_l or 'wandel' in activiteit_l:
+            met = 3.5
+        elif 'run' in activiteit_l or 'hardlopen' in activiteit_l:
+            met = 9.0
+        elif 'cycle' in activiteit_l or 'fiets' in activiteit_l:
+            met = 7.5
+        elif 'zwem' in activiteit_l or 'swim' in activiteit_l:
+            met = 7.0
+        else:
+            # Estimate from distance if available
+            if distance_km > 0 and hours > 0:
+                speed = distance_km / hours
+                if speed < 5:  # Walking pace
+                    met = 3.5
+                elif speed < 8:  # Jogging
+                    met = 7.0
+                else:  # Running
+                    met = 9.0
+    
+    elif activity_type_l == 'kracht':
+        # Base MET for strength training (more conservative)
+        met = 4.5  # Moderate intensity weight training
+        
+        # Adjust based on method if available
+        if methode_l is not None:
+            if 'negative' in methode_l:
+                met = 5.0  # Higher intensity for negatives
+            elif 'regular' in methode_l:
+                met = 4.5  # Standard machine training
+        
+        # Bonus: If heavy weights are used, add small intensity multiplier
+        weight_used = schema_helper.to_number(gewicht)
+        if pd.notna(weight_used):
+            # If lifting > 60kg, add +0.3 MET (high intensity)
+            if weight_used > 60:
+                met += 0.3
+            # If lifting > 80kg, add another +0.2 MET (very high intensity)
+            if weight_used > 80:
+                met += 0.2
+    
+    # Calculate calories
+    calories = met * gewicht_kg * hours
+    
+    return round(calories)
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Kolom uit de DataFrame, of een lege (NaN) kolom als die ontbreekt"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(np.nan, index=df.index, dtype=float)
+
+def _to_numbers(series: pd.Series) -> pd.Series:
+    """Zelfde als schema_helper.to_number, maar voor een hele kolom"""
+    if pd.api.types.is_numeric_dtype(series) and series.dtype != bool:
+        return series.astype(float)
+    return series.map(schema_helper.to_number).astype(float)
+
+def estimate_calories_frame(activities: pd.DataFrame, gewicht_kg=None) -> pd.Series:
+    """
+    Vectorized `estimate_calories_burned` voor alle rijen van een activiteiten DataFrame
+
+    Gebruikt de getypeerde kolommen (afstand, duur_sec, sets, reps, gewicht) en geeft
+    per rij exact hetzelfde (afgeronde) aantal kcal terug als de functie per rij.
+
+    Returns:
+        Series (int) met dezelfde index als `activities`
+    """
+    if gewicht_kg is None:
+        gewicht_kg = _session_weight()
+    if activities.empty:
+        return pd.Series(0, index=activities.index, dtype=int)
+
+    # Zelfde normalisatie als str(...).lower(): ontbrekende waarden worden 'nan'
+    activity_type_l = _column(activities, 'type').astype(object).astype(str).str.lower()
+    activiteit_l = _column(activities, 'activiteit').astype(object).astype(str).str.lower()
+    methode = _column(activities, 'methode')
+    methode_l = methode.astype(object).astype(str).str.lower().where(methode.notna() & (methode != ''), '')
+
+    is_cardio = (activity_type_l == 'cardio').to_numpy()
+    is_kracht = (activity_type_l == 'kracht').to_numpy()
+
+    # Duur in uren (duur_sec als die er is, anders de tekst parsen)
+    if 'duur_sec' in activities.columns:
+        duur_sec = _to_numbers(activities['duur_sec'])
+    else:
+        duur_sec = _column(activities, 'duur').map(schema_helper.duration_seconds).astype(float)
+    hours = (duur_sec / 3600).fillna(0).to_numpy()
+
+    # Kracht zonder duur: schatting op basis van sets en reps, anders 6 minuten per oefening
+    sets = np.trunc(_to_numbers(_column(activities, 'sets')).to_numpy())
+    reps = np.trunc(_to_numbers(_column(activities, 'reps')).to_numpy())
+    has_sets_reps = ~np.isnan(sets) & ~np.isnan(reps)
+    strength_seconds = sets * reps * 5.5 + (sets - 1) * 120 + 30
+    strength_hours = np.where(has_sets_reps, strength_seconds / 3600, 6 / 60)
+    hours = np.where((hours == 0) & is_kracht, strength_hours, hours)
+
+    distance_km = np.nan_to_num(_to_numbers(_column(activities, 'afstand')).to_numpy(), nan=0.0)
+
+    # MET per rij, in dezelfde volgorde als de if/elif keten van estimate_calories_burned
+    def contains(*words):
+        mask = np.zeros(len(activities), dtype=bool)
+        for word in words:
+            mask |= activiteit_l.str.contains(word, regex=False).to_numpy()
+        return mask
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(hours > 0, distance_km / np.where(hours > 0, hours, 1), 0)
+    speed_met = np.select([speed < 5, speed < 8], [3.5, 7.0], 9.0)
+    cardio_met = np.select(
+        [contains('cross', 'elliptical'), contains('walk', 'wandel'), contains('run', 'hardlopen'),
+         contains('cycle', 'fiets'), contains('zwem', 'swim'), (distance_km > 0) & (hours > 0)],
+        [7.0, 3.5, 9.0, 7.5, 7.0, speed_met],
+        5.0
+    )
+
+    kracht_met = np.where(methode_l.str.contains('negative', regex=False).to_numpy(), 5.0, 4.5)
+    weight_used = _to_numbers(_column(activities, 'gewicht')).to_numpy()
+    kracht_met = kracht_met + np.where(weight_used > 60, 0.3, 0) + np.where(weight_used > 80, 0.2, 0)
+
+    met = np.select([is_cardio, is_kracht], [cardio_met, kracht_met], 5.0)
+    calories = np.where(hours == 0, 0, np.round(met * gewicht_kg * hours))
+    return pd.Series(calories.astype(int), index=activities.index)
+
+def benchmark(rows: int = 5000, repeat: int = 3):
+    """Vergelijk de uitkomsten en snelheid van de apply-versie en de vectorized versie"""
+    rng = np.random.default_rng(42)
+    activiteiten = ['Cross trainer', 'Wandelen', 'Hardlopen', 'Fietsen', 'Zwemmen', 'Roeien',
+                    'Bench press', 'Leg press', 'Chest press']
+    raw = pd.DataFrame({
+        'datum': [f"{d:02d}/10/2025" for d in rng.integers(1, 29, rows)],
+        'activiteit': rng.choice(activiteiten, rows),
+        'type': rng.choice(['Cardio', 'Kracht', 'cardio '], rows),
+        'gewicht': rng.choice(['', '45', '65,5', '85', '100'], rows),
+        'afstand': rng.choice(['', '2,5', '5', '10,2', '21'], rows),
+        'duur': rng.choice(['', '00:30:00', '45:00', '01:10:15', '00:00:00'], rows),
+        'sets': rng.choice(['', '3', '4'], rows),
+        'reps': rng.choice(['', '8', '12'], rows),
+        'methode': rng.choice(['', 'Negative', 'Regular'], rows),
+    })
+    df = schema_helper.normalize_tab('activiteiten', raw)
+
+    def per_row():
+        return df.apply(
+            lambda row: estimate_calories_burned(
+                row.get('type', ''), row.get('activiteit', ''), row.get('afstand'),
+                row.get('duur_sec', row.get('duur')), 100,
+                sets=row.get('sets'), reps=row.get('reps'),
+                gewicht=row.get('gewicht'), methode=row.get('methode')
+            ),
+            axis=1
+        )
+
+    def vectorized():
+        return estimate_calories_frame(df, 100)
+
+    expected = per_row()
+    actual = vectorized()
+    mismatches = int((expected.astype(int) != actual).sum())
+
+    timings = {}
+    for name, fn in [('apply', per_row), ('vectorized', vectorized)]:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    print(f"{rows} activiteiten, {mismatches} verschillen")
+    print(f"apply:      {timings['apply'] * 1000:8.1f} ms")
+    print(f"vectorized: {timings['vectorized'] * 1000:8.1f} ms  ({timings['apply'] / timings['vectorized']:.0f}x sneller)")
+    return mismatches, timings
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
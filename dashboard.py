@@ -19,10 +19,24 @@ import streamlit_authenticator as stauth
 load_dotenv()
 
 # Import helper modules
+import data_helper
+import schema_helper
+import calorie_helper
+import analytics_helper
+import quota_helper
+import deferred_helper
+
 try:
     import sheets_helper
     import groq_helper
     HELPERS_AVAILABLE = True
+    # Read through the configured storage backend (Google Sheets or SQLite); its
+    # revision is checked before re-downloading tabs on a refresh
+    data_helper.set_storage_backend(sheets_helper.get_backend())
+    # Start the write outbox early so rows left over from a previous run are flushed
+    # and merged into the loaded tabs
+    if sheets_helper.outbox_helper.ASYNC_WRITES:
+        sheets_helper.get_outbox()
 except ImportError:
     HELPERS_AVAILABLE = False
     st.warning("Helper modules niet gevonden. Data Invoer functionaliteit is beperkt.")
@@ -840,42 +854,81 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Google Sheets Connection
-@st.cache_resource
-def get_google_sheets_client():
-    """
-    Setup Google Sheets connection.
-    Voor nu gebruiken we publieke sheet access via URL.
-    """
-    return None
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_sheet_data(sheet_id):
     """
-    Load data from Google Sheets using public CSV export
+    Load data from Google Sheets using public CSV export.
+    Tabs are cached per (sheet_id, tab) for 5 minutes; missing or invalidated tabs
+    are fetched (concurrently), expired tabs are served right away and refreshed in
+    the background. A failing or slow tab comes back empty.
     """
     try:
-        base_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&sheet="
-        
-        data = {}
-        sheets = ['voeding', 'activiteiten', 'metingen', 'egym', 'stappen', 'gewicht', 'doelen']
-        
-        for sheet_name in sheets:
-            try:
-                url = base_url + sheet_name
-                df = pd.read_csv(url)
-                data[sheet_name] = df
-            except Exception as e:
-                # Don't warn about missing doelen sheet - it's optional
-                if sheet_name != 'doelen':
-                    st.warning(f"Kon {sheet_name} niet laden: {str(e)}")
-                data[sheet_name] = pd.DataFrame()
-        
+        data, errors = data_helper.load_data(sheet_id)
+
+        for sheet_name, error in errors.items():
+            # Don't warn about missing doelen sheet - it's optional
+            if sheet_name not in data_helper.OPTIONAL_TABS:
+                st.warning(f"Kon {sheet_name} niet laden: {error}")
+
         return data
     except Exception as e:
         st.error(f"Fout bij laden data: {str(e)}")
         return None
 
+def format_data_age(seconds):
+    """Format the age of the loaded data for the sidebar ('net geladen', '4 min', '2 uur')"""
+    if seconds < 60:
+        return "net geladen"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f} min oud"
+    return f"{seconds // 3600:.0f} uur oud"
+
+def show_data_status(placeholder, sheet_id):
+    """Show how old the cached sheet data is and whether a background refresh is running"""
+    age = data_helper.data_age(sheet_id)
+    if age is None:
+        return
+    status = f"🕒 Data {format_data_age(age)}"
+    if data_helper.is_refreshing(sheet_id):
+        status += " · wordt ververst..."
+    elif age > data_helper.CACHE_TTL:
+        status += " · ververst bij de volgende actie"
+    if quota_helper.under_pressure():
+        counters = quota_helper.stats()
+        retries = sum(kind['retries'] for kind in counters.values())
+        status += f" · Sheets quota bijna op ({retries} retries)"
+    if HELPERS_AVAILABLE:
+        outbox = sheets_helper.outbox_status(sheet_id)
+        if outbox['error']:
+            status += f" · ⚠️ {outbox['pending']} invoer nog niet opgeslagen, nieuwe poging over {outbox['retry_in']:.0f}s"
+        elif outbox['pending']:
+            status += f" · {outbox['pending']} invoer wordt opgeslagen..."
+    placeholder.caption(status)
+
+def show_failed_writes(sheet_id):
+    """Warn about queued rows that could not be written, with retry/discard actions"""
+    if not HELPERS_AVAILABLE:
+        return
+    outbox = sheets_helper.outbox_status(sheet_id)
+    if not outbox['failed']:
+        return
+    st.error(f"❌ {outbox['failed']} invoer kon niet naar Google Sheets geschreven worden: {outbox['failed_error']}")
+    col_retry, col_discard = st.columns(2)
+    with col_retry:
+        if st.button("🔁 Opnieuw", key="outbox_retry_failed", use_container_width=True):
+            sheets_helper.retry_failed_writes(sheet_id)
+            st.rerun()
+    with col_discard:
+        if st.button("🗑️ Weggooien", key="outbox_discard_failed", use_container_width=True):
+            sheets_helper.discard_failed_writes(sheet_id)
+            data_helper.invalidate(sheet_id)
+            st.rerun()
+
+def saved_message(subject="Succesvol"):
+    """Confirmation after appending rows; with ASYNC_WRITES they are only queued, not in the sheet yet"""
+    if HELPERS_AVAILABLE and sheets_helper.outbox_helper.ASYNC_WRITES:
+        return f"✅ {subject} opgeslagen, wordt op de achtergrond naar Google Sheets geschreven"
+    return f"✅ {subject} toegevoegd aan Google Sheets!"
+
 # Helper functions voor Data Invoer tab
 def get_voeding_data():
     """Haal voeding data op via load_sheet_data"""
@@ -982,7 +1035,7 @@ def calculate_nutrition_totals(nutrition_df, date):
     
     Args:
         nutrition_df: DataFrame with nutrition data
-        date: Date string to filter by
+        date: Date to filter by (DD/MM/YYYY or DD-MM-YYYY string, or date)
         
     Returns:
         dict: Nutrition totals with keys: calorien, eiwit, koolhydraten, vetten, vezels
@@ -993,7 +1046,7 @@ def calculate_nutrition_totals(nutrition_df, date):
         return default_totals
     
     try:
-        day_data = nutrition_df[nutrition_df['datum'] == date]
+        day_data = schema_helper.day_rows(nutrition_df, date)
         
         totals = {
             'calorien': float(day_data['calorien'].sum()) if 'calorien' in day_data else 0,
@@ -1170,7 +1223,7 @@ def calculate_body_projections(metingen_df, weeks_ahead=4, current_daily_weight=
         if gewicht_df is not None and not gewicht_df.empty and 'datum' in gewicht_df.columns and 'gewicht' in gewicht_df.columns:
             try:
                 daily_weight = gewicht_df.copy()
-                daily_weight['date_obj'] = pd.to_datetime(daily_weight['datum'], dayfirst=True, errors='coerce')
+                daily_weight['date_obj'] = schema_helper.date_values(daily_weight)
                 daily_weight = daily_weight.dropna(subset=['date_obj', 'gewicht'])
                 daily_weight = daily_weight.sort_values('date_obj')
                 
@@ -1236,41 +1289,14 @@ def calculate_body_projections(metingen_df, weeks_ahead=4, current_daily_weight=
         behavior_projection = None
         if nutrition_df is not None and activities_df is not None and not nutrition_df.empty:
             try:
-                # Calculate average daily deficit over last 14 days
-                today = datetime.now()
+                # Calculate average daily deficit over last 14 days (days with logged nutrition)
+                today = pd.Timestamp(datetime.now().date())
                 lookback_days = 14
                 
-                daily_deficits = []
-                for i in range(lookback_days):
-                    check_date = today - timedelta(days=i)
-                    date_str = check_date.strftime('%d/%m/%Y')
-                    
-                    # Get nutrition
-                    day_nutrition = calculate_nutrition_totals(nutrition_df, date_str)
-                    if sum(day_nutrition.values()) == 0:
-                        continue
-                    
-                    # Get activities
-                    day_burned, _ = calculate_total_calories_burned(activities_df, date_str)
-                    
-                    # Get steps
-                    day_stappen = 0
-                    if stappen_df is not None and not stappen_df.empty:
-                        day_stappen_row = stappen_df[stappen_df['datum'] == date_str]
-                        if not day_stappen_row.empty:
-                            day_stappen = day_stappen_row['stappen'].sum()
-                    
-                    # Calculate walking steps from activities to avoid double counting
-                    day_walking_steps = calculate_walking_steps_from_activities(activities_df, date_str)
-                    day_casual_steps = max(0, day_stappen - day_walking_steps)
-                    
-                    # Calculate deficit
-                    bmr = calculate_bmr(current_gewicht, 180, 37, 'male')  # Using defaults
-                    day_steps_cal = calculate_steps_calories(day_casual_steps, current_gewicht)
-                    day_total_exp = bmr + day_steps_cal + day_burned
-                    day_net = day_nutrition['calorien'] - day_total_exp
-                    
-                    daily_deficits.append(day_net)
+                bmr = calculate_bmr(current_gewicht, 180, 37, 'male')  # Using defaults
+                daily_balance = get_daily_balance(nutrition_df, activities_df, stappen_df, current_gewicht, bmr)
+                window = daily_balance.loc[today - pd.Timedelta(days=lookback_days - 1):today]
+                daily_deficits = window.loc[window['has_nutrition'], 'net'].tolist()
                 
                 if len(daily_deficits) >= 7:  # Need at least a week of data
                     avg_daily_deficit = np.mean(daily_deficits)
@@ -1391,56 +1417,53 @@ def calculate_steps_calories(steps, weight_kg=70):
     # This is lower than sport activities to avoid double counting
     return steps * 0.025 * (weight_kg / 70)
 
+def calculate_sport_steps_by_date(activities_df):
+    """
+    Estimate steps from walking/cardio activities for all dates at once
+    (1250 steps per km, or 100 steps per minute for walks without a distance)
+    Returns: Series of estimated sport steps (int) indexed by date (datum_dt)
+    """
+    if activities_df is None or activities_df.empty:
+        return pd.Series(dtype=int, index=pd.DatetimeIndex([], name='datum_dt'))
+    
+    # Only cardio activities count; columns are typed by schema_helper
+    is_cardio = activities_df['type'] == 'Cardio'
+    activiteit = activities_df['activiteit'].astype(str).str.lower()
+    is_walk = activiteit.str.contains('walk', regex=False) | activiteit.str.contains('wandel', regex=False)
+    
+    # Distance if available, otherwise walking duration
+    steps_from_distance = activities_df['afstand'] * 1250
+    steps_from_duration = (activities_df['duur_sec'] // 60) * 100
+    steps = steps_from_distance.where(activities_df['afstand'].notna(), steps_from_duration.where(is_walk))
+    steps = steps.where(is_cardio).fillna(0)
+    
+    per_day = steps.groupby(schema_helper.date_values(activities_df)).sum()
+    per_day.index.name = 'datum_dt'
+    return per_day.astype(int)
+
+def get_sport_steps_by_date(activities_df):
+    """
+    Cached calculate_sport_steps_by_date, rebuilt only when activiteiten changes.
+
+    Like get_daily_balance, expects the complete loaded activiteiten tab.
+    """
+    sheet_id = st.session_state.get('user_sheet_id', '')
+    return data_helper.memoize(
+        sheet_id, ['activiteiten'], "sport_steps_by_date",
+        lambda: calculate_sport_steps_by_date(activities_df)
+    )
+
 def calculate_walking_steps_from_activities(activities_df, date_str):
     """
     Calculate estimated steps from walking/cardio activities to avoid double counting
+    Expects the complete loaded activiteiten tab (the per-date table is cached)
     Returns: estimated steps from sport activities
     """
     if activities_df.empty:
         return 0
     
-    total_walking_steps = 0
-    
-    # Filter activities for this date
-    date_formats = [date_str, date_str.replace('/', '-')]
-    day_activities = activities_df[activities_df['datum'].isin(date_formats)]
-    
-    for _, row in day_activities.iterrows():
-        activity_type = str(row.get('type', '')).lower()
-        activiteit = str(row.get('activiteit', '')).lower()
-        afstand = row.get('afstand', 0)
-        duur = row.get('duur', '')
-        
-        # Only count walking/cardio activities
-        if activity_type != 'cardio':
-            continue
-        
-        # Estimate steps from distance (if available)
-        if pd.notna(afstand) and afstand != '':
-            try:
-                distance_km = float(str(afstand).replace(',', '.'))
-                # Average: 1250 steps per km
-                total_walking_steps += distance_km * 1250
-            except:
-                pass
-        
-        # Or estimate from duration if distance not available
-        elif 'walk' in activiteit or 'wandel' in activiteit:
-            if pd.notna(duur) and duur != '':
-                try:
-                    time_parts = str(duur).split(':')
-                    minutes = 0
-                    if len(time_parts) == 3:
-                        minutes = int(time_parts[0]) * 60 + int(time_parts[1])
-                    elif len(time_parts) == 2:
-                        minutes = int(time_parts[0])
-                    
-                    # Average: 100 steps per minute walking
-                    total_walking_steps += minutes * 100
-                except:
-                    pass
-    
-    return int(total_walking_steps)
+    sport_steps = get_sport_steps_by_date(activities_df)
+    return int(sport_steps.get(schema_helper.to_day(date_str), 0))
 
 def calculate_tdee(bmr, steps=0, weight_kg=70, activity_multiplier=1.2):
     """
@@ -1457,145 +1480,6 @@ def calculate_tdee(bmr, steps=0, weight_kg=70, activity_multiplier=1.2):
     steps_cal = calculate_steps_calories(steps, weight_kg)
     return (bmr * activity_multiplier) + steps_cal
 
-def estimate_calories_burned(activity_type, activiteit, afstand, duur, gewicht_kg=None, sets=None, reps=None, gewicht=None, methode=None):
-    """
-    Estimate calories burned based on activity type and duration
-    Using MET (Metabolic Equivalent of Task) values
-    Formula: Calories = MET × weight(kg) × time(hours)
-    
-    Args:
-        gewicht_kg: Body weight for calorie calculation
-        gewicht: Weight lifted (for strength training intensity adjustment)
-    """
-    # Use session state weight if not provided
-    if gewicht_kg is None:
-        import streamlit as st
-        gewicht_kg = st.session_state.get('targets', {}).get('weight', 106.2)
-
-    # Normalize string inputs to avoid AttributeError when calling .lower()
-    # Convert None to empty string and ensure consistent types
-    activity_type = '' if activity_type is None else str(activity_type)
-    activiteit = '' if activiteit is None else str(activiteit)
-    methode = None if methode is None else str(methode)
-
-    activity_type_l = activity_type.lower()
-    activiteit_l = activiteit.lower()
-    methode_l = methode.lower() if (methode is not None and methode != '') else None
-    
-    hours = 0
-    
-    # Parse duration (format: HH:MM:SS or MM:SS)
-    if pd.notna(duur) and duur != '':
-        try:
-            time_parts = str(duur).split(':')
-            if len(time_parts) == 3:
-                hours = int(time_parts[0]) + int(time_parts[1])/60 + int(time_parts[2])/3600
-            elif len(time_parts) == 2:
-                hours = int(time_parts[0])/60 + int(time_parts[1])/3600
-        except:
-            hours = 0
-    
-    # For strength training without duration, estimate based on sets and reps
-    if hours == 0 and activity_type_l == 'kracht':
-        if pd.notna(sets) and pd.notna(reps):
-            try:
-                # Estimate: 5-6 seconds per rep (controlled movements) + 120 seconds rest between sets
-                total_sets = int(float(sets))
-                total_reps = int(float(reps))
-                work_time = total_sets * total_reps * 5.5  # 5.5 seconds per rep (controlled tempo)
-                rest_time = (total_sets - 1) * 120  # 120 seconds rest between sets (more realistic)
-                # Add setup time: ~30 seconds per exercise
-                setup_time = 30
-                total_seconds = work_time + rest_time + setup_time
-                hours = total_seconds / 3600
-            except:
-                # Default estimate: 6 minutes per exercise (more realistic)
-                hours = 6 / 60
-        else:
-            # If no sets/reps data, estimate 6 minutes per exercise
-            hours = 6 / 60
-    
-    if hours == 0:
-        return 0
-    
-    # Parse distance if available
-    distance_km = 0
-    if pd.notna(afstand) and afstand != '':
-        try:
-            distance_km = float(str(afstand).replace(',', '.'))
-        except:
-            distance_km = 0
-    
-    # MET values for different activities (more realistic)
-    met_values = {
-        # Cardio activities
-        'walking': 3.5,
-        'cross trainer': 7.0,  # Moderate to vigorous elliptical
-        'running': 9.0,
-        'cycling': 7.5,
-        'swimming': 7.0,
-        
-        # Strength training (Kracht) - Conservative values matching egym reality
-        'strength': 4.5,  # General weight lifting (moderate intensity)
-        'negative': 5.0,  # Negative reps slightly higher
-        'regular': 4.5   # Regular machine training
-    }
-    
-    # Determine MET value based on activity
-    met = 5.0  # Default (moderate intensity)
-    
-    if activity_type_l == 'cardio':
-        # activiteit_l already normalized above
-        if 'cross' in activiteit_l or 'elliptical' in activiteit_l:
-            met = 7.0  # Moderate to vigorous intensity
-        elif 'walk' in activiteit_l or 'wandel' in activiteit_l:
-            met = 3.5
-        elif 'run' in activiteit_l or 'hardlopen' in activiteit_l:
-            met = 9.0
-        elif 'cycle' in activiteit_l or 'fiets' in activiteit_l:
-            met = 7.5
-        elif 'zwem' in activiteit_l or 'swim' in activiteit_l:
-            met = 7.0
-        else:
-            # Estimate from distance if available
-            if distance_km > 0 and hours > 0:
-                speed = distance_km / hours
-                if speed < 5:  # Walking pace
-                    met = 3.5
-                elif speed < 8:  # Jogging
-                    met = 7.0
-                else:  # Running
-                    met = 9.0
-    
-    elif activity_type_l == 'kracht':
-        # Base MET for strength training (more conservative)
-        met = 4.5  # Moderate intensity weight training
-        
-        # Adjust based on method if available
-        if methode_l is not None:
-            if 'negative' in methode_l:
-                met = 5.0  # Higher intensity for negatives
-            elif 'regular' in methode_l:
-                met = 4.5  # Standard machine training
-        
-        # Bonus: If heavy weights are used, add small intensity multiplier
-        if gewicht is not None and pd.notna(gewicht) and gewicht != '':
-            try:
-                weight_used = float(str(gewicht).replace(',', '.'))
-                # If lifting > 60kg, add +0.3 MET (high intensity)
-                if weight_used > 60:
-                    met += 0.3
-                # If lifting > 80kg, add another +0.2 MET (very high intensity)
-                if weight_used > 80:
-                    met += 0.2
-            except:
-                pass
-    
-    # Calculate calories
-    calories = met * gewicht_kg * hours
-    
-    return round(calories)
-
 def calculate_total_calories_burned(activities_df, date=None):
     """Calculate total calories burned for activities"""
     if activities_df.empty:
@@ -1603,68 +1487,127 @@ def calculate_total_calories_burned(activities_df, date=None):
     
     # Filter by date if provided
     if date:
-        activities = activities_df[activities_df['datum'] == date].copy()
+        activities = schema_helper.day_rows(activities_df, date).copy()
     else:
         activities = activities_df.copy()
     
     if activities.empty:
         return 0, pd.DataFrame()
     
-    # Calculate calories for each activity
-    activities['calories_burned'] = activities.apply(
-        lambda row: estimate_calories_burned(
-            row.get('type', ''),
-            row.get('activiteit', ''),
-            row.get('afstand', ''),
-            row.get('duur', ''),
-            sets=row.get('sets'),
-            reps=row.get('reps'),
-            gewicht=row.get('gewicht'),
-            methode=row.get('methode')
-        ),
-        axis=1
-    )
+    # Calculate calories for all activities at once (vectorized MET engine)
+    activities['calories_burned'] = calorie_helper.estimate_calories_frame(activities)
     
     return activities['calories_burned'].sum(), activities
 
+def calculate_daily_balance(nutrition_df, activities_df, stappen_df, weight_kg, bmr):
+    """
+    Build the per-day energy balance table in one pass over all data.
+
+    One row per date (DatetimeIndex, no gaps) from the first logged day up to today:
+    intake macros, activity kcal, session counts, total/sport/casual steps, BMR,
+    expenditure and net balance. Days without data have zero intake and activity.
+
+    Args:
+        weight_kg: Body weight used for the step calories
+        bmr: Basal metabolic rate added to every day's expenditure
+    """
+    macro_cols = ['calorien', 'eiwit', 'koolhydraten', 'vetten', 'vezels']
+    frames = [df for df in (nutrition_df, activities_df, stappen_df) if df is not None and not df.empty]
+
+    # Date range: first logged day up to today
+    today = pd.Timestamp(datetime.now().date())
+    logged = [schema_helper.date_values(df).dropna() for df in frames]
+    logged = [dates for dates in logged if not dates.empty]
+    start = min([dates.min() for dates in logged] + [today])
+    end = max([dates.max() for dates in logged] + [today])
+    daily = pd.DataFrame(index=pd.date_range(start, end, freq='D', name='datum_dt'))
+
+    # Intake per day
+    if nutrition_df is not None and not nutrition_df.empty:
+        present = [col for col in macro_cols if col in nutrition_df.columns]
+        grouped = nutrition_df.groupby(schema_helper.date_values(nutrition_df))
+        daily = daily.join(grouped[present].sum())
+        daily['meals'] = grouped.size()
+    for col in macro_cols + ['meals']:
+        daily[col] = daily[col].fillna(0) if col in daily.columns else 0
+    daily['has_nutrition'] = daily[macro_cols].sum(axis=1) != 0
+
+    # Activity calories, session counts and sport steps per day
+    daily['activity_kcal'] = 0.0
+    daily['cardio'] = 0
+    daily['kracht'] = 0
+    daily['session_types'] = 0
+    daily['sport_steps'] = 0
+    if activities_df is not None and not activities_df.empty:
+        _, activities = calculate_total_calories_burned(activities_df)
+        dates = schema_helper.date_values(activities)
+
+        per_day = pd.DataFrame({
+            'activity_kcal': activities['calories_burned'],
+            'cardio': (activities['type'] == 'Cardio').astype(int),
+            'kracht': (activities['type'] == 'Kracht').astype(int),
+        }).groupby(dates).sum()
+        per_day['session_types'] = activities.groupby(dates)['type'].nunique()
+        per_day['sport_steps'] = calculate_sport_steps_by_date(activities_df)
+        for col in per_day.columns:
+            daily[col] = per_day[col].reindex(daily.index).fillna(0)
+        daily['sport_steps'] = daily['sport_steps'].astype(int)
+
+    # Steps and expenditure
+    daily['steps'] = 0
+    if stappen_df is not None and not stappen_df.empty and 'stappen' in stappen_df.columns:
+        steps = stappen_df.groupby(schema_helper.date_values(stappen_df))['stappen'].sum()
+        daily['steps'] = steps.reindex(daily.index).fillna(0)
+    daily['casual_steps'] = (daily['steps'] - daily['sport_steps']).clip(lower=0)
+    daily['steps_kcal'] = daily['casual_steps'] * 0.025 * (weight_kg / 70)
+    daily['bmr'] = bmr
+    daily['expenditure'] = daily['bmr'] + daily['steps_kcal'] + daily['activity_kcal']
+    daily['net'] = daily['calorien'] - daily['expenditure']
+
+    return daily
+
+def get_daily_balance(nutrition_df, activities_df, stappen_df, weight_kg, bmr):
+    """
+    Cached calculate_daily_balance, rebuilt when voeding/activiteiten/stappen change
+    or the date rolls over (the table runs up to today).
+
+    Expects the complete loaded tabs (not period selections), since the cache is
+    keyed on the data version of the user's sheet.
+    """
+    sheet_id = st.session_state.get('user_sheet_id', '')
+    met_weight = st.session_state.get('targets', {}).get('weight', 106.2)
+    key = f"daily_balance_{weight_kg:.2f}_{bmr:.2f}_{met_weight}_{datetime.now().date()}"
+    return data_helper.memoize(
+        sheet_id, ['voeding', 'activiteiten', 'stappen'], key,
+        lambda: calculate_daily_balance(nutrition_df, activities_df, stappen_df, weight_kg, bmr)
+    )
+
+def get_analytics(nutrition_df, activities_df, stappen_df):
+    """
+    Cached analytics database (see analytics_helper), rebuilt only when
+    voeding/activiteiten/stappen change.
+
+    Like get_daily_balance, expects the complete loaded tabs.
+    """
+    sheet_id = st.session_state.get('user_sheet_id', '')
+    met_weight = st.session_state.get('targets', {}).get('weight', 106.2)
+    return data_helper.memoize(
+        sheet_id, ['voeding', 'activiteiten', 'stappen'], f"analytics_{met_weight}",
+        lambda: analytics_helper.AnalyticsDB(nutrition_df, activities_df, stappen_df, met_weight)
+    )
+
 def filter_by_date_range(df, start_date, end_date, date_column='datum'):
-    """Filter dataframe by date range"""
+    """
+    Filter dataframe by date range.
+    Returns a read-only slice of df (use .copy() before adding or changing columns).
+    """
     if df.empty or date_column not in df.columns:
         return df
     
     try:
-        # Convert dates to datetime for comparison
-        df_copy = df.copy()
-        
-        # Try multiple date formats
-        # First try standard format with slash
-        df_copy['date_obj'] = pd.to_datetime(df_copy[date_column], format='%d/%m/%Y', errors='coerce')
-        
-        # If that failed (NaT values), try with dash format (e.g., 13-10)
-        if df_copy['date_obj'].isna().all():
-            # Parse dates like "13-10" and add current year
-            current_year = datetime.now().year
-            df_copy['date_obj'] = pd.to_datetime(
-                df_copy[date_column].astype(str) + f'-{current_year}',
-                format='%d-%m-%Y',
-                errors='coerce'
-            )
-        
-        # If still NaT, try dayfirst auto-parse
-        if df_copy['date_obj'].isna().any():
-            df_copy['date_obj'] = pd.to_datetime(df_copy[date_column], dayfirst=True, errors='coerce')
-        
-        start_dt = pd.to_datetime(start_date).normalize()  # Remove time component
-        end_dt = pd.to_datetime(end_date).normalize()
-        
-        # Normalize dataframe dates too (remove time)
-        df_copy['date_obj'] = df_copy['date_obj'].dt.normalize()
-        
-        # Filter with inclusive bounds
-        filtered = df_copy[(df_copy['date_obj'] >= start_dt) & (df_copy['date_obj'] <= end_dt)]
-        filtered = filtered.drop('date_obj', axis=1)
-        
-        return filtered
+        # Loaded tabs are sorted on the parsed date column (datum_dt), so this is a
+        # binary search and a zero-copy slice; repeated (start, end) queries are memoised
+        return schema_helper.range_rows(df, start_date, end_date, date_column)
     except Exception as e:
         return df
 
@@ -1821,84 +1764,112 @@ def generate_action_recommendations(totals, period_stats, targets):
     }
 
 def calculate_period_stats(nutrition_df, activities_df, start_date, end_date, stappen_df=None):
-    """Calculate statistics for a period"""
-    # Filter data
-    period_nutrition = filter_by_date_range(nutrition_df, start_date, end_date)
-    period_activities = filter_by_date_range(activities_df, start_date, end_date)
-    
-    # Calculate stats
-    stats = {
-        'days': (end_date - start_date).days + 1,
-        'total_calories': 0,
-        'avg_calories': 0,
-        'total_protein': 0,
-        'avg_protein': 0,
-        'total_carbs': 0,
-        'total_fats': 0,
-        'total_calories_burned': 0,
-        'avg_calories_burned': 0,
-        'total_workouts': 0,
-        'cardio_sessions': 0,
-        'strength_sessions': 0
+    """Calculate statistics for a period (SQL aggregates over the cached analytics database)"""
+    analytics = get_analytics(nutrition_df, activities_df, stappen_df)
+    with_steps = stappen_df is not None and not stappen_df.empty and 'cardio' in stappen_df.columns
+    return analytics.period_stats(start_date, end_date, with_steps)
+
+# Main App
+# Background AI results shared by all sessions; keys change when the inputs change
+quick_actions_results = deferred_helper.get_results('quick-actions', ttl=6 * 3600)
+
+# How often (seconds) the page checks whether pending AI output is ready
+AI_POLL_INTERVAL = 2
+
+# (results, key) pairs shown as a placeholder in this run (the script module is fresh every run)
+pending_ai_results = []
+
+def deferred_ai(results, key, compute):
+    """results.get(key, compute), remembering keys that are still running so the page can swap them in"""
+    value = results.get(key, compute)
+    if value is None and results.is_pending(key):
+        pending_ai_results.append((results, key))
+    return value
+
+def watch_pending_ai():
+    """Rerun the page as soon as background AI output shown as a placeholder is ready (or failed)"""
+    if not pending_ai_results:
+        return
+    waiting = list(pending_ai_results)
+
+    @st.fragment(run_every=AI_POLL_INTERVAL)
+    def poll():
+        if any(not results.is_pending(key) for results, key in waiting):
+            st.rerun()
+    poll()
+
+def quick_actions_key(username, start_date, end_date, totals, targets):
+    """Memo key for sidebar quick actions: nutrition totals in buckets of 50 kcal and 5g protein"""
+    return (
+        username, str(start_date), str(end_date),
+        int(round(totals.get('calorien', 0) / 50)), int(round(totals.get('eiwit', 0) / 5)),
+        targets.get('calories'), targets.get('protein'),
+    )
+
+def get_quick_actions(username, name, start_date, end_date, totals, targets):
+    """AI quick actions for the sidebar, or None while they are being generated off the render path"""
+    quick_data = {
+        'nutrition': dict(totals),
+        'workouts': [],  # Could add today's workouts here
+        'steps': 0  # Could add today's steps here
     }
-    
-    if not period_nutrition.empty:
-        # Group by date and sum
-        daily_nutrition = period_nutrition.groupby('datum').agg({
-            'calorien': 'sum',
-            'eiwit': 'sum',
-            'koolhydraten': 'sum',
-            'vetten': 'sum'
-        }).reset_index()
-        
-        stats['total_calories'] = daily_nutrition['calorien'].sum()
-        stats['avg_calories'] = daily_nutrition['calorien'].mean()
-        stats['total_protein'] = daily_nutrition['eiwit'].sum()
-        stats['avg_protein'] = daily_nutrition['eiwit'].mean()
-        stats['total_carbs'] = daily_nutrition['koolhydraten'].sum()
-        stats['total_fats'] = daily_nutrition['vetten'].sum()
-        stats['days_logged'] = len(daily_nutrition)
-    
-    if not period_activities.empty:
-        # Calculate calories burned
-        calories_burned, _ = calculate_total_calories_burned(period_activities)
-        stats['total_calories_burned'] = calories_burned
-        stats['avg_calories_burned'] = calories_burned / stats['days']
-        stats['total_workouts'] = len(period_activities)
-        # Calculate cardio sessions from detailed activities
-        detailed_cardio_activities = period_activities[period_activities['type'].str.lower() == 'cardio']
-        stats['cardio_sessions'] = len(detailed_cardio_activities)
+    targets = dict(targets)
+    key = quick_actions_key(username, start_date, end_date, totals, targets)
+    return deferred_ai(quick_actions_results,
+        key, lambda: groq_helper.generate_quick_actions(quick_data, targets, name, fallback=False))
 
-        # If we have daily steps data, also count cardio days from daily indicator
-        if stappen_df is not None and not stappen_df.empty and 'cardio' in stappen_df.columns:
-            # Filter stappen data to the period
-            period_stappen = filter_by_date_range(stappen_df, start_date, end_date)
+# AI feedback for the Overzicht tab, per user, period and data version
+ai_feedback_results = deferred_helper.get_results('ai-feedback', ttl=24 * 3600)
 
-            if not period_stappen.empty:
-                # Normalize cardio column and get cardio days
-                period_stappen_copy = period_stappen.copy()
-                period_stappen_copy['cardio_normalized'] = period_stappen_copy['cardio'].astype(str).str.lower().str.strip()
-                cardio_days_from_daily = period_stappen_copy[period_stappen_copy['cardio_normalized'].isin(['ja', 'yes', 'j'])]
+def ai_feedback_key(kind, username, sheet_id, view_mode, start_date, end_date, targets, tabs):
+    """Memo key for Overzicht AI output: changes when the period, targets or underlying tabs change"""
+    return (
+        kind, username, view_mode, str(start_date), str(end_date),
+        data_helper.data_version(sheet_id, tabs),
+        tuple(targets.get(k) for k in ('calories', 'protein', 'carbs', 'fats')),
+    )
 
-                # Get unique dates from detailed cardio activities
-                if not detailed_cardio_activities.empty:
-                    detailed_cardio_dates = set(detailed_cardio_activities['datum'].unique())
-                else:
-                    detailed_cardio_dates = set()
+def get_ai_feedback(username, name, sheet_id, view_mode, start_date, end_date, totals, targets, period_stats):
+    """
+    AI insights, improvements and successes for the Overzicht tab
 
-                # Get unique dates from daily cardio indicator
-                if not cardio_days_from_daily.empty:
-                    daily_cardio_dates = set(cardio_days_from_daily['datum'].unique())
-                else:
-                    daily_cardio_dates = set()
+    Returns (feedback, key): feedback is None while it is being generated in the background
+    """
+    feedback_data = {
+        'nutrition': dict(totals),
+        'view_mode': view_mode,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+    targets, period_stats = dict(targets), dict(period_stats)
+    key = ai_feedback_key('insights', username, sheet_id, view_mode, start_date, end_date, targets,
+                          ['voeding', 'activiteiten', 'stappen'])
+    feedback = deferred_ai(ai_feedback_results, key, lambda: groq_helper.generate_insights_and_feedback(
+        feedback_data, targets, period_stats, name, fallback=False))
+    return feedback, key
 
-                # Combine all unique cardio dates (no double counting)
-                all_cardio_dates = detailed_cardio_dates.union(daily_cardio_dates)
-                stats['cardio_sessions'] = len(all_cardio_dates)
-    
-    return stats
+def get_measurement_warning(username, name, sheet_id, view_mode, start_date, end_date, trends, totals, targets):
+    """AI measurement warning HTML, or None while it is being generated in the background"""
+    current_nutrition, targets = dict(totals), dict(targets)
+    key = ai_feedback_key('measurements', username, sheet_id, view_mode, start_date, end_date, targets,
+                          ['metingen', 'voeding'])
+    return deferred_ai(ai_feedback_results, key, lambda: groq_helper.generate_measurement_warning(
+        vet_change=trends['vet_change'],
+        spier_change=trends['spier_change'],
+        current_nutrition=current_nutrition,
+        targets=targets,
+        name=name,
+        fallback=False
+    ))
+
+def show_ai_fallback_notice(key, what):
+    """Explain why static content is shown: AI still running, or temporarily unavailable"""
+    error = ai_feedback_results.error(key)
+    if error and ("rate_limit" in error.lower() or "429" in error):
+        st.info(f"💡 AI {what} tijdelijk niet beschikbaar (rate limit). Standaard {what} worden getoond.")
+    elif ai_feedback_results.is_pending(key):
+        st.caption(f"🤖 AI {what} worden voorbereid, standaard {what} worden getoond...")
 
-# Main App
 def main():
     # Get current user info from session state
     username = st.session_state.get("username", "alex")
@@ -1964,9 +1935,13 @@ def main():
         )
         
         if st.button("🔄 Data Verversen", use_container_width=True):
-            st.cache_data.clear()
+            data_helper.invalidate(user_sheet_id)
             st.rerun()
         
+        # Filled in once the data is loaded (see show_data_status)
+        data_status = st.empty()
+        show_failed_writes(user_sheet_id)
+        
         st.markdown("---")
         
         # Date Range Selector
@@ -2179,6 +2154,7 @@ def main():
                 # Save to Google Sheets for persistence
                 try:
                     sheets_helper.save_goals(username, new_goals, user_sheet_id)
+                    data_helper.invalidate(user_sheet_id, 'doelen')
                     st.success(f"✅ Doelen opgeslagen voor {name} (persistent opgeslagen in Google Sheets)!")
                 except Exception as e:
                     st.warning(f"⚠️ Doelen opgeslagen in sessie, maar niet naar Google Sheets: {str(e)}")
@@ -2194,13 +2170,15 @@ def main():
     # Load data OUTSIDE sidebar
     with st.sidebar:
         if st.button("🔄 Ververs Data", help="Herlaad data van Google Sheets"):
-            st.cache_data.clear()
+            data_helper.invalidate(user_sheet_id)
             st.rerun()
     
     with st.spinner("Data laden..."):
         # Use user-specific sheet ID (already set at top of function)
         data = load_sheet_data(user_sheet_id)
     
+    show_data_status(data_status, user_sheet_id)
+    
     if data is None:
         st.error("❌ Kon data niet laden. Controleer of je sheet publiek is!")
         st.info("💡 Ga naar je Google Sheet → Delen → 'Iedereen met de link' → Weergever")
@@ -2214,7 +2192,7 @@ def main():
         try:
             # Parse dates and sort to get most recent
             gewicht_df_copy = gewicht_df.copy()
-            gewicht_df_copy['date_obj'] = pd.to_datetime(gewicht_df_copy['datum'], dayfirst=True, errors='coerce')
+            gewicht_df_copy['date_obj'] = schema_helper.date_values(gewicht_df_copy)
             gewicht_df_copy = gewicht_df_copy.dropna(subset=['date_obj'])
             
             if not gewicht_df_copy.empty:
@@ -2236,10 +2214,7 @@ def main():
     
     if view_mode == "📅 Dag":
         today_str = start_date.strftime("%d/%m/%Y")
-        today_str_dash = start_date.strftime("%d-%m-%Y")
         totals = calculate_nutrition_totals(nutrition_df, today_str)
-        if sum(totals.values()) == 0:
-            totals = calculate_nutrition_totals(nutrition_df, today_str_dash)
     else:
         totals = {
             'calorien': period_stats['avg_calories'],
@@ -2248,27 +2223,23 @@ def main():
             'vetten': period_stats['total_fats'] / max(period_stats['days'], 1)
         }
     
-    # Generate AI-powered recommendations for sidebar
+    # Deterministic recommendations render immediately; the AI version is generated in
+    # the background and swapped in when ready (see watch_pending_ai)
+    recommendations = generate_action_recommendations(totals, period_stats, targets)
+    ai_pending = False
     if HELPERS_AVAILABLE:
-        # Build current data for AI
-        try:
-            quick_data = {
-                'nutrition': totals,
-                'workouts': [],  # Could add today's workouts here
-                'steps': 0  # Could add today's steps here
-            }
-            recommendations = groq_helper.generate_quick_actions(quick_data, targets, name)
-        except:
-            # Fallback to static if AI fails
-            recommendations = generate_action_recommendations(totals, period_stats, targets)
-    else:
-        # Use static recommendations if AI not available
-        recommendations = generate_action_recommendations(totals, period_stats, targets)
+        ai_recommendations = get_quick_actions(username, name, start_date, end_date, totals, targets)
+        if ai_recommendations is not None:
+            recommendations = ai_recommendations
+        else:
+            ai_pending = True
     
     # Add actions to sidebar NOW
     with st.sidebar:
         st.markdown("---")
         with st.expander("🎯 Acties voor Morgen", expanded=True):
+            if ai_pending:
+                st.caption("🤖 AI acties worden voorbereid...")
             st.markdown("**🍳 Voeding**")
             for action in recommendations['nutrition_actions']:
                 st.markdown(f"• {action}")
@@ -2286,19 +2257,15 @@ def main():
         st.markdown("**Krijg een persoonlijk advies voor de rest van je dag** 🎯")
         
         if st.button("🔮 Genereer Advies", use_container_width=True, type="secondary"):
-            with st.spinner("🤖 AI analyseert je dag..."):
-                try:
+            try:
+                # Spinner only while collecting; the report itself streams in below
+                with st.spinner("📊 Gegevens van vandaag verzamelen..."):
                     # Verzamel huidige dag data
                     today = datetime.now().date()
-                    today_str = today.strftime('%d-%m-%Y')
-                    today_str_slash = today.strftime('%d/%m/%Y')
+                    today_str = today.strftime('%d/%m/%Y')
                     voeding_data = get_voeding_data()
                     
-                    # Try both date formats (silently)
                     current_nutrition = calculate_nutrition_totals(voeding_data, today_str)
-                    if sum(current_nutrition.values()) == 0:
-                        # Try with slashes
-                        current_nutrition = calculate_nutrition_totals(voeding_data, today_str_slash)
                     
                     # Verzamel ALLE activiteiten data (cardio + kracht)
                     workouts_today = []
@@ -2311,8 +2278,7 @@ def main():
                         if activiteiten_data is not None and not activiteiten_data.empty:
                             # Find date column
                             date_col = 'datum' if 'datum' in activiteiten_data.columns else 'Datum'
-                            # Try both date formats
-                            today_activities = activiteiten_data[activiteiten_data[date_col].isin([today_str, today_str_slash])]
+                            today_activities = schema_helper.day_rows(activiteiten_data, today_str, date_col)
                             
                             if not today_activities.empty:
                                 # Find activity name column
@@ -2349,7 +2315,7 @@ def main():
                         kracht_data = get_kracht_data()
                         if kracht_data is not None and not kracht_data.empty:
                             date_col = 'datum' if 'datum' in kracht_data.columns else 'Datum'
-                            today_kracht = kracht_data[kracht_data[date_col].isin([today_str, today_str_slash])]
+                            today_kracht = schema_helper.day_rows(kracht_data, today_str, date_col)
                             
                             if not today_kracht.empty:
                                 # Find exercise column
@@ -2371,7 +2337,7 @@ def main():
                         stappen_data = get_stappen_data()
                         if stappen_data is not None and not stappen_data.empty:
                             date_col = 'datum' if 'datum' in stappen_data.columns else 'Datum'
-                            today_steps = stappen_data[stappen_data[date_col].isin([today_str, today_str_slash])]
+                            today_steps = schema_helper.day_rows(stappen_data, today_str, date_col)
                             
                             if not today_steps.empty:
                                 steps_col = 'stappen' if 'stappen' in today_steps.columns else 'Stappen'
@@ -2388,30 +2354,44 @@ def main():
                         'steps': steps_today
                     }
                     
-                    # Genereer coaching
-                    if HELPERS_AVAILABLE:
-                        try:
-                            coaching_report = groq_helper.generate_daily_coaching(
-                                current_data=current_data,
-                                targets=st.session_state.targets,
-                                name=name
-                            )
-                            
-                            st.markdown("---")
-                            st.markdown(coaching_report)
-                            st.markdown("---")
-                            st.caption(f"🕐 Gegenereerd op {datetime.now().strftime('%H:%M')}")
-                        except Exception as e:
-                            error_msg = str(e)
-                            if "rate_limit" in error_msg.lower() or "429" in error_msg:
-                                st.warning("⏳ **Groq API rate limit bereikt** - Probeer over een paar minuten opnieuw, of upgrade naar Dev Tier bij [Groq Console](https://console.groq.com/settings/billing)")
-                            else:
-                                st.error(f"❌ Kon geen coaching rapport genereren: {error_msg}")
-                    else:
-                        st.error("AI Dagcoach is niet beschikbaar (groq_helper niet geladen)")
+                # Genereer coaching
+                if HELPERS_AVAILABLE:
+                    st.markdown("---")
+                    # Render tokens as they arrive instead of waiting for the full report
+                    report_placeholder = st.empty()
+                    report_placeholder.caption("🤖 AI analyseert je dag...")
+                    coaching_report = ""
+                    coaching_stats = {}
+                    try:
+                        for chunk in groq_helper.stream_daily_coaching(
+                            current_data=current_data,
+                            targets=st.session_state.targets,
+                            name=name,
+                            stats=coaching_stats
+                        ):
+                            coaching_report += chunk
+                            report_placeholder.markdown(coaching_report + "▌")
+                        report_placeholder.markdown(coaching_report)
                         
-                except Exception as e:
-                    st.error(f"❌ Fout bij genereren rapport: {str(e)}")
+                        st.markdown("---")
+                        timing = f"eerste tekst na {coaching_stats['ttft']:.1f}s, " if coaching_stats.get('ttft') is not None else ""
+                        st.caption(f"🕐 Gegenereerd op {datetime.now().strftime('%H:%M')} ({timing}klaar na {coaching_stats['total']:.1f}s)")
+                    except Exception as e:
+                        # Drop the typing cursor from a report that stopped halfway
+                        if coaching_report:
+                            report_placeholder.markdown(coaching_report)
+                        else:
+                            report_placeholder.empty()
+                        error_msg = str(e)
+                        if "rate_limit" in error_msg.lower() or "429" in error_msg:
+                            st.warning("⏳ **Groq API rate limit bereikt** - Probeer over een paar minuten opnieuw, of upgrade naar Dev Tier bij [Groq Console](https://console.groq.com/settings/billing)")
+                        else:
+                            st.error(f"❌ Kon geen coaching rapport genereren: {error_msg}")
+                else:
+                    st.error("AI Dagcoach is niet beschikbaar (groq_helper niet geladen)")
+                    
+            except Exception as e:
+                st.error(f"❌ Fout bij genereren rapport: {str(e)}")
     
     # Remove old quick action messages - simplified now
     st.markdown("---")
@@ -2443,7 +2423,6 @@ def main():
         
         # Get today's data for real-time progress
         today_str = today.strftime('%d/%m/%Y')
-        today_str_dash = today.strftime('%d-%m-%Y')
         
         nutrition_df = data.get('voeding', pd.DataFrame())
         gewicht_df = data.get('gewicht', pd.DataFrame())
@@ -2452,14 +2431,12 @@ def main():
         
         # Calculate today's totals
         current_nutrition = calculate_nutrition_totals(nutrition_df, today_str)
-        if sum(current_nutrition.values()) == 0:
-            current_nutrition = calculate_nutrition_totals(nutrition_df, today_str_dash)
         
         # Get current weight and goal
         current_weight = targets.get('weight', 106.2)
         if not gewicht_df.empty and 'datum' in gewicht_df.columns and 'gewicht' in gewicht_df.columns:
             gewicht_daily = gewicht_df.copy()
-            gewicht_daily['date_obj'] = pd.to_datetime(gewicht_daily['datum'], dayfirst=True, errors='coerce')
+            gewicht_daily['date_obj'] = schema_helper.date_values(gewicht_daily)
             gewicht_daily = gewicht_daily.dropna(subset=['date_obj', 'gewicht'])
             gewicht_daily = gewicht_daily.sort_values('date_obj')
             if len(gewicht_daily) > 0:
@@ -2471,7 +2448,7 @@ def main():
         calories_burned, _ = calculate_total_calories_burned(activities_df, today_str)
         today_stappen = 0
         if not stappen_df.empty:
-            today_stappen_row = stappen_df[stappen_df['datum'].isin([today_str, today_str_dash])]
+            today_stappen_row = schema_helper.day_rows(stappen_df, today_str)
             if not today_stappen_row.empty:
                 today_stappen = today_stappen_row['stappen'].sum()
         
@@ -2534,42 +2511,25 @@ def main():
         # ============================================
         st.markdown("### 📅 Deze Week - Jouw Streak!")
         
+        # Per-day energy balance (intake, sport, casual steps, BMR), built once per data version
+        daily_balance = get_daily_balance(nutrition_df, activities_df, stappen_df, current_weight, bmr)
+        
+        # Last 7 days, zero-filled for days before the first log
+        week_days = daily_balance.reindex(
+            pd.date_range(pd.Timestamp((today - timedelta(days=6)).date()), pd.Timestamp(today.date()), freq='D'),
+            fill_value=0
+        )
+        
         # Calculate last 7 days stats
         week_data = []
         for i in range(6, -1, -1):  # Last 7 days (6 days ago to today)
             day = today - timedelta(days=i)
-            day_str = day.strftime('%d/%m/%Y')
-            day_str_dash = day.strftime('%d-%m-%Y')
-            
-            # Get nutrition for that day
-            day_nutrition = calculate_nutrition_totals(nutrition_df, day_str)
-            if sum(day_nutrition.values()) == 0:
-                day_nutrition = calculate_nutrition_totals(nutrition_df, day_str_dash)
-            
-            # Get activities and steps
-            day_burned, _ = calculate_total_calories_burned(activities_df, day_str)
-            day_stappen = 0
-            if not stappen_df.empty:
-                day_stappen_row = stappen_df[stappen_df['datum'].isin([day_str, day_str_dash])]
-                if not day_stappen_row.empty:
-                    day_stappen = day_stappen_row['stappen'].sum()
+            day_row = week_days.loc[pd.Timestamp(day.date())]
             
-            # Calculate walking steps from sport (avoid double counting)
-            day_walking_steps = calculate_walking_steps_from_activities(activities_df, day_str)
-            day_casual_steps = max(0, day_stappen - day_walking_steps)
-            day_steps_cal = calculate_steps_calories(day_casual_steps, current_weight)
-            day_total_exp = bmr + day_steps_cal + day_burned
+            day_net = day_row['net']
             
-            day_net = day_nutrition['calorien'] - day_total_exp
-            
-            # Count workouts (unique sessions per day, not individual exercises)
-            day_workouts = 0
-            if not activities_df.empty:
-                day_activities = activities_df[activities_df['datum'] == day_str]
-                if not day_activities.empty:
-                    # Count unique session types per day (cardio and/or strength)
-                    unique_types = day_activities['type'].str.lower().unique()
-                    day_workouts = len(unique_types)
+            # Count workouts (unique session types per day: cardio and/or strength)
+            day_workouts = int(day_row['session_types'])
             
             week_data.append({
                 'day': day.strftime('%a'),
@@ -2690,10 +2650,10 @@ def main():
             # Activity status - count unique sessions, not exercises
             workout_today = 0
             if not activities_df.empty:
-                today_activities = activities_df[activities_df['datum'] == today_str]
+                today_activities = schema_helper.day_rows(activities_df, today_str)
                 if not today_activities.empty:
                     # Count unique session types (cardio and/or strength)
-                    unique_types = today_activities['type'].str.lower().unique()
+                    unique_types = today_activities['type'].unique()
                     workout_today = len(unique_types)
             
             # Calculate average workouts per day (last 7 days)
@@ -2728,24 +2688,9 @@ def main():
             # Calculate Deficit Streak
             deficit_streak = 0
             if not nutrition_df.empty and not activities_df.empty:
-                # Go back day by day and check if deficit
-                for i in range(30):  # Check last 30 days
-                    check_date = today - timedelta(days=i)
-                    check_str = check_date.strftime('%d/%m/%Y')
-                    day_nutrition = calculate_nutrition_totals(nutrition_df, check_str)
-                    day_burned, _ = calculate_total_calories_burned(activities_df, check_str)
-                    
-                    # Get steps for that day
-                    day_stappen = 0
-                    if not stappen_df.empty:
-                        day_stappen_row = stappen_df[stappen_df['datum'] == check_str]
-                        if not day_stappen_row.empty:
-                            day_stappen = day_stappen_row['stappen'].sum()
-                    
-                    day_steps_cal = calculate_steps_calories(day_stappen, current_weight)
-                    day_total_exp = bmr + day_steps_cal + day_burned
-                    day_net = day_nutrition['calorien'] - day_total_exp
-                    
+                # Go back day by day (last 30 days, newest first) and check if deficit
+                last_30 = daily_balance.loc[:pd.Timestamp(today.date())].tail(30)
+                for day_net in last_30['net'].iloc[::-1]:
                     if day_net < 0:
                         deficit_streak += 1
                     else:
@@ -2828,9 +2773,6 @@ def main():
             day = today - timedelta(days=i)
             day_str = day.strftime('%d/%m/%Y')
             day_nutrition = calculate_nutrition_totals(nutrition_df, day_str)
-            if sum(day_nutrition.values()) == 0:
-                day_str_dash = day.strftime('%d-%m-%Y')
-                day_nutrition = calculate_nutrition_totals(nutrition_df, day_str_dash)
             
             week_macros['calorien'].append(day_nutrition.get('calorien', 0))
             week_macros['eiwit'].append(day_nutrition.get('eiwit', 0))
@@ -3042,17 +2984,16 @@ def main():
             if st.button("🔄 Kopieer Voeding van Gisteren", use_container_width=True, type="secondary"):
                 yesterday = today - timedelta(days=1)
                 yesterday_str = yesterday.strftime('%d/%m/%Y')
-                yesterday_str_dash = yesterday.strftime('%d-%m-%Y')
                 
                 if not nutrition_df.empty:
-                    yesterday_meals = nutrition_df[nutrition_df['datum'].isin([yesterday_str, yesterday_str_dash])]
+                    yesterday_meals = schema_helper.day_rows(nutrition_df, yesterday_str)
                     
                     if not yesterday_meals.empty:
                         try:
-                            copied_count = 0
+                            new_meals = []
                             for _, meal in yesterday_meals.iterrows():
                                 # Kopieer meal naar vandaag
-                                new_meal = {
+                                new_meals.append({
                                     'maaltijd': meal.get('maaltijd', 'Tussendoor'),
                                     'omschrijving': meal.get('omschrijving', ''),
                                     'calorien': meal.get('calorien', 0),
@@ -3060,12 +3001,11 @@ def main():
                                     'koolhydraten': meal.get('koolhydraten', 0),
                                     'vetten': meal.get('vetten', 0),
                                     'datum': today.strftime('%d/%m/%Y')
-                                }
-                                sheets_helper.write_to_voeding(new_meal, sheet_id=user_sheet_id)
-                                copied_count += 1
+                                })
+                            # All meals in one append call
+                            copied_count = sheets_helper.write_many_to_voeding(new_meals, sheet_id=user_sheet_id)
                             
                             st.success(f"✅ {copied_count} maaltijden gekopieerd van gisteren!")
-                            st.cache_data.clear()
                             time.sleep(1)
                             st.rerun()
                         except Exception as e:
@@ -3105,8 +3045,17 @@ def main():
             )
             
             # Load favorites en recente maaltijden
-            favorites = sheets_helper.load_favorite_meals(current_username, user_sheet_id)
-            recent_meals = sheets_helper.get_recent_meals(current_username, user_sheet_id, limit=3)
+            # Gecached per tabblad-versie: geen Sheets API calls bij elke rerun
+            favorites = data_helper.memoize(
+                user_sheet_id, ['favorieten'], f"favorites_{current_username}",
+                lambda: sheets_helper.load_favorite_meals(current_username, user_sheet_id),
+                ttl=data_helper.CACHE_TTL
+            )
+            recent_meals = data_helper.memoize(
+                user_sheet_id, ['voeding'], f"recent_meals_{current_username}",
+                lambda: sheets_helper.get_recent_meals(current_username, user_sheet_id, limit=3),
+                ttl=data_helper.CACHE_TTL
+            )
             
             # Toon quick-select buttons als er favorieten/recente items zijn
             if favorites or recent_meals:
@@ -3157,7 +3106,6 @@ def main():
                                 sheets_helper.write_to_voeding(parsed_data, sheet_id=user_sheet_id)
                                 
                                 st.success(f"✅ {maaltijd_type} toegevoegd: {parsed_data['calorien']:.0f} kcal")
-                                st.cache_data.clear()
                                 time.sleep(0.5)
                                 st.rerun()
                         except Exception as e:
@@ -3201,6 +3149,7 @@ def main():
                                     )
                                     
                                     if success:
+                                        data_helper.invalidate(user_sheet_id, 'favorieten')
                                         st.success(f"✅ '{fav_name}' opgeslagen als favoriet!")
                                         st.session_state['saving_favorite'] = False
                                         time.sleep(1)
@@ -3246,7 +3195,6 @@ def main():
                             user_sheet_id = st.session_state.get('user_sheet_id')
                             sheets_helper.write_to_gewicht(gewicht_input, sheet_id=user_sheet_id)
                             st.success(f"✅ Gewicht gelogd: {gewicht_input:.1f}kg")
-                            st.cache_data.clear()
                             time.sleep(0.5)
                             st.rerun()
                     except Exception as e:
@@ -3280,7 +3228,6 @@ def main():
                             user_sheet_id = st.session_state.get('user_sheet_id')
                             sheets_helper.write_to_stappen(stappen_input, "nee", sheet_id=user_sheet_id)
                             st.success(f"✅ Stappen gelogd: {stappen_input:,}")
-                            st.cache_data.clear()
                             time.sleep(0.5)
                             st.rerun()
                     except Exception as e:
@@ -3292,7 +3239,7 @@ def main():
         st.markdown("### 📋 Gegeten Vandaag")
         
         if not nutrition_df.empty:
-            today_meals = nutrition_df[nutrition_df['datum'].isin([today_str, today_str_dash])]
+            today_meals = schema_helper.day_rows(nutrition_df, today_str)
             
             if not today_meals.empty:
                 for _, meal in today_meals.iterrows():
@@ -3359,7 +3306,7 @@ def main():
             # Get today's steps
             today_stappen = 0
             if not stappen_df.empty:
-                today_stappen_row = stappen_df[stappen_df['datum'].isin([today_str, today_str_dash])]
+                today_stappen_row = schema_helper.day_rows(stappen_df, today_str)
                 if not today_stappen_row.empty:
                     today_stappen = today_stappen_row['stappen'].sum()
             
@@ -3615,8 +3562,8 @@ def main():
             # Calculate activity count for the period
             if view_mode == "📅 Dag":
                 if not activities_with_calories.empty:
-                    cardio_count = len(activities_with_calories[activities_with_calories['type'].str.lower() == 'cardio'])
-                    kracht_count = len(activities_with_calories[activities_with_calories['type'].str.lower() == 'kracht'])
+                    cardio_count = len(activities_with_calories[activities_with_calories['type'] == 'Cardio'])
+                    kracht_count = len(activities_with_calories[activities_with_calories['type'] == 'Kracht'])
                     activity_summary = f"{cardio_count + kracht_count}"
                     activity_detail = f"{cardio_count} cardio · {kracht_count} kracht"
                     label = "sessies vandaag"
@@ -3775,32 +3722,19 @@ def main():
             if not period_activities.empty:
                 st.markdown("### 🏃 Activiteiten Overzicht")
                 
-                # Calculate daily calories burned
-                activities_by_date = []
-                current_date = start_date
-                while current_date <= end_date:
-                    date_str = current_date.strftime("%d/%m/%Y")
-                    day_activities = period_activities[period_activities['datum'] == date_str]
-                    
-                    if not day_activities.empty:
-                        cals, _ = calculate_total_calories_burned(day_activities)
-                        cardio = len(day_activities[day_activities['type'].str.lower() == 'cardio'])
-                        kracht = len(day_activities[day_activities['type'].str.lower() == 'kracht'])
-                    else:
-                        cals = 0
-                        cardio = 0
-                        kracht = 0
-                    
-                    activities_by_date.append({
-                        'datum': date_str,
-                        'calories': cals,
-                        'cardio': cardio,
-                        'kracht': kracht,
-                        'total': cardio + kracht
-                    })
-                    current_date += timedelta(days=1)
-                
-                activities_chart_df = pd.DataFrame(activities_by_date)
+                # Daily calories burned and session counts from the per-day balance table
+                daily_balance = get_daily_balance(
+                    nutrition_df, activities_df, data.get('stappen', pd.DataFrame()),
+                    targets.get('weight', 106.2), calculate_bmr(targets.get('weight', 106.2), height_cm=180, age=30, gender='male')
+                )
+                period_days = daily_balance.reindex(pd.date_range(pd.Timestamp(start_date), pd.Timestamp(end_date), freq='D'), fill_value=0)
+                activities_chart_df = pd.DataFrame({
+                    'datum': period_days.index.strftime('%d/%m/%Y'),
+                    'calories': period_days['activity_kcal'].to_numpy(),
+                    'cardio': period_days['cardio'].to_numpy(),
+                    'kracht': period_days['kracht'].to_numpy(),
+                })
+                activities_chart_df['total'] = activities_chart_df['cardio'] + activities_chart_df['kracht']
                 
                 col1, col2 = st.columns(2)
                 
@@ -3926,25 +3860,16 @@ def main():
         
         st.markdown("<br>", unsafe_allow_html=True)
         
-        # Smart Insights - AI Generated
+        # Smart Insights - AI generated in the background, static until it is ready
+        ai_feedback = None
         if HELPERS_AVAILABLE:
-            try:
-                feedback_data = {
-                    'nutrition': totals,
-                    'view_mode': view_mode,
-                    'start_date': start_date,
-                    'end_date': end_date
-                }
-                ai_feedback = groq_helper.generate_insights_and_feedback(
-                    feedback_data, targets, period_stats, name
-                )
-                insights = ai_feedback.get('insights', [])
-            except Exception as e:
-                # Fallback to static if AI fails (including rate limits)
-                error_msg = str(e)
-                if "rate_limit" in error_msg.lower() or "429" in error_msg:
-                    st.info("💡 AI inzichten tijdelijk niet beschikbaar (rate limit). Standaard inzichten worden getoond.")
-                insights = generate_insights(period_stats, totals, view_mode, targets)
+            ai_feedback, insights_key = get_ai_feedback(
+                username, name, user_sheet_id, view_mode, start_date, end_date, totals, targets, period_stats
+            )
+            if ai_feedback is None:
+                show_ai_fallback_notice(insights_key, "inzichten")
+        if ai_feedback is not None:
+            insights = ai_feedback.get('insights', [])
         else:
             insights = generate_insights(period_stats, totals, view_mode, targets)
         
@@ -3981,33 +3906,19 @@ def main():
         trends = analyze_measurements(metingen_df)
         
         if trends and (trends['vet_change'] > 0.5 or trends['spier_change'] < -0.5):
+            warning_msg = None
             if HELPERS_AVAILABLE:
-                try:
-                    # Generate AI warning
-                    warning_msg = groq_helper.generate_measurement_warning(
-                        vet_change=trends['vet_change'],
-                        spier_change=trends['spier_change'],
-                        current_nutrition=totals,
-                        targets=targets,
-                        name=name
-                    )
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, rgba(239, 68, 68, 0.2), rgba(220, 38, 38, 0.2)); 
-                                padding: 18px; border-radius: 10px; border-left: 4px solid #ef4444; margin: 20px 0;">
-                        {warning_msg}
-                    </div>
-                    """, unsafe_allow_html=True)
-                except:
-                    # Fallback to static
-                    st.markdown(f"""
-                    <div style="background: linear-gradient(135deg, rgba(239, 68, 68, 0.2), rgba(220, 38, 38, 0.2)); 
-                                padding: 18px; border-radius: 10px; border-left: 4px solid #ef4444; margin: 20px 0;">
-                        <h3 style="margin: 0 0 15px 0;">⚠️ Belangrijke Waarschuwing!</h3>
-                        <p style="margin: 8px 0;"><strong>Vetpercentage gestegen:</strong> +{trends['vet_change']:.1f}%</p>
-                        <p style="margin: 8px 0;"><strong>Spiermassa gedaald:</strong> {trends['spier_change']:.1f} kg</p>
-                        <p style="margin: 15px 0 0 0; opacity: 0.9;"><strong>Conclusie:</strong> Je verliest spier in plaats van vet! Dit komt door te weinig calorieën en/of eiwit.</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                # AI warning from the background worker, static warning until it is ready
+                warning_msg = get_measurement_warning(
+                    username, name, user_sheet_id, view_mode, start_date, end_date, trends, totals, targets
+                )
+            if warning_msg is not None:
+                st.markdown(f"""
+                <div style="background: linear-gradient(135deg, rgba(239, 68, 68, 0.2), rgba(220, 38, 38, 0.2)); 
+                            padding: 18px; border-radius: 10px; border-left: 4px solid #ef4444; margin: 20px 0;">
+                    {warning_msg}
+                </div>
+                """, unsafe_allow_html=True)
             else:
                 # Static fallback
                 st.markdown(f"""
@@ -4025,36 +3936,10 @@ def main():
             st.markdown("---")
             st.markdown("### 📋 Analyse & Feedback")
             
-            # Get AI feedback
-            if HELPERS_AVAILABLE:
-                try:
-                    feedback_data = {
-                        'nutrition': totals,
-                        'view_mode': view_mode,
-                        'start_date': start_date,
-                        'end_date': end_date
-                    }
-                    ai_feedback = groq_helper.generate_insights_and_feedback(
-                        feedback_data, targets, period_stats, name
-                    )
-                    issues = ai_feedback.get('improvements', [])
-                    successes = ai_feedback.get('successes', [])
-                except Exception as e:
-                    # Fallback to static (including rate limits)
-                    error_msg = str(e)
-                    if "rate_limit" in error_msg.lower() or "429" in error_msg:
-                        st.info("💡 AI feedback tijdelijk niet beschikbaar (rate limit). Standaard feedback wordt getoond.")
-                    issues = []
-                    if totals['calorien'] < 1900:
-                        issues.append(f"🔴 Te weinig calorieën: {totals['calorien']:.0f} kcal is te laag voor training")
-                    if totals['eiwit'] < 140:
-                        issues.append(f"🟡 Eiwit te laag: {totals['eiwit']:.0f}g (doel: 160g)")
-                    issues.append("🟡 Voeg meer groenten toe bij elke maaltijd")
-                    
-                    successes = []
-                    if totals['eiwit'] >= 140:
-                        successes.append(f"🟢 Uitstekende eiwitinname: {totals['eiwit']:.0f}g!")
-                    successes.append("🟢 Consistente training en data bijhouden")
+            # AI feedback comes from the same background result as the insights above
+            if ai_feedback is not None:
+                issues = ai_feedback.get('improvements', [])
+                successes = ai_feedback.get('successes', [])
             else:
                 # Static fallback
                 issues = []
@@ -4145,7 +4030,7 @@ def main():
             # Filter for selected date/period
             if view_mode == "📅 Dag":
                 selected_date_str = start_date.strftime("%d/%m/%Y")
-                today_meals = nutrition_df[nutrition_df['datum'] == selected_date_str]
+                today_meals = schema_helper.day_rows(nutrition_df, selected_date_str)
                 period_label = selected_date_str
             else:
                 today_meals = filter_by_date_range(nutrition_df, start_date, end_date)
@@ -4212,28 +4097,19 @@ def main():
             period_activities = filter_by_date_range(activities_df, start_date, end_date)
             
             # Case-insensitive filtering for cardio
-            cardio = period_activities[period_activities['type'].str.lower() == 'cardio']
+            cardio = period_activities[period_activities['type'] == 'Cardio']
             
             # Calculate comparison based on selected period type
             # Calculate period length to determine comparison window
             period_days = (end_date - start_date).days + 1
             prev_period_start = start_date - timedelta(days=period_days)
             prev_period_end = end_date - timedelta(days=period_days)
-            prev_period_activities = filter_by_date_range(activities_df, prev_period_start, prev_period_end)
-            prev_week_cardio = prev_period_activities[prev_period_activities['type'].str.lower() == 'cardio']
+            prev_cardio = get_analytics(nutrition_df, activities_df, stappen_df).period_totals(prev_period_start, prev_period_end, 'Cardio')
             
             if not cardio.empty:
                 # Calculate calories for cardio activities
                 cardio_with_cals = cardio.copy()
-                cardio_with_cals['Calorieën Verbrand'] = cardio_with_cals.apply(
-                    lambda row: estimate_calories_burned(
-                        row.get('type', ''),
-                        row.get('activiteit', ''),
-                        row.get('afstand', ''),
-                        row.get('duur', '')
-                    ),
-                    axis=1
-                )
+                cardio_with_cals['Calorieën Verbrand'] = calorie_helper.estimate_calories_frame(cardio_with_cals)
                 
                 # Display cardio activities with calories
                 display_cardio = cardio_with_cals[['datum', 'activiteit', 'afstand', 'duur', 'Calorieën Verbrand']].copy()
@@ -4245,24 +4121,15 @@ def main():
                 st.markdown(render_dataframe_html(display_cardio), unsafe_allow_html=True)
                 
                 # Calculate comparisons
-                sessions_change = len(cardio) - len(prev_week_cardio)
+                sessions_change = len(cardio) - prev_cardio['sessions']
                 sessions_arrow = "↑" if sessions_change > 0 else "↓" if sessions_change < 0 else "→"
                 sessions_badge_bg = "rgba(34, 197, 94, 0.2)" if sessions_change > 0 else "rgba(239, 68, 68, 0.2)" if sessions_change < 0 else "rgba(148, 163, 184, 0.2)"
                 sessions_badge_border = "rgba(34, 197, 94, 0.4)" if sessions_change > 0 else "rgba(239, 68, 68, 0.4)" if sessions_change < 0 else "rgba(148, 163, 184, 0.4)"
                 sessions_color = "#4ade80" if sessions_change > 0 else "#f87171" if sessions_change < 0 else "#94a3b8"
                 
-                # Helper function for parsing distance
-                def parse_distance(val):
-                    if pd.isna(val) or val == '':
-                        return 0
-                    try:
-                        return float(str(val).replace(',', '.'))
-                    except:
-                        return 0
-                
-                # Calculate distance comparison
-                total_distance = cardio['afstand'].apply(parse_distance).sum() if 'afstand' in cardio.columns else 0
-                prev_week_distance = prev_week_cardio['afstand'].apply(parse_distance).sum() if 'afstand' in prev_week_cardio.columns and not prev_week_cardio.empty else 0
+                # Calculate distance comparison (afstand is numeric, NaN is skipped)
+                total_distance = cardio['afstand'].sum() if 'afstand' in cardio.columns else 0
+                prev_week_distance = prev_cardio['distance']
                 
                 distance_change = 0
                 distance_change_pct = 0
@@ -4336,23 +4203,9 @@ def main():
                 # Calculate speed/pace for each session
                 cardio_analysis = []
                 for _, row in cardio.iterrows():
-                    # Parse distance
-                    try:
-                        distance = float(str(row['afstand']).replace(',', '.')) if pd.notna(row['afstand']) and row['afstand'] != '' else 0
-                    except:
-                        distance = 0
-                    
-                    # Parse duration
-                    duration_minutes = 0
-                    if pd.notna(row['duur']) and row['duur'] != '':
-                        try:
-                            time_parts = str(row['duur']).split(':')
-                            if len(time_parts) == 3:
-                                duration_minutes = int(time_parts[0]) * 60 + int(time_parts[1]) + int(time_parts[2])/60
-                            elif len(time_parts) == 2:
-                                duration_minutes = int(time_parts[0]) + int(time_parts[1])/60
-                        except:
-                            duration_minutes = 0
+                    # Typed columns: afstand in km, duur_sec in seconds
+                    distance = row['afstand'] if pd.notna(row['afstand']) else 0
+                    duration_minutes = row['duur_sec'] / 60 if pd.notna(row['duur_sec']) else 0
                     
                     if distance > 0 and duration_minutes > 0:
                         speed = (distance / duration_minutes) * 60  # km/h
@@ -4371,7 +4224,7 @@ def main():
                     analysis_df = pd.DataFrame(cardio_analysis)
                     
                     # Convert datum to datetime for proper formatting
-                    analysis_df['date_obj'] = pd.to_datetime(analysis_df['datum'], dayfirst=True, errors='coerce')
+                    analysis_df['date_obj'] = schema_helper.date_values(analysis_df)
                     
                     # Group by activity type
                     for activity_type in analysis_df['activiteit'].unique():
@@ -4481,24 +4334,14 @@ def main():
                 avg_steps = period_stappen['stappen'].mean() if 'stappen' in period_stappen.columns else 0
                 
                 # Calculate cardio steps to subtract (from walking activities)
-                cardio_steps_total = 0
-                if not cardio.empty and 'afstand' in cardio.columns:
-                    # For each cardio walking session, estimate steps (1 km ≈ 1250 stappen)
-                    for _, row in cardio.iterrows():
-                        try:
-                            distance = float(str(row['afstand']).replace(',', '.')) if pd.notna(row['afstand']) and row['afstand'] != '' else 0
-                            # Convert km to steps (average: 1250 steps per km)
-                            cardio_steps_total += distance * 1250
-                        except:
-                            pass
+                sport_steps_by_date = get_sport_steps_by_date(activities_df)
+                cardio_steps_total = sport_steps_by_date.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)].sum()
                 
                 # Split by cardio yes/no
                 if 'cardio' in period_stappen.columns:
-                    # Normalize cardio column (handle ja/yes/nee/no)
-                    period_stappen['cardio_normalized'] = period_stappen['cardio'].astype(str).str.lower().str.strip()
-                    
-                    non_cardio_days = period_stappen[period_stappen['cardio_normalized'].isin(['nee', 'no', 'n'])]
-                    cardio_days = period_stappen[period_stappen['cardio_normalized'].isin(['ja', 'yes', 'j'])]
+                    # Cardio column is normalised to 'ja'/'nee' by schema_helper
+                    non_cardio_days = period_stappen[period_stappen['cardio'] == 'nee']
+                    cardio_days = period_stappen[period_stappen['cardio'] == 'ja']
                     
                     # For non-cardio days: just use the steps as-is
                     non_cardio_steps = non_cardio_days['stappen'].sum() if not non_cardio_days.empty else 0
@@ -4597,28 +4440,20 @@ def main():
                         datum_str = current_date.strftime('%d/%m/%Y')
                         
                         # Find matching step data for this date
-                        matching_steps = period_stappen[period_stappen['datum'] == datum_str]
+                        matching_steps = schema_helper.day_rows(period_stappen, datum_str)
                         if not matching_steps.empty:
                             stappen = matching_steps.iloc[0]['stappen'] if 'stappen' in matching_steps.columns and pd.notna(matching_steps.iloc[0]['stappen']) else 0
-                            is_cardio = matching_steps.iloc[0].get('cardio_normalized', 'nee') in ['ja', 'yes', 'j']
+                            is_cardio = matching_steps.iloc[0].get('cardio', 'nee') == 'ja'
                         else:
                             stappen = 0
                             is_cardio = False
                         
-                        # Find matching cardio distance for this date
-                        cardio_dist = 0
-                        if is_cardio and not cardio.empty:
-                            matching_cardio = cardio[cardio['datum'] == datum_str]
-                            if not matching_cardio.empty and 'afstand' in matching_cardio.columns:
-                                for _, c_row in matching_cardio.iterrows():
-                                    try:
-                                        dist = float(str(c_row['afstand']).replace(',', '.')) if pd.notna(c_row['afstand']) and c_row['afstand'] != '' else 0
-                                        cardio_dist += dist
-                                    except:
-                                        pass
+                        # Estimated sport steps for this date (only on days marked as cardio)
+                        cardio_steps_est = 0
+                        if is_cardio:
+                            cardio_steps_est = sport_steps_by_date.get(pd.Timestamp(current_date), 0)
                         
                         # Calculate splits
-                        cardio_steps_est = cardio_dist * 1250
                         background_steps = max(0, stappen - cardio_steps_est)
                         
                         daily_breakdown.append({
@@ -4757,58 +4592,24 @@ def main():
             period_activities = filter_by_date_range(activities_df, start_date, end_date)
             
             # Case-insensitive filtering for strength
-            strength = period_activities[period_activities['type'].str.lower() == 'kracht']
+            strength = period_activities[period_activities['type'] == 'Kracht']
             
             if not strength.empty:
                 # Calculate calories and volume
                 strength_cals_total, strength_with_cals = calculate_total_calories_burned(strength)
                 
-                # Calculate week-over-week comparison
+                # Calculate week-over-week comparison and per-exercise stats (volume = gewicht × sets × reps)
                 prev_week_start = start_date - timedelta(days=7)
                 prev_week_end = end_date - timedelta(days=7)
-                prev_week_activities = filter_by_date_range(activities_df, prev_week_start, prev_week_end)
-                prev_week_strength = prev_week_activities[prev_week_activities['type'].str.lower() == 'kracht']
-                
-                # Calculate total volume and find PRs
-                total_volume = 0
-                prev_week_volume = 0
-                exercise_stats = {}
+                analytics = get_analytics(nutrition_df, activities_df, stappen_df)
+                comparison = analytics.compare_periods(start_date, end_date, prev_week_start, prev_week_end, 'Kracht')
+                total_volume = comparison['current']['volume']
+                prev_week_volume = comparison['previous']['volume']
                 
-                # Calculate previous week volume
-                for _, row in prev_week_strength.iterrows():
-                    try:
-                        weight = float(str(row.get("gewicht", 0)).replace(",", ".")) if pd.notna(row.get("gewicht")) else 0
-                        sets = int(row.get("sets", 0)) if pd.notna(row.get("sets")) else 0
-                        reps = int(row.get("reps", 0)) if pd.notna(row.get("reps")) else 0
-                        prev_week_volume += weight * sets * reps
-                    except:
-                        pass
-                
-                # Calculate current week
-                for _, row in strength.iterrows():
-                    try:
-                        exercise = row.get('activiteit', 'Unknown')
-                        weight = float(str(row.get("gewicht", 0)).replace(",", ".")) if pd.notna(row.get("gewicht")) else 0
-                        sets = int(row.get("sets", 0)) if pd.notna(row.get("sets")) else 0
-                        reps = int(row.get("reps", 0)) if pd.notna(row.get("reps")) else 0
-                        volume = weight * sets * reps
-                        total_volume += volume
-                        
-                        # Track per exercise
-                        if exercise not in exercise_stats:
-                            exercise_stats[exercise] = {
-                                'max_weight': weight,
-                                'total_volume': 0,
-                                'count': 0,
-                                'dates': []
-                            }
-                        
-                        exercise_stats[exercise]['max_weight'] = max(exercise_stats[exercise]['max_weight'], weight)
-                        exercise_stats[exercise]['total_volume'] += volume
-                        exercise_stats[exercise]['count'] += 1
-                        exercise_stats[exercise]['dates'].append(row.get('datum'))
-                    except:
-                        pass
+                # Per exercise, in order of first appearance: max weight (PR), volume and count
+                exercise_stats = analytics.exercise_stats(start_date, end_date, 'Kracht').set_index('activiteit')[
+                    ['max_weight', 'total_volume', 'count']
+                ].to_dict('index')
                 
                 # Calculate comparison
                 volume_change = 0
@@ -4822,7 +4623,7 @@ def main():
                 volume_badge_border = "rgba(34, 197, 94, 0.4)" if volume_change > 0 else "rgba(239, 68, 68, 0.4)" if volume_change < 0 else "rgba(148, 163, 184, 0.4)"
                 volume_color = "#4ade80" if volume_change > 0 else "#f87171" if volume_change < 0 else "#94a3b8"
                 
-                sessions_change = len(strength) - len(prev_week_strength)
+                sessions_change = len(strength) - comparison['previous']['sessions']
                 sessions_arrow = "↑" if sessions_change > 0 else "↓" if sessions_change < 0 else "→"
                 sessions_badge_bg = "rgba(34, 197, 94, 0.2)" if sessions_change > 0 else "rgba(239, 68, 68, 0.2)" if sessions_change < 0 else "rgba(148, 163, 184, 0.2)"
                 sessions_badge_border = "rgba(34, 197, 94, 0.4)" if sessions_change > 0 else "rgba(239, 68, 68, 0.4)" if sessions_change < 0 else "rgba(148, 163, 184, 0.4)"
@@ -5011,7 +4812,7 @@ def main():
             week_weight_change = 0
             if not gewicht_df.empty and 'datum' in gewicht_df.columns and 'gewicht' in gewicht_df.columns:
                 gewicht_daily = gewicht_df.copy()
-                gewicht_daily['date_obj'] = pd.to_datetime(gewicht_daily['datum'], dayfirst=True, errors='coerce')
+                gewicht_daily['date_obj'] = schema_helper.date_values(gewicht_daily)
                 gewicht_daily = gewicht_daily.dropna(subset=['date_obj', 'gewicht'])
                 gewicht_daily = gewicht_daily.sort_values('date_obj')
                 
@@ -5326,7 +5127,7 @@ def main():
                 # Add daily weight data if available
                 if not gewicht_df.empty and 'datum' in gewicht_df.columns and 'gewicht' in gewicht_df.columns:
                     gewicht_daily = gewicht_df.copy()
-                    gewicht_daily['date_obj'] = pd.to_datetime(gewicht_daily['datum'], dayfirst=True, errors='coerce')
+                    gewicht_daily['date_obj'] = schema_helper.date_values(gewicht_daily)
                     gewicht_daily = gewicht_daily.dropna(subset=['date_obj', 'gewicht'])
                     gewicht_daily = gewicht_daily.sort_values('date_obj')
                     
@@ -5880,24 +5681,50 @@ def main():
                                 user_sheet_id = st.session_state.get('user_sheet_id')
                                 sheets_helper.write_to_voeding(parsed_data, sheet_id=user_sheet_id)
                                 
-                                st.success("✅ Succesvol toegevoegd aan Google Sheets!")
+                                st.success(saved_message())
                                 st.balloons()
                                 
                                 # Set success flag voor volgende run
                                 st.session_state.voeding_success = True
                                 st.session_state.voeding_input_value = ""
                                 
-                                # Clear cache om nieuwe data te laden
-                                st.cache_data.clear()
-                                
                         except Exception as e:
                             st.error(f"❌ Fout: {str(e)}")
             
             with col2:
                 if st.button("🔄 Refresh Data", key="voeding_refresh"):
-                    st.cache_data.clear()
+                    data_helper.invalidate(user_sheet_id, 'voeding')
                     # Verwijder st.rerun() om page jump te voorkomen
             
+            # Whole day (or several snacks) at once: one AI call and one sheet append
+            with st.expander("📋 Meerdere maaltijden tegelijk", expanded=False):
+                batch_input = st.text_area(
+                    "Zet elke maaltijd op een eigen regel met het type ervoor",
+                    placeholder="Ontbijt: 250g vetvrije kwark, 1 banaan\nLunch: 2 volkoren boterhammen met kipfilet\nTussendoor: appel",
+                    height=120,
+                    key="voeding_batch_input"
+                )
+                if st.button("➕ Alles toevoegen", key="voeding_batch_submit"):
+                    if not batch_input.strip():
+                        st.error("Vul eerst in wat je hebt gegeten!")
+                    else:
+                        try:
+                            with st.spinner("AI analyseert alle maaltijden..."):
+                                # Lines without a heading use the meal type selected above
+                                meals = groq_helper.parse_nutrition_batch(batch_input, maaltijd_type)
+                                today_str = datetime.now().strftime('%d/%m/%Y')
+                                for meal in meals:
+                                    meal['datum'] = today_str
+                                
+                                user_sheet_id = st.session_state.get('user_sheet_id')
+                                added = sheets_helper.write_many_to_voeding(meals, sheet_id=user_sheet_id)
+                            
+                            preview_df = pd.DataFrame(meals)[['maaltijd', 'omschrijving', 'calorien', 'eiwit', 'koolhydraten', 'vetten']]
+                            st.markdown(render_dataframe_html(preview_df, max_height="300px"), unsafe_allow_html=True)
+                            st.success(saved_message(f"{added} maaltijd(en)"))
+                        except Exception as e:
+                            st.error(f"❌ Fout: {str(e)}")
+            
             # Toon recente geschiedenis
             st.markdown("---")
             st.markdown("### 📜 Recente Invoer (laatste 10)")
@@ -5906,7 +5733,7 @@ def main():
                 voeding_df = get_voeding_data()
                 if not voeding_df.empty:
                     # Sorteer op datum (nieuwste eerst) en pak laatste 10
-                    recent_df = voeding_df.sort_values('datum', ascending=False).head(10)
+                    recent_df = voeding_df.sort_values('datum_dt', ascending=False).head(10)
                     # Toon als mooie tabel met custom styling
                     display_df = recent_df[['datum', 'maaltijd', 'omschrijving', 'calorien', 'eiwit', 'koolhydraten', 'vetten']].copy()
                     st.markdown(render_dataframe_html(display_df, max_height="400px"), unsafe_allow_html=True)
@@ -5962,18 +5789,15 @@ def main():
                                 user_sheet_id = st.session_state.get('user_sheet_id')
                                 sheets_helper.write_to_activiteiten(parsed_data, sheet_id=user_sheet_id)
                                 
-                                st.success("✅ Succesvol toegevoegd aan Google Sheets!")
+                                st.success(saved_message())
                                 st.balloons()
                                 
-                                # Clear cache om nieuwe data te laden
-                                st.cache_data.clear()
-                                
                         except Exception as e:
                             st.error(f"❌ Fout: {str(e)}")
             
             with col2:
                 if st.button("🔄 Refresh Data", key="kracht_refresh"):
-                    st.cache_data.clear()
+                    data_helper.invalidate(user_sheet_id, 'activiteiten')
             
             # Toon recente geschiedenis
             st.markdown("---")
@@ -5984,7 +5808,7 @@ def main():
                     # Filter alleen kracht
                     kracht_df = activiteiten_df[activiteiten_df['type'] == 'Kracht']
                     if not kracht_df.empty:
-                        recent_df = kracht_df.sort_values('datum', ascending=False).head(10)
+                        recent_df = kracht_df.sort_values('datum_dt', ascending=False).head(10)
                         display_df = recent_df[['datum', 'activiteit', 'gewicht', 'sets', 'reps', 'methode']].copy()
                         st.markdown(render_dataframe_html(display_df, max_height="400px"), unsafe_allow_html=True)
                     else:
@@ -6037,18 +5861,15 @@ def main():
                                 user_sheet_id = st.session_state.get('user_sheet_id')
                                 sheets_helper.write_to_activiteiten(parsed_data, sheet_id=user_sheet_id)
                                 
-                                st.success("✅ Succesvol toegevoegd aan Google Sheets!")
+                                st.success(saved_message())
                                 st.balloons()
                                 
-                                # Clear cache om nieuwe data te laden
-                                st.cache_data.clear()
-                                
                         except Exception as e:
                             st.error(f"❌ Fout: {str(e)}")
             
             with col2:
                 if st.button("🔄 Refresh Data", key="cardio_refresh"):
-                    st.cache_data.clear()
+                    data_helper.invalidate(user_sheet_id, 'activiteiten')
             
             # Toon recente geschiedenis
             st.markdown("---")
@@ -6059,7 +5880,7 @@ def main():
                     # Filter alleen cardio
                     cardio_df = activiteiten_df[activiteiten_df['type'] == 'Cardio']
                     if not cardio_df.empty:
-                        recent_df = cardio_df.sort_values('datum', ascending=False).head(10)
+                        recent_df = cardio_df.sort_values('datum_dt', ascending=False).head(10)
                         display_df = recent_df[['datum', 'activiteit', 'afstand', 'duur']].copy()
                         st.markdown(render_dataframe_html(display_df, max_height="400px"), unsafe_allow_html=True)
                     else:
@@ -6116,7 +5937,7 @@ def main():
                                 user_sheet_id = st.session_state.get('user_sheet_id')
                                 sheets_helper.write_to_stappen(stappen_input, cardio_str, sheet_id=user_sheet_id)
                                 
-                                st.success("✅ Succesvol toegevoegd aan Google Sheets!")
+                                st.success(saved_message())
                                 st.balloons()
                                 
                         except Exception as e:
@@ -6124,7 +5945,7 @@ def main():
             
             with col2:
                 if st.button("🔄 Refresh Data", key="stappen_refresh"):
-                    st.cache_data.clear()
+                    data_helper.invalidate(user_sheet_id, 'stappen')
             
             # Toon recente geschiedenis
             st.markdown("---")
@@ -6132,7 +5953,7 @@ def main():
             try:
                 stappen_df = get_stappen_data()
                 if not stappen_df.empty:
-                    recent_df = stappen_df.sort_values('datum', ascending=False).head(10)
+                    recent_df = stappen_df.sort_values('datum_dt', ascending=False).head(10).drop(columns=['datum_dt'])
                     st.markdown(render_dataframe_html(recent_df, max_height="400px"), unsafe_allow_html=True)
                 else:
                     st.info("Nog geen stappen data gevonden.")
@@ -6184,7 +6005,7 @@ def main():
                                 user_sheet_id = st.session_state.get('user_sheet_id')
                                 sheets_helper.write_to_gewicht(gewicht_input, sheet_id=user_sheet_id)
                                 
-                                st.success("✅ Succesvol toegevoegd aan Google Sheets!")
+                                st.success(saved_message())
                                 st.balloons()
                                 
                         except Exception as e:
@@ -6192,7 +6013,7 @@ def main():
             
             with col2:
                 if st.button("🔄 Refresh Data", key="gewicht_refresh"):
-                    st.cache_data.clear()
+                    data_helper.invalidate(user_sheet_id, 'gewicht')
             
             # Toon recente geschiedenis
             st.markdown("---")
@@ -6200,7 +6021,7 @@ def main():
             try:
                 gewicht_df = get_gewicht_data()
                 if not gewicht_df.empty:
-                    recent_df = gewicht_df.sort_values('datum', ascending=False).head(10)
+                    recent_df = gewicht_df.sort_values('datum_dt', ascending=False).head(10).drop(columns=['datum_dt'])
                     st.markdown(render_dataframe_html(recent_df, max_height="400px"), unsafe_allow_html=True)
                 else:
                     st.info("Nog geen gewicht data gevonden.")
@@ -6245,15 +6066,18 @@ def main():
                                 st.success("✅ Succesvol toegevoegd aan Google Sheets!")
                                 st.balloons()
                                 
-                                # Clear cache om nieuwe data te laden
-                                st.cache_data.clear()
+                                # Alleen dit tabblad opnieuw laden (niet de hele cache)
+                                data_helper.invalidate(user_sheet_id, 'metingen')
                                 
                         except Exception as e:
                             st.error(f"❌ Fout: {str(e)}")
             
             with col2:
                 if st.button("🔄 Refresh Data", key="metingen_refresh"):
-                    st.cache_data.clear()
+                    data_helper.invalidate(user_sheet_id, 'metingen')
+    
+    # Swap in AI output that was still being generated when this run rendered
+    watch_pending_ai()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,718 @@
+"""
+Helper functies voor het laden van Google Sheets data
+Haalt de tabbladen parallel op via de publieke gviz CSV export en houdt
+per sheet en tabblad een lokale Parquet snapshot bij, zodat een refresh van
+een tabblad waar alleen rijen aan toegevoegd worden (zie `APPEND_ONLY_TABS`)
+alleen de nieuwe rijen onderaan hoeft op te halen. Schrijfacties worden
+direct in de cache verwerkt (write-through) en later op de achtergrond
+gecontroleerd tegen de echte sheet. Verlopen tabbladen worden meteen uit de
+cache geserveerd en op de achtergrond ververst (stale-while-revalidate). Voor
+een refresh wordt eerst de revisie van de spreadsheet gecontroleerd; is die niet
+veranderd, dan blijven de gecachte tabbladen staan zonder download. Rijen die nog
+in de outbox staan (zie outbox_helper) worden aan elk gedownload tabblad toegevoegd
+"""
+import io
+import os
+import threading
+import time
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+import requests
+from requests.adapters import HTTPAdapter
+import quota_helper
+import schema_helper
+
+# Alle tabbladen die het dashboard gebruikt
+SHEET_TABS = ['voeding', 'activiteiten', 'metingen', 'egym', 'stappen', 'gewicht', 'doelen']
+
+# Tabbladen die mogen ontbreken zonder waarschuwing
+OPTIONAL_TABS = {'doelen'}
+
+GVIZ_URL = "https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv&headers=1&sheet={tab}"
+
+# Lokale map voor de snapshots (per sheet ID een submap, per tabblad een Parquet bestand)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join('.cache', 'snapshots'))
+
+# Tabbladen waar alleen rijen onderaan bij komen; alleen die worden incrementeel gesynct.
+# De andere tabbladen (metingen, doelen, ...) worden ook in bestaande rijen bijgewerkt
+APPEND_ONLY_TABS = {'voeding', 'activiteiten', 'stappen', 'gewicht'}
+
+# Na hoeveel seconden een snapshot sowieso volledig opnieuw gedownload wordt, zodat
+# handmatige wijzigingen boven de laatste rij ook in een append-only tabblad binnenkomen
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', '3600'))
+
+# Maximale tijd (seconden) die we op één tabblad wachten
+TAB_TIMEOUT = 10
+
+# Hoe lang (seconden) een geladen tabblad in de cache geldig blijft
+CACHE_TTL = 300
+
+# Verlopen tabbladen direct serveren en op de achtergrond verversen (0 = blokkerend verversen)
+STALE_WHILE_REVALIDATE = os.getenv('STALE_WHILE_REVALIDATE', '1') != '0'
+
+# Na hoeveel seconden een write-through tabblad op de achtergrond met de sheet wordt vergeleken
+# (de CSV export loopt soms een paar seconden achter op net toegevoegde rijen)
+RECONCILE_DELAY = 30
+
+# Hoe lang (seconden) na een write-through een kortere export nog als achterstand geldt;
+# daarna wint de sheet (bijv. een handmatig verwijderde rij)
+WRITE_CONFIRM_WINDOW = 2 * RECONCILE_DELAY
+
+_session = None
+_session_lock = threading.Lock()
+
+# Gedeelde pool zodat een trage download niet blokkeert bij het afsluiten van een `with` blok
+_executor = ThreadPoolExecutor(max_workers=len(SHEET_TABS), thread_name_prefix='sheet-fetch')
+
+# Eén achtergrond worker voor stale-while-revalidate, met de sheets die nu ververst worden
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sheet-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Functie sheet_id -> revisie (bijv. Drive modifiedTime), zie `set_revision_provider`
+_revision_provider: Optional[Callable[[str], Optional[str]]] = None
+
+# Opslag backend (storage_helper.StorageBackend); None = publieke gviz CSV export
+_storage_backend = None
+
+# Functie (sheet_id, tab) -> rijen die nog geschreven moeten worden, zie `set_pending_provider`
+_pending_provider: Optional[Callable[[str, str], List[List[Any]]]] = None
+
+def get_http_session() -> requests.Session:
+    """Gedeelde keep-alive HTTP sessie, zodat alle tabbladen dezelfde verbindingen hergebruiken"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=len(SHEET_TABS))
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def fetch_tab(sheet_id: str, tab: str, timeout: float = TAB_TIMEOUT, offset: int = 0) -> pd.DataFrame:
+    """
+    Download één tabblad als ruwe DataFrame (alle waarden als tekst)
+
+    Args:
+        offset: Aantal datarijen om over te slaan (header komt altijd mee)
+    """
+    url = GVIZ_URL.format(sheet_id=sheet_id, tab=tab)
+    if offset > 0:
+        url += '&tq=' + quote(f'select * offset {offset}')
+    deadline = time.time() + timeout
+
+    def get():
+        response = get_http_session().get(url, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    # Eigen rate limit (de export telt niet mee voor de Sheets API quota), retries op 429/5xx binnen de timeout
+    response = quota_helper.call('export', get, deadline=deadline)
+    return pd.read_csv(io.BytesIO(response.content), dtype=str, keep_default_na=False)
+
+class SnapshotStore:
+    """
+    Lokale kolom-opslag (Parquet) van de ruwe tabbladen, per sheet ID en tabblad
+
+    De snapshot bevat de waarden als tekst precies zoals de CSV export ze levert,
+    zodat een nieuwe delta zonder type-verschillen vergeleken en toegevoegd kan worden.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+
+    def _path(self, sheet_id: str, tab: str) -> str:
+        return os.path.join(self.root, sheet_id, f"{tab}.parquet")
+
+    def load(self, sheet_id: str, tab: str) -> Optional[pd.DataFrame]:
+        """Laad de snapshot, of None als er (nog) geen bruikbare snapshot is"""
+        path = self._path(sheet_id, tab)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            print(f"DEBUG: Snapshot {path} onleesbaar, volledige reload: {e}")
+            return None
+
+    def age(self, sheet_id: str, tab: str) -> Optional[float]:
+        """Seconden sinds de snapshot volledig gedownload is, of None als er geen snapshot is"""
+        try:
+            with open(self._path(sheet_id, tab) + '.full') as f:
+                return time.time() - float(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def drop(self, sheet_id: str, tab: Optional[str] = None):
+        """Verwijder de snapshot van één tabblad (of van de hele sheet); de volgende sync is volledig"""
+        tabs = [tab] if tab else SHEET_TABS
+        for t in tabs:
+            for path in (self._path(sheet_id, t), self._path(sheet_id, t) + '.full'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"DEBUG: Kon snapshot {path} niet verwijderen: {e}")
+
+    def save(self, sheet_id: str, tab: str, df: pd.DataFrame, full: bool = False):
+        """
+        Schrijf de snapshot atomair weg (schrijffouten zijn niet fataal)
+
+        Args:
+            full: De snapshot is een volledige download (zet het moment voor `age`)
+        """
+        path = self._path(sheet_id, tab)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            if full:
+                with open(tmp_path, 'w') as f:
+                    f.write(str(time.time()))
+                os.replace(tmp_path, path + '.full')
+        except Exception as e:
+            print(f"DEBUG: Kon snapshot {path} niet opslaan: {e}")
+
+snapshot_store = SnapshotStore()
+
+def infer_dtypes(raw_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Zet een ruwe tekst-DataFrame om naar dezelfde types als pd.read_csv zou kiezen:
+    lege cellen worden NaN en volledig numerieke kolommen worden getallen
+    """
+    df = raw_df.replace('', np.nan)
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+def _to_text(value: Any) -> str:
+    """Tekst zoals de CSV export een geschreven waarde teruggeeft"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return str(value)
+
+def load_frame(tab: str, raw_df: pd.DataFrame) -> pd.DataFrame:
+    """Ruwe tekst-DataFrame naar de getypeerde vorm die het dashboard gebruikt"""
+    return schema_helper.normalize_tab(tab, infer_dtypes(raw_df))
+
+def merge_rows(df: pd.DataFrame, rows: List[List[Any]], tab: str = '') -> Optional[pd.DataFrame]:
+    """
+    Voeg positionele rijen (zoals naar de sheet geschreven) toe aan een getypeerde DataFrame
+
+    De nieuwe rijen gaan door dezelfde type-bepaling als de loader. Geeft None terug
+    als dat niet kan zonder dat de loader de kolom anders zou typeren (bijv. tekst in
+    een getalkolom); de aanroeper valt dan terug op een volledige reload.
+    """
+    if df.empty and len(df.columns) == 0:
+        return None
+
+    # Afgeleide schema kolommen (bijv. 'datum_dt') staan niet in de sheet zelf
+    sheet_columns = [col for col in df.columns if not schema_helper.is_derived(tab, col)]
+    width = len(sheet_columns)
+    raw = pd.DataFrame(
+        [[_to_text(v) for v in (list(row) + [''] * width)[:width]] for row in rows],
+        columns=sheet_columns, dtype=str
+    )
+    new = load_frame(tab, raw)
+
+    for col in sheet_columns:
+        if schema_helper.is_typed(tab, col):
+            continue
+        old_numeric = is_numeric_dtype(df[col])
+        new_numeric = is_numeric_dtype(new[col])
+        if old_numeric == new_numeric or new[col].isna().all() or df[col].isna().all():
+            continue
+        if new_numeric:
+            # Tekstkolom: een getal blijft tekst, net als bij het laden
+            new[col] = raw[col].replace('', np.nan)
+            continue
+        return None
+
+    merged = pd.concat([df, new], ignore_index=True)
+    for col in sheet_columns:
+        if df[col].isna().all() and not new[col].isna().all():
+            # Lege kolom neemt het type van de nieuwe waarde over
+            merged[col] = merged[col].astype(new[col].dtype)
+    # Categorieën opnieuw opbouwen (concat van verschillende categorieën geeft tekst)
+    return schema_helper.normalize_tab(tab, merged)
+
+def sync_tab(sheet_id: str, tab: str, timeout: float = TAB_TIMEOUT,
+             store: Optional[SnapshotStore] = None) -> pd.DataFrame:
+    """
+    Breng de lokale snapshot van een tabblad bij en geef de getypeerde DataFrame terug
+    (zie `schema_helper.normalize_tab`)
+
+    Voor een tabblad uit `APPEND_ONLY_TABS` worden alleen de rijen na de laatst
+    bekende rij opgehaald. De laatst bekende rij wordt opnieuw meegenomen als
+    controle: als die rij niet meer bestaat (sheet is gekrompen), anders is dan
+    lokaal, of als de header veranderd is, volgt een volledige reload. Wijzigingen
+    boven de laatste rij ziet die controle niet; daarom wordt een snapshot ouder dan
+    `SNAPSHOT_MAX_AGE` altijd volledig ververst. Andere tabbladen worden altijd
+    volledig gedownload.
+
+    Een lokale opslag backend (zie `set_storage_backend`) wordt direct gelezen,
+    zonder snapshot.
+    """
+    if _storage_backend is not None and not _storage_backend.snapshots:
+        return load_frame(tab, _storage_backend.read_tab(sheet_id, tab, timeout))
+
+    store = store or snapshot_store
+    if tab not in APPEND_ONLY_TABS:
+        return load_frame(tab, fetch_tab(sheet_id, tab, timeout))
+
+    snapshot = store.load(sheet_id, tab)
+    age = store.age(sheet_id, tab) if snapshot is not None else None
+    if age is None or age > SNAPSHOT_MAX_AGE:
+        snapshot = None
+
+    if snapshot is not None and len(snapshot) > 0:
+        known_rows = len(snapshot)
+        delta = fetch_tab(sheet_id, tab, timeout, offset=known_rows - 1)
+
+        same_header = list(delta.columns) == list(snapshot.columns)
+        same_anchor = (
+            same_header and not delta.empty and
+            delta.iloc[0].tolist() == snapshot.iloc[-1].tolist()
+        )
+        if same_anchor:
+            new_rows = delta.iloc[1:]
+            if new_rows.empty:
+                return load_frame(tab, snapshot)
+            merged = pd.concat([snapshot, new_rows], ignore_index=True)
+            store.save(sheet_id, tab, merged)
+            return load_frame(tab, merged)
+
+        print(f"DEBUG: Snapshot {tab} wijkt af van sheet (header of rijen gewijzigd), volledige reload")
+
+    full = fetch_tab(sheet_id, tab, timeout)
+    store.save(sheet_id, tab, full, full=True)
+    return load_frame(tab, full)
+
+def fetch_tabs(sheet_id: str, tabs: Optional[List[str]] = None,
+               timeout: float = TAB_TIMEOUT) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    Download meerdere tabbladen tegelijk (incrementeel via de lokale snapshots)
+
+    Elk tabblad krijgt maximaal `timeout` seconden. Een tabblad dat faalt of te
+    traag is levert een lege DataFrame op, de andere tabbladen komen gewoon terug.
+
+    Returns:
+        (data, errors): dict met DataFrame per tabblad en dict met foutmelding per mislukt tabblad
+    """
+    tabs = tabs or SHEET_TABS
+    futures = {tab: _executor.submit(sync_tab, sheet_id, tab, timeout) for tab in tabs}
+
+    # Wacht niet langer dan de timeout; requests' eigen timeout geldt per socket-operatie
+    wait(futures.values(), timeout=timeout)
+
+    data = {}
+    errors = {}
+    for tab, future in futures.items():
+        if not future.done():
+            future.cancel()
+            errors[tab] = f"timeout na {timeout:.0f}s"
+            data[tab] = pd.DataFrame()
+            continue
+        try:
+            data[tab] = with_pending(sheet_id, tab, future.result())
+        except Exception as e:
+            errors[tab] = str(e)
+            data[tab] = pd.DataFrame()
+
+    return data, errors
+
+class TabCache:
+    """
+    Proces-brede cache van tabbladen, per (sheet_id, tab) met een versienummer
+
+    Elke keer dat een tabblad nieuwe data krijgt of ongeldig wordt gemaakt, gaat de
+    versie omhoog. Afgeleide resultaten (zie `memoize`) onthouden de versies waarop
+    ze gebaseerd zijn, zodat een schrijfactie naar 'voeding' alleen de voeding van
+    die gebruiker en de berekeningen die daarvan afhangen ongeldig maakt.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries = {}   # (sheet_id, tab) -> {'df', 'error', 'loaded_at', 'revision', 'written_at'}
+        self._versions = {}  # (sheet_id, tab) -> int
+        self._derived = {}   # (sheet_id, key) -> (versions, result, computed_at)
+
+    def _bump(self, sheet_id: str, tab: str):
+        self._versions[(sheet_id, tab)] = self._versions.get((sheet_id, tab), 0) + 1
+
+    def get(self, sheet_id: str, tab: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Geef de cache entry terug, of None als die ontbreekt of verlopen is
+
+        Args:
+            allow_stale: Geef ook een verlopen entry terug (zie `is_stale`)
+        """
+        with self._lock:
+            entry = self._entries.get((sheet_id, tab))
+            if entry is None or (not allow_stale and self.is_stale(entry)):
+                return None
+            return entry
+
+    def is_stale(self, entry: Dict[str, Any]) -> bool:
+        """True als de entry ouder is dan de TTL"""
+        return time.time() - entry['loaded_at'] > self.ttl
+
+    def has_unconfirmed_writes(self, entry: Dict[str, Any]) -> bool:
+        """True als de entry write-through rijen bevat die de export misschien nog niet laat zien"""
+        written_at = entry.get('written_at')
+        return written_at is not None and time.time() - written_at <= WRITE_CONFIRM_WINDOW
+
+    def put(self, sheet_id: str, tab: str, df: pd.DataFrame, error: Optional[str] = None,
+            revision: Optional[str] = None):
+        """
+        Args:
+            revision: Revisie van de spreadsheet vlak voor het downloaden (zie `revalidate`)
+        """
+        with self._lock:
+            self._entries[(sheet_id, tab)] = {'df': df, 'error': error, 'loaded_at': time.time(),
+                                              'revision': revision}
+            self._bump(sheet_id, tab)
+
+    def revalidate(self, sheet_id: str, tab: str, revision: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Verleng een (verlopen) entry als de spreadsheet sinds het laden niet veranderd is
+
+        De versie blijft gelijk, dus afgeleide resultaten blijven geldig. Entries met een
+        fout of zonder revisie (bijv. na een write-through) worden niet verlengd.
+
+        Returns:
+            De verlengde entry, of None als het tabblad opnieuw gedownload moet worden
+        """
+        if revision is None:
+            return None
+        with self._lock:
+            entry = self._entries.get((sheet_id, tab))
+            if entry is None or entry['error'] or entry.get('revision') != revision:
+                return None
+            entry = {**entry, 'loaded_at': time.time()}
+            self._entries[(sheet_id, tab)] = entry
+            return entry
+
+    def append(self, sheet_id: str, tab: str, rows: List[List[Any]]) -> Optional[int]:
+        """
+        Verwerk geschreven rijen direct in de gecachte DataFrame (write-through)
+
+        Returns:
+            De nieuwe versie, of None als er geen bruikbare cache entry was of de rijen
+            niet samengevoegd konden worden (het tabblad is dan ongeldig gemaakt)
+        """
+        with self._lock:
+            # Ook een verlopen entry: die wordt toch al op de achtergrond ververst
+            entry = self.get(sheet_id, tab, allow_stale=True)
+            merged = None
+            if entry is not None and not entry['error']:
+                merged = merge_rows(entry['df'], rows, tab)
+            if merged is None:
+                self.invalidate(sheet_id, tab)
+                return None
+            # loaded_at blijft staan: de write-through entry verloopt op het normale moment.
+            # Zonder revisie wordt het tabblad bij de volgende refresh altijd opnieuw gedownload
+            self._entries[(sheet_id, tab)] = {**entry, 'df': merged, 'revision': None,
+                                              'written_at': time.time()}
+            self._bump(sheet_id, tab)
+            return self._versions[(sheet_id, tab)]
+
+    def invalidate(self, sheet_id: str, tab: Optional[str] = None):
+        """Maak één tabblad (of alle tabbladen van een sheet) ongeldig"""
+        with self._lock:
+            tabs = [tab] if tab else [t for (sid, t) in self._versions if sid == sheet_id]
+            for t in tabs:
+                self._entries.pop((sheet_id, t), None)
+                self._bump(sheet_id, t)
+
+    def loaded_at(self, sheet_id: str, tabs: List[str]) -> Optional[float]:
+        """Laadmoment van het oudste gecachte tabblad, of None als er niets in de cache staat"""
+        with self._lock:
+            times = [self._entries[(sheet_id, tab)]['loaded_at'] for tab in tabs
+                     if (sheet_id, tab) in self._entries]
+        return min(times) if times else None
+
+    def version(self, sheet_id: str, tab: str) -> int:
+        with self._lock:
+            return self._versions.get((sheet_id, tab), 0)
+
+    def versions(self, sheet_id: str, tabs: List[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get((sheet_id, tab), 0) for tab in tabs)
+
+    def memoize(self, sheet_id: str, tabs: List[str], key: str, compute: Callable[[], Any],
+                ttl: Optional[float] = None) -> Any:
+        """
+        Cache een afgeleid resultaat zolang de versies van `tabs` niet veranderen
+
+        Args:
+            tabs: Tabbladen waar het resultaat van afhangt
+            key: Unieke naam van de berekening (inclusief eventuele parameters)
+            ttl: Optionele maximale leeftijd, voor data die niet via `load_data` ververst wordt
+        """
+        versions = self.versions(sheet_id, tabs)
+        with self._lock:
+            hit = self._derived.get((sheet_id, key))
+        if hit is not None and hit[0] == versions and (ttl is None or time.time() - hit[2] <= ttl):
+            return hit[1]
+
+        result = compute()
+        with self._lock:
+            self._derived[(sheet_id, key)] = (versions, result, time.time())
+        return result
+
+tab_cache = TabCache()
+
+def load_data(sheet_id: str, tabs: Optional[List[str]] = None,
+              timeout: float = TAB_TIMEOUT) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    Haal tabbladen uit de cache; alleen ontbrekende of verlopen tabbladen worden (parallel) opgehaald
+
+    Met `STALE_WHILE_REVALIDATE` wordt een verlopen tabblad direct uit de cache
+    teruggegeven en op de achtergrond ververst (zie `refresh_in_background`); de
+    nieuwe versie is er bij de volgende aanroep. Alleen ontbrekende tabbladen en
+    tabbladen met een fout blokkeren. In beide gevallen worden alleen tabbladen
+    gedownload waarvan de spreadsheet veranderd is (zie `fetch_changed_tabs`).
+
+    Returns:
+        (data, errors) zoals bij `fetch_tabs`
+    """
+    tabs = tabs or SHEET_TABS
+    data = {}
+    errors = {}
+    missing = []
+    stale = []
+
+    for tab in tabs:
+        entry = tab_cache.get(sheet_id, tab, allow_stale=STALE_WHILE_REVALIDATE)
+        if entry is not None and tab_cache.is_stale(entry):
+            if entry['error']:
+                entry = None
+            else:
+                stale.append(tab)
+        if entry is None:
+            missing.append(tab)
+            continue
+        data[tab] = entry['df']
+        if entry['error']:
+            errors[tab] = entry['error']
+
+    if stale:
+        refresh_in_background(sheet_id, stale, timeout)
+
+    if missing:
+        fetched, fetch_errors, revision = fetch_changed_tabs(sheet_id, missing, timeout)
+        for tab in missing:
+            if tab not in fetched:
+                # Ongewijzigd en verlengd (zie `fetch_changed_tabs`)
+                entry = tab_cache.get(sheet_id, tab, allow_stale=True)
+                data[tab] = entry['df'] if entry is not None else pd.DataFrame()
+                continue
+            tab_cache.put(sheet_id, tab, fetched[tab], fetch_errors.get(tab), revision)
+            data[tab] = fetched[tab]
+            if tab in fetch_errors:
+                errors[tab] = fetch_errors[tab]
+
+    return data, errors
+
+def set_revision_provider(provider: Optional[Callable[[str], Optional[str]]]):
+    """
+    Registreer de functie die de huidige revisie van een spreadsheet teruggeeft
+
+    De revisie moet veranderen bij elke wijziging in de spreadsheet (bijv. Drive
+    `modifiedTime`). Zonder provider wordt elke refresh volledig gedownload.
+    """
+    global _revision_provider
+    _revision_provider = provider
+
+def set_storage_backend(backend):
+    """
+    Registreer de opslag backend (zie storage_helper) voor het lezen en de revisie
+
+    De Google Sheets backend wordt gelezen via de gviz export met snapshots; een
+    lokale backend (SQLite) wordt direct gelezen.
+    """
+    global _storage_backend
+    _storage_backend = backend
+    set_revision_provider(backend.revision if backend is not None else None)
+
+def set_pending_provider(provider: Optional[Callable[[str, str], List[List[Any]]]]):
+    """
+    Registreer de functie die de nog niet geschreven rijen van een tabblad teruggeeft
+
+    Die rijen worden na elke download toegevoegd (zie `with_pending`), zodat een
+    refresh geen rijen laat verdwijnen die wel al in de UI bevestigd zijn.
+    """
+    global _pending_provider
+    _pending_provider = provider
+
+def with_pending(sheet_id: str, tab: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Gedownloade tabblad-data plus de rijen die nog in de outbox staan (fouten zijn niet fataal)"""
+    if _pending_provider is None:
+        return df
+    try:
+        rows = _pending_provider(sheet_id, tab)
+    except Exception as e:
+        print(f"DEBUG: Openstaande rijen van {tab} niet op te halen: {e}")
+        return df
+    if not rows:
+        return df
+    merged = merge_rows(df, rows, tab)
+    return merged if merged is not None else df
+
+def sheet_revision(sheet_id: str) -> Optional[str]:
+    """Huidige revisie van de spreadsheet, of None als die onbekend is (fouten zijn niet fataal)"""
+    if _revision_provider is None:
+        return None
+    try:
+        return _revision_provider(sheet_id)
+    except Exception as e:
+        print(f"DEBUG: Revisie van sheet niet op te halen, volledige refresh: {e}")
+        return None
+
+def fetch_changed_tabs(sheet_id: str, tabs: List[str], timeout: float = TAB_TIMEOUT
+                       ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str], Optional[str]]:
+    """
+    Download alleen de tabbladen die sinds het laden veranderd kunnen zijn
+
+    Eerst wordt met één lichte metadata call de revisie van de spreadsheet opgehaald.
+    Tabbladen die op dezelfde revisie geladen zijn worden verlengd (zie
+    `TabCache.revalidate`) en niet gedownload; de rest wordt gedownload en krijgt
+    deze revisie mee.
+
+    Returns:
+        (data, errors, revision): zoals bij `fetch_tabs`, maar alleen voor de gedownloade
+        tabbladen, plus de revisie van vóór het downloaden
+    """
+    revision = sheet_revision(sheet_id)
+    changed = [tab for tab in tabs if tab_cache.revalidate(sheet_id, tab, revision) is None]
+    if len(changed) < len(tabs):
+        print(f"DEBUG: {len(tabs) - len(changed)} tabblad(en) ongewijzigd, geen download nodig")
+    if not changed:
+        return {}, {}, revision
+    data, errors = fetch_tabs(sheet_id, changed, timeout)
+    return data, errors, revision
+
+def refresh_in_background(sheet_id: str, tabs: List[str], timeout: float = TAB_TIMEOUT) -> bool:
+    """
+    Ververs verlopen tabbladen op de achtergrond (maximaal één refresh per sheet tegelijk)
+
+    Een tabblad dat tijdens de refresh beschreven of ongeldig gemaakt is, of waarvan
+    de export nog minder rijen heeft dan net via write-through toegevoegde rijen
+    (zie `WRITE_CONFIRM_WINDOW`), wordt niet overschreven. Een tabblad dat faalt houdt zijn oude data en wordt bij de volgende
+    aanroep van `load_data` opnieuw geprobeerd.
+
+    Returns:
+        True als er een refresh gestart is, False als er al een liep
+    """
+    with _refreshing_lock:
+        if sheet_id in _refreshing:
+            return False
+        _refreshing.add(sheet_id)
+
+    def refresh():
+        try:
+            versions = {tab: tab_cache.version(sheet_id, tab) for tab in tabs}
+            fetched, fetch_errors, revision = fetch_changed_tabs(sheet_id, tabs, timeout)
+            with tab_cache._lock:
+                for tab in fetched:
+                    if tab in fetch_errors:
+                        print(f"DEBUG: Achtergrond refresh van {tab} mislukt: {fetch_errors[tab]}")
+                        continue
+                    if tab_cache.version(sheet_id, tab) != versions[tab]:
+                        continue
+                    entry = tab_cache.get(sheet_id, tab, allow_stale=True)
+                    if (entry is not None and tab_cache.has_unconfirmed_writes(entry)
+                            and len(fetched[tab]) < len(entry['df'])):
+                        # Export loopt nog achter op write-through rijen (zie `reconcile`);
+                        # een korter tabblad zonder recente eigen schrijfacties is gewoon de sheet
+                        continue
+                    tab_cache.put(sheet_id, tab, fetched[tab], revision=revision)
+        except Exception as e:
+            print(f"DEBUG: Achtergrond refresh mislukt: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(sheet_id)
+
+    _refresh_executor.submit(refresh)
+    return True
+
+def is_refreshing(sheet_id: str) -> bool:
+    """True als er voor deze sheet een achtergrond refresh loopt"""
+    with _refreshing_lock:
+        return sheet_id in _refreshing
+
+def data_age(sheet_id: str, tabs: Optional[List[str]] = None) -> Optional[float]:
+    """Leeftijd (seconden) van het oudste gecachte tabblad, of None als er nog niets geladen is"""
+    loaded_at = tab_cache.loaded_at(sheet_id, tabs or SHEET_TABS)
+    if loaded_at is None:
+        return None
+    return time.time() - loaded_at
+
+def invalidate(sheet_id: str, tab: Optional[str] = None):
+    """
+    Maak de cache van één tabblad (of de hele sheet) ongeldig na een schrijfactie of refresh
+
+    De snapshot gaat ook weg, zodat de volgende download volledig is en ook
+    wijzigingen boven de laatste rij meeneemt.
+    """
+    tab_cache.invalidate(sheet_id, tab)
+    snapshot_store.drop(sheet_id, tab)
+
+def apply_write(sheet_id: str, tab: str, rows: List[List[Any]]):
+    """
+    Verwerk rijen die net naar de sheet geschreven zijn zonder netwerk-read
+
+    De rijen worden met het loader-schema in de cache gezet; na `RECONCILE_DELAY`
+    seconden wordt het tabblad op de achtergrond met de echte sheet vergeleken.
+    """
+    version = tab_cache.append(sheet_id, tab, rows)
+    if version is None:
+        print(f"DEBUG: Write-through voor {tab} niet mogelijk, tabblad wordt opnieuw geladen")
+        return
+    timer = threading.Timer(RECONCILE_DELAY, reconcile, args=(sheet_id, tab, version))
+    timer.daemon = True
+    timer.start()
+
+def reconcile(sheet_id: str, tab: str, version: int):
+    """
+    Vervang een write-through entry door de echte sheet data
+
+    Slaat over als het tabblad intussen opnieuw beschreven of geladen is, of als de
+    export nog minder rijen heeft dan de cache (de nieuwe rijen zijn er dan nog niet).
+    """
+    if tab_cache.version(sheet_id, tab) != version:
+        return
+    try:
+        revision = sheet_revision(sheet_id)
+        fresh = with_pending(sheet_id, tab, sync_tab(sheet_id, tab))
+    except Exception as e:
+        print(f"DEBUG: Reconcile van {tab} mislukt: {e}")
+        return
+    with tab_cache._lock:
+        entry = tab_cache.get(sheet_id, tab)
+        if tab_cache.version(sheet_id, tab) != version or entry is None:
+            return
+        if len(fresh) < len(entry['df']):
+            print(f"DEBUG: Export van {tab} loopt nog achter, cache blijft tot de TTL verloopt")
+            return
+        tab_cache.put(sheet_id, tab, fresh, revision=revision)
+
+def data_version(sheet_id: str, tabs: Optional[List[str]] = None) -> Tuple[int, ...]:
+    """Versie-tuple van de gegeven tabbladen, bruikbaar als cache key voor afgeleide resultaten"""
+    return tab_cache.versions(sheet_id, tabs or SHEET_TABS)
+
+def memoize(sheet_id: str, tabs: List[str], key: str, compute: Callable[[], Any],
+            ttl: Optional[float] = None) -> Any:
+    """Zie `TabCache.memoize`"""
+    return tab_cache.memoize(sheet_id, tabs, key, compute, ttl)
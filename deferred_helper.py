@@ -0,0 +1,120 @@
+"""
+Helper functies voor trage berekeningen buiten het render pad
+Een Streamlit rerun mag niet wachten op een LLM call. `DeferredResults` start de
+berekening voor een key op de achtergrond en geeft tot die klaar is None terug; de
+aanroeper toont zolang iets snels (bijv. deterministische aanbevelingen) en krijgt
+bij een volgende rerun het resultaat. Resultaten blijven per key bewaard tot de
+key verandert (LRU) of de TTL verloopt.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional
+
+# Na hoeveel seconden een mislukte berekening opnieuw geprobeerd mag worden
+RETRY_AFTER = 60
+
+class DeferredResults:
+    """
+    Achtergrond berekeningen met een resultaat per key
+
+    Args:
+        name: Naam voor de worker threads
+        max_entries: Maximaal aantal bewaarde resultaten (minst recent gebruikt valt weg)
+        ttl: Optionele maximale leeftijd (seconden) van een resultaat
+        workers: Aantal gelijktijdige berekeningen
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, ttl: Optional[float] = None, workers: int = 2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # key -> (resultaat, berekend op)
+        self._failed = {}              # key -> (tijdstip, foutmelding) van de laatste fout
+        self._running = set()
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Het resultaat als het klaar en niet verlopen is, anders None (start niets)"""
+        with self._lock:
+            hit = self._results.get(key)
+            if hit is None:
+                return None
+            if self.ttl is not None and time.time() - hit[1] > self.ttl:
+                del self._results[key]
+                return None
+            self._results.move_to_end(key)
+            return hit[0]
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Optional[Any]:
+        """
+        Het resultaat voor `key`, of None terwijl `compute` op de achtergrond loopt
+
+        Een berekening die faalt wordt pas na `RETRY_AFTER` seconden opnieuw gestart.
+        """
+        result = self.peek(key)
+        if result is not None:
+            return result
+        self.submit(key, compute)
+        return None
+
+    def submit(self, key: Hashable, compute: Callable[[], Any]) -> bool:
+        """Start `compute` voor `key` als die niet al loopt; True als er een berekening gestart is"""
+        with self._lock:
+            failed_at = self._failed.get(key, (0.0, None))[0]
+            if key in self._running or time.time() - failed_at < RETRY_AFTER:
+                return False
+            self._running.add(key)
+        self._executor.submit(self._run, key, compute)
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._running
+
+    def error(self, key: Hashable) -> Optional[str]:
+        """Foutmelding van de laatste mislukte berekening van `key` (binnen `RETRY_AFTER`), of None"""
+        with self._lock:
+            failed_at, message = self._failed.get(key, (0.0, None))
+        return message if time.time() - failed_at < RETRY_AFTER else None
+
+    def invalidate(self, key: Hashable):
+        """Vergeet het resultaat (en een eerdere fout) van één key"""
+        with self._lock:
+            self._results.pop(key, None)
+            self._failed.pop(key, None)
+
+    def _run(self, key: Hashable, compute: Callable[[], Any]):
+        try:
+            result = compute()
+        except Exception as e:
+            print(f"DEBUG: Achtergrond berekening mislukt voor {key!r}: {e}")
+            with self._lock:
+                self._failed[key] = (time.time(), str(e))
+                self._running.discard(key)
+            return
+        with self._lock:
+            self._failed.pop(key, None)
+            self._running.discard(key)
+            if result is None:
+                return
+            self._results[key] = (result, time.time())
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def get_results(name: str, **kwargs) -> DeferredResults:
+    """
+    Proces-brede `DeferredResults` met deze naam (Streamlit voert het dashboard script
+    bij elke rerun opnieuw uit; deze module blijft staan)
+
+    De keyword argumenten gelden alleen bij het eerste aanmaken.
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = DeferredResults(name, **kwargs)
+        return _registry[name]
@@ -1,12 +1,19 @@
 """
 Helper functies voor Groq AI integratie
 Gebruikt Groq's Llama 3.1 70B model voor het parsen van natuurlijke taal naar gestructureerde data
+Parse resultaten worden persistent gecachet (zie parse_cache_helper); een enkele entry
+vergeten kan met bijv. `parse_nutrition.invalidate(text, maaltijd)`. Meerdere maaltijden
+tegelijk gaan in één completion via `parse_nutrition_batch`
 """
 import os
+import re
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
 from groq import Groq
 from dotenv import load_dotenv
+import parse_cache_helper
+from parse_cache_helper import cached_parse
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +28,33 @@ def get_groq_client():
         )
     return Groq(api_key=api_key)
 
+def _cacheable_nutrition(data: Any) -> bool:
+    """
+    True als een voeding parse bewaard mag worden: geldig en niet 0 kcal
+
+    Een resultaat met alleen nullen is meestal een mislukte completion (de retry prompt
+    toont nullen als voorbeeld); zwarte koffie of thee wordt daarom gewoon opnieuw geparsed.
+    """
+    valid = _valid_nutrition(data)
+    return valid is not None and valid['calorien'] > 0
+
+def _valid_activity(data: Any) -> bool:
+    """True als een kracht/cardio parse een activiteit heeft"""
+    return isinstance(data, dict) and bool(str(data.get('activiteit') or '').strip())
+
+def _valid_measurements(data: Any) -> bool:
+    """True als een metingen parse minstens één getal bevat"""
+    if not isinstance(data, dict):
+        return False
+    for value in data.values():
+        try:
+            float(value)
+            return True
+        except (TypeError, ValueError):
+            continue
+    return False
+
+@cached_parse('voeding', validate=_cacheable_nutrition)
 def parse_nutrition(text: str, maaltijd: str, retry: bool = False) -> Dict[str, Any]:
     """
     Parse voeding input naar gestructureerde data
@@ -142,6 +176,197 @@ Geef ALLEEN de JSON output, geen extra tekst."""
         
         raise Exception(f"Fout bij parsen voeding: {str(e)}")
 
+# Koppen voor maaltijden in een vrij tekstblok (bijv. "Ontbijt: 250g kwark, banaan")
+MEAL_HEADINGS = {
+    'ontbijt': 'Ontbijt',
+    'lunch': 'Lunch',
+    'avondeten': 'Avondeten',
+    'diner': 'Avondeten',
+    'tussendoor': 'Tussendoor',
+    'snack': 'Tussendoor',
+}
+
+_MEAL_HEADING_RE = re.compile(r'^\s*(' + '|'.join(MEAL_HEADINGS) + r')s?\s*[:\-]\s*(.*)$', re.IGNORECASE)
+
+# Macro velden die elke geparste maaltijd moet hebben
+NUTRITION_FIELDS = ['calorien', 'eiwit', 'koolhydraten', 'vetten', 'vezels']
+
+def split_meals(text: str, default_maaltijd: str = 'Tussendoor') -> List[Tuple[str, str]]:
+    """
+    Splits een tekstblok met maaltijdkoppen in (tekst, maaltijd) items
+    
+    Elke regel die met een kop begint ("Ontbijt:", "Lunch -", "Snack:") start een nieuw
+    item; regels zonder kop horen bij het vorige item. Tekst zonder koppen wordt één
+    item met `default_maaltijd`.
+    """
+    items = []
+    for line in text.splitlines():
+        match = _MEAL_HEADING_RE.match(line)
+        if match:
+            items.append([match.group(2).strip(), MEAL_HEADINGS[match.group(1).lower()]])
+        elif line.strip():
+            if not items:
+                items.append(['', default_maaltijd])
+            items[-1][0] = f"{items[-1][0]}, {line.strip()}" if items[-1][0] else line.strip()
+    return [(item_text, maaltijd) for item_text, maaltijd in items if item_text]
+
+def _valid_nutrition(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Gecontroleerde maaltijd (getallen als int, vezels default 0), of None als een waarde ontbreekt of onzinnig is
+
+    0 kcal mag alleen als ook eiwit, koolhydraten en vetten 0 zijn (zwarte koffie, thee, water).
+    """
+    if not isinstance(data, dict):
+        return None
+    result = {'omschrijving': str(data.get('omschrijving') or '').strip()}
+    for field in NUTRITION_FIELDS:
+        value = data.get(field, 0 if field == 'vezels' else None)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        if not 0 <= value <= 10000:
+            return None
+        result[field] = int(round(value))
+    if not result['omschrijving']:
+        return None
+    if result['calorien'] == 0 and any(result[field] for field in ('eiwit', 'koolhydraten', 'vetten')):
+        return None
+    return result
+
+def _request_nutrition_batch(items: List[Tuple[str, str]]) -> Dict[int, Any]:
+    """
+    Eén completion voor meerdere maaltijden; geeft de ruwe resultaten per item index terug
+
+    De `index` van het model wordt alleen gebruikt als die precies 0..n-1 is; anders
+    (bijv. 1-based) telt de volgorde van de array. Dubbele indices maken de hele
+    response onbruikbaar (leeg resultaat), want dan is niet te zeggen welke macros bij
+    welke maaltijd horen.
+    """
+    client = get_groq_client()
+    
+    listing = "\n".join(f"{i}. [{maaltijd}] {text}" for i, (text, maaltijd) in enumerate(items))
+    prompt = f"""Je bent een professionele voedingsdeskundige. Analyseer ELKE maaltijd hieronder apart en geef REALISTISCHE, NAUWKEURIGE macronutriënten.
+
+Maaltijden (nummer, [type], beschrijving):
+{listing}
+
+BELANGRIJKE RICHTLIJNEN:
+1. Gebruik standaard Nederlandse portiegrootten als er geen gewicht wordt genoemd
+2. Bereken calorieën nauwkeurig op basis van de macros: (eiwit×4) + (koolhydraten×4) + (vetten×9)
+3. Wees conservatief maar realistisch - geen extreme lage of hoge schattingen
+4. Voor gebraden/gebakken voedsel: voeg extra vetten toe voor de bereiding
+
+Geef de output als JSON array met precies één object per maaltijd:
+[
+    {{"index": <nummer>, "omschrijving": "korte beschrijving", "calorien": <kcal>, "eiwit": <g>, "koolhydraten": <g>, "vetten": <g>, "vezels": <g>}}
+]
+
+Geef ALLEEN de JSON array, geen extra tekst."""
+
+    response = client.chat.completions.create(
+        model="llama-3.3-70b-versatile",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=150 + 120 * len(items)
+    )
+    
+    result = response.choices[0].message.content.strip()
+    # Alleen de array zelf (zonder markdown code blocks of tekst eromheen)
+    if '[' in result and ']' in result:
+        result = result[result.find('['):result.rfind(']') + 1]
+    try:
+        parsed = json.loads(result)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, list):
+        return {}
+    
+    indices = []
+    for entry in parsed:
+        try:
+            indices.append(int(entry['index']))
+        except (TypeError, KeyError, ValueError):
+            indices.append(None)
+    known = [index for index in indices if index is not None]
+    if len(known) != len(set(known)):
+        print("DEBUG: Batch parse gaf dubbele indices, response genegeerd")
+        return {}
+    if sorted(known) == list(range(len(items))) and len(known) == len(parsed):
+        return dict(zip(indices, parsed))
+    if known:
+        print(f"DEBUG: Batch parse indices {known} zijn niet 0..{len(items) - 1}, volgorde van de array gebruikt")
+    return dict(enumerate(parsed[:len(items)]))
+
+def parse_nutrition_batch(items: Union[str, Sequence[Tuple[str, str]]],
+                          default_maaltijd: str = 'Tussendoor') -> List[Dict[str, Any]]:
+    """
+    Parse meerdere maaltijden in één LLM call
+    
+    Items die al in de parse cache staan worden niet opnieuw gevraagd. Elk item wordt
+    los gecontroleerd; alleen de items die ontbreken of ongeldig zijn worden nog één
+    keer samen opnieuw gevraagd, daarna per stuk via `parse_nutrition`.
+    
+    Args:
+        items: Lijst met (tekst, maaltijd) tuples, of één tekstblok met maaltijdkoppen
+            (zie `split_meals`)
+        default_maaltijd: Maaltijd type voor tekst zonder kop
+    
+    Returns:
+        Lijst in dezelfde volgorde als de items, elk met 'maaltijd', 'omschrijving',
+        'calorien', 'eiwit', 'koolhydraten', 'vetten' en 'vezels'
+    """
+    if isinstance(items, str):
+        items = split_meals(items, default_maaltijd)
+    items = [(str(text).strip(), maaltijd) for text, maaltijd in items if str(text).strip()]
+    if not items:
+        raise Exception("Geen maaltijden gevonden in de invoer")
+    
+    results: Dict[int, Dict[str, Any]] = {}
+    use_cache = parse_cache_helper.PARSE_CACHE
+    for i, (text, maaltijd) in enumerate(items):
+        if not use_cache:
+            break
+        try:
+            hit = parse_cache_helper.get_cache().get(parse_cache_helper.cache_key('voeding', text, maaltijd))
+        except Exception as e:
+            print(f"DEBUG: Parse cache niet leesbaar: {e}")
+            break
+        if hit is not None:
+            results[i] = hit
+    
+    # Eén batch call voor alles wat niet in de cache stond, daarna één keer alleen de mislukte items
+    for attempt in range(2):
+        missing = [i for i in range(len(items)) if i not in results]
+        if not missing:
+            break
+        try:
+            raw = _request_nutrition_batch([items[i] for i in missing])
+        except Exception as e:
+            print(f"DEBUG: Batch parse mislukt (poging {attempt + 1}): {e}")
+            continue
+        for position, i in enumerate(missing):
+            valid = _valid_nutrition(raw.get(position))
+            if valid is None:
+                continue
+            results[i] = valid
+            if use_cache and _cacheable_nutrition(valid):
+                try:
+                    text, maaltijd = items[i]
+                    parse_cache_helper.get_cache().put(
+                        parse_cache_helper.cache_key('voeding', text, maaltijd), 'voeding', valid)
+                except Exception as e:
+                    print(f"DEBUG: Parse cache niet schrijfbaar: {e}")
+    
+    # Laatste redmiddel per item (met de eigen retry en cache van parse_nutrition)
+    for i in range(len(items)):
+        if i not in results:
+            print(f"DEBUG: Batch parse gaf geen geldig resultaat voor item {i}, los parsen")
+            results[i] = parse_nutrition(*items[i])
+    
+    return [{'maaltijd': maaltijd, **results[i]} for i, (text, maaltijd) in enumerate(items)]
+
+@cached_parse('kracht', validate=_valid_activity)
 def parse_exercise(text: str) -> Dict[str, Any]:
     """
     Parse kracht training input naar gestructureerde data
@@ -200,6 +425,7 @@ Geef ALLEEN de JSON output, geen extra tekst."""
     except Exception as e:
         raise Exception(f"Fout bij parsen oefening: {str(e)}")
 
+@cached_parse('cardio', validate=_valid_activity)
 def parse_cardio(text: str) -> Dict[str, Any]:
     """
     Parse cardio activiteit input naar gestructureerde data
@@ -254,6 +480,7 @@ Geef ALLEEN de JSON output, geen extra tekst."""
     except Exception as e:
         raise Exception(f"Fout bij parsen cardio: {str(e)}")
 
+@cached_parse('metingen', validate=_valid_measurements)
 def parse_measurements(text: str) -> Dict[str, Any]:
     """
     Parse metingen input naar gestructureerde data
@@ -360,47 +587,29 @@ def test_groq_connection() -> Dict[str, Any]:
         }
 
 
-def generate_daily_coaching(current_data: Dict[str, Any], targets: Dict[str, Any], name: str = "gebruiker") -> str:
-    """
-    Genereer een persoonlijk dagcoaching rapport op basis van huidige voortgang
+def _daily_coaching_messages(current_data: Dict[str, Any], targets: Dict[str, Any], name: str) -> List[Dict[str, str]]:
+    """Chat berichten voor het dagcoaching rapport (zie `generate_daily_coaching`)"""
+    # Build context voor de AI - gebruik lowercase keys die matchen met calculate_nutrition_totals
+    nutrition = current_data.get('nutrition', {})
+    calories = nutrition.get('calorien', 0)
+    protein = nutrition.get('eiwit', 0)
+    carbs = nutrition.get('koolhydraten', 0)
+    fats = nutrition.get('vetten', 0)
     
-    Args:
-        current_data: Dictionary met huidige dag data:
-            - nutrition: {calories, protein, carbs, fats}
-            - workouts: list van trainingen
-            - steps: aantal stappen
-            - weight: huidige gewicht
-        targets: Dictionary met doelen:
-            - calories, protein, carbs, fats, weight
-        name: Naam van de gebruiker
+    # Get workout details
+    total_workouts = len(current_data.get('workouts', []))
+    cardio_sessions = current_data.get('cardio_sessions', [])
+    kracht_sessions = current_data.get('kracht_sessions', [])
     
-    Returns:
-        Markdown-formatted coaching rapport
-    """
-    try:
-        client = get_groq_client()
-        
-        # Build context voor de AI - gebruik lowercase keys die matchen met calculate_nutrition_totals
-        nutrition = current_data.get('nutrition', {})
-        calories = nutrition.get('calorien', 0)
-        protein = nutrition.get('eiwit', 0)
-        carbs = nutrition.get('koolhydraten', 0)
-        fats = nutrition.get('vetten', 0)
-        
-        # Get workout details
-        total_workouts = len(current_data.get('workouts', []))
-        cardio_sessions = current_data.get('cardio_sessions', [])
-        kracht_sessions = current_data.get('kracht_sessions', [])
-        
-        # Build workout summary
-        workout_summary = []
-        if cardio_sessions:
-            workout_summary.append(f"Cardio: {', '.join(cardio_sessions[:3])}")  # Max 3 shown
-        if kracht_sessions:
-            workout_summary.append(f"Kracht: {', '.join(kracht_sessions[:3])}")  # Max 3 shown
-        workout_details = "; ".join(workout_summary) if workout_summary else "Geen trainingen"
-        
-        context = f"""Je bent een persoonlijke fitness coach die {name} helpt met hun dagelijkse voortgang.
+    # Build workout summary
+    workout_summary = []
+    if cardio_sessions:
+        workout_summary.append(f"Cardio: {', '.join(cardio_sessions[:3])}")  # Max 3 shown
+    if kracht_sessions:
+        workout_summary.append(f"Kracht: {', '.join(kracht_sessions[:3])}")  # Max 3 shown
+    workout_details = "; ".join(workout_summary) if workout_summary else "Geen trainingen"
+    
+    context = f"""Je bent een persoonlijke fitness coach die {name} helpt met hun dagelijkse voortgang.
 
 HUIDIGE STATUS (vandaag tot nu):
 - Calorieën: {calories:.0f}/{targets.get('calories', 2000)} kcal ({(calories/targets.get('calories', 2000)*100):.0f}%)
@@ -429,19 +638,41 @@ Genereer een KORT, MOTIVEREND en PRAKTISCH rapport met:
 Gebruik emojis, wees enthousiast maar realistisch. Maximaal 200 woorden.
 Schrijf in het Nederlands, spreek de gebruiker direct aan met "je".
 """
+    
+    return [
+        {
+            "role": "system",
+            "content": "Je bent een enthousiaste Nederlandse fitness coach die kort en krachtig advies geeft."
+        },
+        {
+            "role": "user",
+            "content": context
+        }
+    ]
+
+def generate_daily_coaching(current_data: Dict[str, Any], targets: Dict[str, Any], name: str = "gebruiker") -> str:
+    """
+    Genereer een persoonlijk dagcoaching rapport op basis van huidige voortgang
+    
+    Args:
+        current_data: Dictionary met huidige dag data:
+            - nutrition: {calories, protein, carbs, fats}
+            - workouts: list van trainingen
+            - steps: aantal stappen
+            - weight: huidige gewicht
+        targets: Dictionary met doelen:
+            - calories, protein, carbs, fats, weight
+        name: Naam van de gebruiker
+    
+    Returns:
+        Markdown-formatted coaching rapport
+    """
+    try:
+        client = get_groq_client()
         
         response = client.chat.completions.create(
             model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Je bent een enthousiaste Nederlandse fitness coach die kort en krachtig advies geeft."
-                },
-                {
-                    "role": "user",
-                    "content": context
-                }
-            ],
+            messages=_daily_coaching_messages(current_data, targets, name),
             temperature=0.8,
             max_tokens=500
         )
@@ -451,7 +682,52 @@ Schrijf in het Nederlands, spreek de gebruiker direct aan met "je".
     except Exception as e:
         return f"❌ Kon geen coaching rapport genereren: {str(e)}"
 
-def generate_quick_actions(current_data, targets, name):
+def stream_daily_coaching(current_data: Dict[str, Any], targets: Dict[str, Any], name: str = "gebruiker",
+                          stats: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Streaming variant van `generate_daily_coaching`: geeft de tekst in stukjes terug
+    zodra Groq ze levert
+    
+    Args:
+        current_data, targets, name: Zie `generate_daily_coaching`
+        stats: Optionele dict die gevuld wordt met 'ttft' (seconden tot de eerste tekst),
+            'total' (seconden tot het einde) en 'chunks'
+    
+    Yields:
+        Stukjes Markdown tekst
+    """
+    stats = stats if stats is not None else {}
+    started = time.perf_counter()
+    stats.update({'ttft': None, 'total': None, 'chunks': 0})
+    try:
+        client = get_groq_client()
+        stream = client.chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=_daily_coaching_messages(current_data, targets, name),
+            temperature=0.8,
+            max_tokens=500,
+            stream=True
+        )
+        
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            if stats['ttft'] is None:
+                stats['ttft'] = time.perf_counter() - started
+            stats['chunks'] += 1
+            yield text
+        
+    except Exception as e:
+        raise Exception(f"Fout bij genereren coaching: {str(e)}")
+    finally:
+        stats['total'] = time.perf_counter() - started
+        ttft = f"{stats['ttft']:.2f}s" if stats['ttft'] is not None else "-"
+        print(f"DEBUG: Dagcoach stream: eerste tekst na {ttft}, klaar na {stats['total']:.2f}s ({stats['chunks']} stukjes)")
+
+def generate_quick_actions(current_data, targets, name, fallback: bool = True):
     """
     Genereer korte, concrete actiepunten voor de sidebar
     
@@ -459,6 +735,7 @@ def generate_quick_actions(current_data, targets, name):
         current_data: Dict met huidige voortgang (nutrition, workouts, steps)
         targets: Dict met doelen
         name: Naam gebruiker
+        fallback: Geef bij een API fout algemene actiepunten terug (False = fout doorgeven)
         
     Returns:
         Dict met 'nutrition_actions' en 'goals' lists
@@ -551,6 +828,8 @@ Wees kort, specifiek en gemotiveerd. Max 10 woorden per actie. Gebruik getallen.
         }
         
     except Exception as e:
+        if not fallback:
+            raise Exception(f"Fout bij genereren actiepunten: {str(e)}")
         # Fallback to basic recommendations
         return {
             'nutrition_actions': [
@@ -565,7 +844,7 @@ Wees kort, specifiek en gemotiveerd. Max 10 woorden per actie. Gebruik getallen.
             ]
         }
 
-def generate_insights_and_feedback(current_data, targets, period_stats, name):
+def generate_insights_and_feedback(current_data, targets, period_stats, name, fallback: bool = True):
     """
     Genereer slimme inzichten EN verbeterpunten/successen voor in de Overzicht tab
     
@@ -574,6 +853,7 @@ def generate_insights_and_feedback(current_data, targets, period_stats, name):
         targets: Dict met doelen
         period_stats: Dict met periode statistieken
         name: Naam gebruiker
+        fallback: Geef bij een API fout algemene feedback terug (False = fout doorgeven)
         
     Returns:
         Dict met 'insights' (list), 'improvements' (list), 'successes' (list)
@@ -736,6 +1016,8 @@ Wees specifiek, realistisch, en gemotiveerd. Max 20 woorden per item."""
         }
         
     except Exception as e:
+        if not fallback:
+            raise Exception(f"Fout bij genereren inzichten: {str(e)}")
         # Fallback to basic feedback
         return {
             'insights': [{
@@ -755,7 +1037,7 @@ Wees specifiek, realistisch, en gemotiveerd. Max 20 woorden per item."""
         }
 
 
-def generate_measurement_warning(vet_change, spier_change, current_nutrition, targets, name):
+def generate_measurement_warning(vet_change, spier_change, current_nutrition, targets, name, fallback: bool = True):
     """
     Genereer AI-powered waarschuwing wanneer vetpercentage stijgt en spiermassa daalt
     
@@ -765,6 +1047,7 @@ def generate_measurement_warning(vet_change, spier_change, current_nutrition, ta
         current_nutrition: Dict met huidige voeding totals
         targets: Dict met doelen
         name: Naam gebruiker
+        fallback: Geef bij een API fout een standaard waarschuwing terug (False = fout doorgeven)
         
     Returns:
         HTML formatted warning message
@@ -807,6 +1090,8 @@ Wees direct, urgent maar constructief. Noem exacte cijfers en acties."""
         return response.choices[0].message.content
         
     except Exception as e:
+        if not fallback:
+            raise Exception(f"Fout bij genereren waarschuwing: {str(e)}")
         # Fallback to simple warning
         return f"""
         <h3 style="margin: 0 0 15px 0;">⚠️ Belangrijke Waarschuwing!</h3>
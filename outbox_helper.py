@@ -0,0 +1,351 @@
+"""
+Helper functies voor asynchroon schrijven naar de sheet
+Nieuwe rijen gaan eerst naar een lokale outbox (SQLite bestand, blijft bewaard bij
+een herstart) en worden door één achtergrond worker in batches naar de opslag
+backend geschreven. De invoer is daardoor direct bevestigd; de rijen staan via de
+write-through al in de cache en worden tot de flush bij elke download weer
+toegevoegd (zie `data_helper.set_pending_provider`).
+
+Per tabblad blijft de volgorde bewaard: een batch wordt pas verwijderd als de
+schrijfactie gelukt is, en een tabblad dat faalt wacht (met exponentiële backoff)
+zonder dat latere rijen van dat tabblad voorgaan. Andere tabbladen gaan gewoon door.
+Een batch die blijvend faalt (bijv. een 400/403 van Sheets, of een rij die niet te
+versturen is) of `MAX_ATTEMPTS` keer mislukt, gaat naar een mislukt-status (zie
+`failed`); die rijen blokkeren het tabblad niet langer en blijven bewaard tot ze
+opnieuw geprobeerd of weggegooid worden.
+
+Rijen toevoegen is niet idempotent. Een batch die met een onbekende afloop mislukt
+(timeout, 5xx) blijft gemarkeerd als verstuurd; voor de volgende poging wordt eerst
+gecontroleerd of de rijen toch al in de sheet staan (zie `landed`). Meerdere server
+processen kunnen dezelfde outbox delen: een worker claimt een batch atomair voordat
+hij die verstuurt.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Schrijf nieuwe rijen via de outbox (0 = direct en blokkerend schrijven)
+ASYNC_WRITES = os.getenv('ASYNC_WRITES', '1') != '0'
+
+# Database bestand van de outbox
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', os.path.join('.cache', 'outbox.db'))
+
+# Maximaal aantal rijen per schrijfactie
+BATCH_SIZE = 500
+
+# Wachttijd (seconden) na de eerste mislukte poging; verdubbelt per poging tot RETRY_MAX
+RETRY_BASE = 2
+RETRY_MAX = 300
+
+# Na zoveel mislukte pogingen gaat een batch naar de mislukt-status
+MAX_ATTEMPTS = 8
+
+# Na hoeveel seconden de claim van een worker op een batch vervalt (bijv. na een gecrasht proces)
+CLAIM_TIMEOUT = 600
+
+# Functie (sheet_id, tab, rows) die rijen in één keer naar de opslag schrijft
+FlushFunction = Callable[[str, str, List[List[Any]]], Any]
+
+def _permanent(error: Exception) -> bool:
+    """True voor fouten die bij opnieuw proberen niet verdwijnen: een geweigerd verzoek (4xx behalve 429) of een rij die niet te versturen is"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return 400 <= status < 500 and status != 429
+    return isinstance(error, (TypeError, ValueError))
+
+def _not_applied(error: Exception) -> bool:
+    """True als de API het verzoek zeker geweigerd heeft (4xx, o.a. 429): opnieuw sturen schrijft niets dubbel"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is not None and 400 <= status < 500
+
+class WriteOutbox:
+    """
+    Duurzame wachtrij van rijen per (sheet_id, tab) met een achtergrond worker
+
+    Args:
+        flush: Schrijft een batch rijen naar de opslag (bijv. `StorageBackend.append_rows`)
+        path: SQLite bestand (':memory:' voor een niet-duurzame outbox)
+        on_flushed: Optionele callback (sheet_id, tab, rows) na een gelukte flush
+        landed: Optionele controle (sheet_id, tab, rows) -> bool of een batch met onbekende
+            afloop toch al geschreven is (bijv. `StorageBackend.has_rows`); zonder controle
+            wordt zo'n batch gewoon opnieuw verstuurd
+    """
+
+    def __init__(self, flush: FlushFunction, path: str = OUTBOX_PATH,
+                 on_flushed: Optional[FlushFunction] = None,
+                 landed: Optional[Callable[[str, str, List[List[Any]]], bool]] = None):
+        self.flush = flush
+        self.on_flushed = on_flushed
+        self.landed = landed
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sheet_id TEXT NOT NULL, tab TEXT NOT NULL, row TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    claimed_by TEXT, claimed_at REAL, attempted INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0, failed_at REAL, error TEXT)""")
+            # Outbox van een eerdere versie: claim en mislukt kolommen toevoegen
+            columns = {column[1] for column in self._conn.execute("PRAGMA table_info(outbox)")}
+            for name, definition in (('claimed_by', 'TEXT'), ('claimed_at', 'REAL'),
+                                     ('attempted', 'INTEGER NOT NULL DEFAULT 0'),
+                                     ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+                                     ('failed_at', 'REAL'), ('error', 'TEXT')):
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE outbox ADD COLUMN {name} {definition}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_by_tab ON outbox (sheet_id, tab, id)")
+        self._failures = {}  # (sheet_id, tab) -> (pogingen, volgende poging, foutmelding)
+        self._wake = threading.Event()
+        self._flushing = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        """Start de achtergrond worker (een eventuele achterstand van een vorige run wordt direct geschreven)"""
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._run, name='sheet-outbox', daemon=True)
+            self._worker.start()
+        self._wake.set()
+
+    def enqueue(self, sheet_id: str, tab: str, rows: List[List[Any]]) -> int:
+        """
+        Zet rijen in de outbox en wek de worker
+
+        Returns:
+            Aantal rijen in de outbox gezet
+        """
+        if not rows:
+            return 0
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO outbox (sheet_id, tab, row, created_at) VALUES (?, ?, ?, ?)",
+                [(sheet_id, tab, json.dumps(list(row), default=str), now) for row in rows])
+        self._wake.set()
+        return len(rows)
+
+    def pending(self, sheet_id: str, tab: str) -> List[List[Any]]:
+        """Rijen van een tabblad die nog geschreven worden, in volgorde (zonder mislukte rijen)"""
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT row FROM outbox WHERE sheet_id = ? AND tab = ? AND failed_at IS NULL ORDER BY id",
+                (sheet_id, tab)).fetchall()
+        return [json.loads(row) for (row,) in found]
+
+    def failed(self, sheet_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Mislukte rijen (oudste eerst), elk met tab, row, error en failed_at"""
+        sql, params = "SELECT tab, row, error, failed_at FROM outbox WHERE failed_at IS NOT NULL", ()
+        if sheet_id is not None:
+            sql, params = sql + " AND sheet_id = ?", (sheet_id,)
+        with self._lock:
+            found = self._conn.execute(sql + " ORDER BY id", params).fetchall()
+        return [{'tab': tab, 'row': json.loads(row), 'error': error, 'failed_at': failed_at}
+                for tab, row, error, failed_at in found]
+
+    def retry_failed(self, sheet_id: Optional[str] = None) -> int:
+        """Zet mislukte rijen terug in de wachtrij; returns het aantal rijen"""
+        sql, params = "UPDATE outbox SET failed_at = NULL, error = NULL, attempts = 0 WHERE failed_at IS NOT NULL", ()
+        if sheet_id is not None:
+            sql, params = sql + " AND sheet_id = ?", (sheet_id,)
+        with self._lock, self._conn:
+            count = self._conn.execute(sql, params).rowcount
+        self._wake.set()
+        return count
+
+    def discard_failed(self, sheet_id: Optional[str] = None) -> int:
+        """Gooi mislukte rijen weg; returns het aantal rijen"""
+        sql, params = "DELETE FROM outbox WHERE failed_at IS NOT NULL", ()
+        if sheet_id is not None:
+            sql, params = sql + " AND sheet_id = ?", (sheet_id,)
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def status(self, sheet_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stand van de outbox (voor één sheet of alles)
+
+        Returns:
+            Dict met pending (aantal rijen in de wachtrij), error (laatste fout van een
+            tabblad dat wacht, of None), retry_in (seconden tot de volgende poging, of
+            None), failed (aantal mislukte rijen) en failed_error (fout van de laatst
+            mislukte rij, of None)
+        """
+        where, params = "", ()
+        if sheet_id is not None:
+            where, params = " AND sheet_id = ?", (sheet_id,)
+        with self._lock:
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE failed_at IS NULL" + where, params).fetchone()[0]
+            failed = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE failed_at IS NOT NULL" + where, params).fetchone()[0]
+            last_failed = self._conn.execute(
+                "SELECT error FROM outbox WHERE failed_at IS NOT NULL" + where + " ORDER BY failed_at DESC LIMIT 1",
+                params).fetchone()
+            failed_error = last_failed[0] if last_failed else None
+            failures = [failure for (sid, _), failure in self._failures.items()
+                        if sheet_id is None or sid == sheet_id]
+        status = {'pending': pending, 'error': None, 'retry_in': None,
+                  'failed': failed, 'failed_error': failed_error}
+        if failures:
+            _, next_at, error = min(failures, key=lambda failure: failure[1])
+            status.update({'error': error, 'retry_in': max(0.0, next_at - time.time())})
+        return status
+
+    def flush_due(self) -> Optional[float]:
+        """
+        Schrijf alle tabbladen die niet in backoff zijn (per tabblad in batches, oudste eerst)
+
+        Returns:
+            Seconden tot de volgende poging van een tabblad in backoff, of None
+        """
+        with self._flushing:
+            with self._lock:
+                groups = self._conn.execute("""
+                    SELECT sheet_id, tab FROM outbox WHERE failed_at IS NULL
+                    GROUP BY sheet_id, tab ORDER BY MIN(id)
+                """).fetchall()
+            for sheet_id, tab in groups:
+                self._flush_tab(sheet_id, tab)
+
+            with self._lock:
+                waits = [next_at - time.time() for _, next_at, _ in self._failures.values()]
+            return max(0.0, min(waits)) if waits else None
+
+    def _claim(self, ids: List[int]) -> Optional[bool]:
+        """
+        Claim een batch voor deze worker en markeer hem als verstuurd
+
+        Returns:
+            None als (een deel van) de batch al door een andere worker geclaimd of
+            geschreven is, anders of de batch al eerder (met onbekende afloop) verstuurd is
+        """
+        marks = ','.join('?' * len(ids))
+        now = time.time()
+        with self._lock, self._conn:
+            claimed = self._conn.execute(
+                f"""UPDATE outbox SET claimed_by = ?, claimed_at = ?
+                    WHERE id IN ({marks}) AND (claimed_by IS NULL OR claimed_by = ? OR claimed_at < ?)""",
+                (self.worker_id, now, *ids, self.worker_id, now - CLAIM_TIMEOUT)).rowcount
+            if claimed != len(ids):
+                self._conn.execute(
+                    f"UPDATE outbox SET claimed_by = NULL, claimed_at = NULL WHERE id IN ({marks}) AND claimed_by = ?",
+                    (*ids, self.worker_id))
+                return None
+            attempted = self._conn.execute(
+                f"SELECT MAX(attempted) FROM outbox WHERE id IN ({marks})", ids).fetchone()[0]
+            # Vóór het versturen: een crash tijdens de schrijfactie laat de batch als verstuurd achter
+            self._conn.execute(f"UPDATE outbox SET attempted = 1 WHERE id IN ({marks})", ids)
+        return bool(attempted)
+
+    def _release(self, ids: List[int], attempted: bool):
+        """Geef een batch vrij voor een volgende poging"""
+        marks = ','.join('?' * len(ids))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"""UPDATE outbox SET claimed_by = NULL, claimed_at = NULL, attempted = ?
+                    WHERE id IN ({marks}) AND claimed_by = ?""", (int(attempted), *ids, self.worker_id))
+
+    def _give_up(self, ids: List[int], error: Exception) -> bool:
+        """Tel een mislukte poging; True als de batch naar de mislukt-status gaat"""
+        marks = ','.join('?' * len(ids))
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE outbox SET attempts = attempts + 1 WHERE id IN ({marks})", ids)
+            attempts = self._conn.execute(f"SELECT MAX(attempts) FROM outbox WHERE id IN ({marks})", ids).fetchone()[0]
+            if not _permanent(error) and attempts < MAX_ATTEMPTS:
+                return False
+            self._conn.execute(f"UPDATE outbox SET failed_at = ?, error = ? WHERE id IN ({marks})",
+                               (time.time(), str(error), *ids))
+        print(f"DEBUG: Outbox: {len(ids)} rij(en) opgegeven na {attempts} poging(en): {error}")
+        return True
+
+    def _flush_tab(self, sheet_id: str, tab: str):
+        key = (sheet_id, tab)
+        while True:
+            with self._lock:
+                failure = self._failures.get(key)
+                if failure is not None and failure[1] > time.time():
+                    return
+                batch = self._conn.execute(
+                    "SELECT id, row FROM outbox WHERE sheet_id = ? AND tab = ? AND failed_at IS NULL ORDER BY id LIMIT ?",
+                    (sheet_id, tab, BATCH_SIZE)).fetchall()
+            if not batch:
+                return
+            ids = [row_id for row_id, _ in batch]
+            uncertain = self._claim(ids)
+            if uncertain is None:
+                # Een andere worker (ander proces) schrijft dit tabblad nu
+                return
+            rows = [json.loads(row) for _, row in batch]
+            sent = False
+            try:
+                if uncertain and self.landed is not None and self.landed(sheet_id, tab, rows):
+                    print(f"DEBUG: Outbox: {len(rows)} rij(en) van {tab} stonden al in de sheet, niet opnieuw verstuurd")
+                else:
+                    sent = True
+                    self.flush(sheet_id, tab, rows)
+            except Exception as e:
+                # Alleen een geweigerd verzoek is zeker niet geschreven; anders eerst controleren
+                self._release(ids, attempted=not _not_applied(e) if sent else uncertain)
+                if self._give_up(ids, e):
+                    # Het tabblad gaat door met de rijen erna
+                    with self._lock:
+                        self._failures.pop(key, None)
+                    failure = None
+                    continue
+                attempts = (failure[0] if failure else 0) + 1
+                delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+                print(f"DEBUG: Outbox flush van {tab} mislukt (poging {attempts}), opnieuw over {delay}s: {e}")
+                with self._lock:
+                    self._failures[key] = (attempts, time.time() + delay, str(e))
+                return
+
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in ids])
+                self._failures.pop(key, None)
+            print(f"DEBUG: Outbox: {len(rows)} rij(en) naar {tab} geschreven")
+            if self.on_flushed is not None:
+                try:
+                    self.on_flushed(sheet_id, tab, rows)
+                except Exception as e:
+                    print(f"DEBUG: Outbox callback voor {tab} mislukt: {e}")
+
+    def drain(self, timeout: float = 30) -> bool:
+        """
+        Schrijf alles wat klaar staat en wacht tot de outbox leeg is (of de timeout verloopt)
+
+        Tabbladen in backoff worden niet eerder geprobeerd. Returns: True als de outbox leeg is.
+        """
+        deadline = time.time() + timeout
+        while True:
+            retry_in = self.flush_due()
+            if self.status()['pending'] == 0:
+                return True
+            if retry_in is None or time.time() + retry_in > deadline:
+                return False
+            time.sleep(retry_in)
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=RETRY_MAX)
+            self._wake.clear()
+            try:
+                retry_in = self.flush_due()
+            except Exception as e:
+                print(f"DEBUG: Outbox worker fout: {e}")
+                retry_in = RETRY_BASE
+            while retry_in is not None and not self._wake.is_set():
+                # Wacht op de volgende poging, of eerder als er nieuwe rijen binnenkomen
+                if self._wake.wait(timeout=retry_in):
+                    break
+                retry_in = self.flush_due()
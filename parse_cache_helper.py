@@ -0,0 +1,168 @@
+"""
+Helper functies voor het cachen van AI parse resultaten
+Dezelfde invoer ("250g kwark, banaan, 2 eetlepels lijnzaad") wordt bijna elke dag
+gelogd; het resultaat van de parse_* functies in groq_helper wordt daarom in een
+SQLite bestand bewaard, gedeeld door alle gebruikers en server processen. De key
+is de genormaliseerde tekst (hoofdletters, witruimte en getalnotatie) plus de
+overige argumenten (bijv. het maaltijd type). Entries verlopen na `PARSE_CACHE_TTL`
+en de minst recent gebruikte entries vallen weg boven `PARSE_CACHE_MAX_ENTRIES`.
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Optional
+
+# Cache aan/uit (0 = altijd opnieuw parsen)
+PARSE_CACHE = os.getenv('PARSE_CACHE', '1') != '0'
+
+# Database bestand van de cache
+PARSE_CACHE_PATH = os.getenv('PARSE_CACHE_PATH', os.path.join('.cache', 'parse_cache.db'))
+
+# Hoe lang (seconden) een parse resultaat geldig blijft (default 30 dagen)
+PARSE_CACHE_TTL = int(os.getenv('PARSE_CACHE_TTL', str(30 * 24 * 3600)))
+
+# Maximaal aantal entries; daarboven vallen de minst recent gebruikte weg
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv('PARSE_CACHE_MAX_ENTRIES', '5000'))
+
+# Ophogen als prompts of model veranderen, zodat oude resultaten niet meer gebruikt worden
+CACHE_VERSION = 2
+
+def normalize_text(text: str) -> str:
+    """
+    Tekst zoals die in de cache key gaat
+
+    Kleine letters, één spatie tussen woorden en na een komma, decimale komma als punt, geen
+    overbodige nullen ("2,50" -> "2.5", "80.0" -> "80", "007" -> "7", maar "1,05" blijft
+    "1.05") en geen spatie tussen een getal en zijn eenheid ("250 g" -> "250g").
+    """
+    text = unicodedata.normalize('NFKC', str(text)).lower()
+    text = re.sub(r'(\d),(\d)', r'\1.\2', text)
+    text = re.sub(r'(\d+\.\d*?)0+(?!\d)', r'\1', text)
+    text = re.sub(r'(\d)\.(?!\d)', r'\1', text)
+    text = re.sub(r'(?<![\d.])0+(?=\d)', '', text)
+    text = re.sub(r'(\d)\s+(?=[a-z%])', r'\1', text)
+    text = re.sub(r'\s*([,;])\s*', r'\1 ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip(' .')
+
+def cache_key(kind: str, text: str, *args: Any) -> str:
+    """Key van een parse: soort, genormaliseerde tekst en de overige argumenten"""
+    parts = [CACHE_VERSION, kind, normalize_text(text), *[normalize_text(arg) for arg in args]]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class ParseCache:
+    """
+    Persistente key -> JSON cache met TTL en LRU eviction
+
+    Meerdere processen kunnen hetzelfde bestand gebruiken (SQLite in WAL mode).
+    """
+
+    def __init__(self, path: str = PARSE_CACHE_PATH, ttl: float = PARSE_CACHE_TTL,
+                 max_entries: int = PARSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS parses (
+                    key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL,
+                    created_at REAL NOT NULL, used_at REAL NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS parses_by_use ON parses (used_at)")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Het bewaarde resultaat (een nieuwe kopie), of None als het ontbreekt of verlopen is"""
+        now = time.time()
+        with self._lock, self._conn:
+            found = self._conn.execute("SELECT value, created_at FROM parses WHERE key = ?", (key,)).fetchone()
+            if found is None:
+                return None
+            if now - found[1] > self.ttl:
+                self._conn.execute("DELETE FROM parses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE parses SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(found[0])
+
+    def put(self, key: str, kind: str, value: Any):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parses (key, kind, value, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(value, ensure_ascii=False), now, now))
+            # LRU: alles boven het maximum, minst recent gebruikt eerst
+            self._conn.execute("""
+                DELETE FROM parses WHERE key IN (
+                    SELECT key FROM parses ORDER BY used_at DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def invalidate(self, key: str) -> bool:
+        """Verwijder één entry; True als die bestond"""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM parses WHERE key = ?", (key,)).rowcount > 0
+
+    def clear(self, kind: Optional[str] = None):
+        """Verwijder alle entries (of alleen die van één soort parse)"""
+        with self._lock, self._conn:
+            if kind is None:
+                self._conn.execute("DELETE FROM parses")
+            else:
+                self._conn.execute("DELETE FROM parses WHERE kind = ?", (kind,))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ParseCache:
+    """Gedeelde parse cache van dit proces"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache()
+        return _cache
+
+def cached_parse(kind: str, validate: Optional[Callable[[Any], bool]] = None) -> Callable:
+    """
+    Decorator voor een parse functie `fn(text, *args)` met een JSON-serialiseerbaar resultaat
+
+    Alleen aanroepen met positionele argumenten worden gecachet; aanroepen met
+    keyword argumenten (bijv. de interne retry van parse_nutrition) gaan altijd naar
+    de API. Fouten worden niet gecachet, en met `validate` ook geen resultaten die
+    die controle niet doorstaan (één slechte completion blijft anders
+    `PARSE_CACHE_TTL` lang terugkomen).
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(text, *args, **kwargs):
+            if not PARSE_CACHE or kwargs:
+                return fn(text, *args, **kwargs)
+            key = cache_key(kind, text, *args)
+            try:
+                hit = get_cache().get(key)
+            except Exception as e:
+                print(f"DEBUG: Parse cache niet leesbaar: {e}")
+                return fn(text, *args)
+            if hit is not None:
+                print(f"DEBUG: Parse cache hit voor {kind}")
+                return hit
+
+            result = fn(text, *args)
+            if validate is not None and not validate(result):
+                print(f"DEBUG: Parse resultaat voor {kind} niet gecachet (ongeldig)")
+                return result
+            try:
+                get_cache().put(key, kind, result)
+            except Exception as e:
+                print(f"DEBUG: Parse cache niet schrijfbaar: {e}")
+            # Kopie, zodat de aanroeper het resultaat kan aanpassen zonder de cache te raken
+            return json.loads(json.dumps(result))
+
+        wrapper.invalidate = lambda text, *args: get_cache().invalidate(cache_key(kind, text, *args))
+        return wrapper
+    return decorator
@@ -0,0 +1,166 @@
+"""
+Helper functies voor de quota van Google Sheets
+Eén gedeelde token bucket per soort verzoek ('read' en 'write'), afgestemd op de
+per-minuut quota van de Sheets API, plus een eigen bucket ('export') voor de gviz
+CSV downloads, die niet van de Sheets API quota af gaan, en een retry policy met exponentiële backoff en
+jitter voor fouten die het waard zijn om opnieuw te proberen (429, 5xx, timeouts en
+verbroken verbindingen). Tellers per soort maken zichtbaar hoe dicht we bij de
+quota zitten (zie `stats`).
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Verzoeken per minuut (Sheets API default: 60 lees- en 60 schrijfverzoeken per minuut per gebruiker)
+READS_PER_MINUTE = int(os.getenv('SHEETS_READS_PER_MINUTE', '60'))
+WRITES_PER_MINUTE = int(os.getenv('SHEETS_WRITES_PER_MINUTE', '60'))
+
+# gviz CSV exports per minuut (eigen limiet, los van de API quota)
+EXPORTS_PER_MINUTE = int(os.getenv('SHEETS_EXPORTS_PER_MINUTE', '120'))
+
+# Maximaal aantal pogingen per verzoek en de backoff (seconden) tussen pogingen
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+
+# HTTP statussen die opnieuw geprobeerd worden
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per seconde, maximaal `capacity` tegelijk
+
+    Een volle bucket laat een korte piek (bijv. alle tabbladen bij een koude start)
+    direct door; daarna wordt elk verzoek over de minuut uitgesmeerd.
+    """
+
+    def __init__(self, per_minute: int, capacity: Optional[int] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else max(1, per_minute // 4))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Neem een token; geeft terug hoe lang (seconden) gewacht moet worden voordat het geldig is"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def cancel(self):
+        """Geef een gereserveerd token terug dat niet gebruikt wordt"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+_buckets = {
+    'read': TokenBucket(READS_PER_MINUTE),
+    'write': TokenBucket(WRITES_PER_MINUTE),
+    'export': TokenBucket(EXPORTS_PER_MINUTE),
+}
+
+_stats_lock = threading.Lock()
+_stats = {kind: {'calls': 0, 'throttled': 0, 'wait_seconds': 0.0, 'retries': 0, 'failures': 0,
+                 'last_throttled_at': None, 'last_error': None}
+          for kind in _buckets}
+
+def _count(kind: str, **changes):
+    with _stats_lock:
+        counters = _stats[kind]
+        for key, value in changes.items():
+            if key in ('last_throttled_at', 'last_error'):
+                counters[key] = value
+            else:
+                counters[key] += value
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status van een gspread APIError of requests HTTPError, anders None"""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """
+    True voor quota-, server- en netwerkfouten
+
+    Voor een verzoek dat niet veilig herhaald kan worden (bijv. rijen toevoegen) alleen
+    bij 429: dan is het zeker niet uitgevoerd, bij een 5xx of timeout misschien wel.
+    """
+    import requests
+    if not idempotent:
+        return _status_code(error) == 429
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Wachttijd uit een Retry-After header (in seconden), als de server die meestuurt"""
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def call(kind: str, fn: Callable[[], Any], deadline: Optional[float] = None,
+         idempotent: bool = True) -> Any:
+    """
+    Voer een Sheets verzoek uit binnen de quota, met retries op tijdelijke fouten
+
+    Wacht eerst op een token van de bucket van `kind`. Bij een retryable fout wordt na
+    een backoff met volledige jitter (of de Retry-After van de server) opnieuw
+    geprobeerd, tot `MAX_ATTEMPTS` pogingen.
+
+    Args:
+        kind: 'read', 'write' of 'export' (gviz CSV download)
+        fn: Het verzoek zelf
+        deadline: Optioneel tijdstip (time.time()) waarna niet meer gewacht wordt; de
+            laatste fout (of een TimeoutError als het token pas na de deadline
+            vrijkomt) wordt dan direct doorgegeven
+        idempotent: False voor verzoeken die bij herhaling dubbel kunnen schrijven
+    """
+    last_error = None
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        wait = _buckets[kind].reserve()
+        if deadline is not None and time.time() + wait > deadline:
+            # Niet wachten op een token dat pas na de deadline geldig is
+            _buckets[kind].cancel()
+            _count(kind, failures=1, last_throttled_at=time.time())
+            if last_error is not None:
+                raise last_error
+            raise TimeoutError(f"Sheets {kind} quota: volgende verzoek pas over {wait:.1f}s, na de deadline")
+        if wait > 0:
+            _count(kind, throttled=1, wait_seconds=wait, last_throttled_at=time.time())
+            time.sleep(wait)
+        _count(kind, calls=1)
+        try:
+            return fn()
+        except Exception as e:
+            last_error = e
+            if not is_retryable(e, idempotent):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+            out_of_time = deadline is not None and time.time() + delay > deadline
+            if attempt == MAX_ATTEMPTS or out_of_time:
+                _count(kind, failures=1, last_error=str(e))
+                raise
+            print(f"DEBUG: Sheets {kind} verzoek mislukt ({_status_code(e) or type(e).__name__}), "
+                  f"poging {attempt + 1} over {delay:.1f}s")
+            _count(kind, retries=1, last_error=str(e), last_throttled_at=time.time())
+            time.sleep(delay)
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Kopie van de tellers per soort verzoek (calls, throttled, wait_seconds, retries, failures, ...)"""
+    with _stats_lock:
+        return {kind: dict(counters) for kind, counters in _stats.items()}
+
+def under_pressure(window: float = 60) -> bool:
+    """True als er in de laatste `window` seconden op de quota gewacht of opnieuw geprobeerd is"""
+    with _stats_lock:
+        times = [counters['last_throttled_at'] for counters in _stats.values() if counters['last_throttled_at']]
+    return bool(times) and time.time() - max(times) <= window
@@ -0,0 +1,312 @@
+"""
+Helper functies voor het typeren van de sheet data
+Zet de ruwe tabbladen één keer per data versie om naar vaste types, zodat het
+dashboard niet bij elke rerun opnieuw tekst hoeft te parsen. Tabbladen met een
+datum worden gesorteerd op de geparste datum, zodat dag- en periode-selecties
+met een binary search gaan in plaats van met string vergelijkingen
+"""
+import re
+import threading
+import weakref
+from datetime import date, datetime
+from typing import Any, Dict, List, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+# Schema per tabblad:
+#   numeric:  kolommen die getallen moeten zijn (decimale komma's worden punten)
+#   duration: kolommen met HH:MM:SS / MM:SS tekst; krijgen een extra '<kolom>_sec' kolom
+#   category: kolommen met een vaste set waarden, genormaliseerd als categorical
+#   date:     datumkolommen (DD/MM/YYYY); krijgen een extra '<kolom>_dt' kolom (datetime64)
+TAB_SCHEMAS: Dict[str, Dict[str, List[str]]] = {
+    'voeding': {
+        'numeric': ['calorien', 'eiwit', 'koolhydraten', 'vetten', 'vezels'],
+        'category': ['maaltijd'],
+        'date': ['datum'],
+    },
+    'activiteiten': {
+        'numeric': ['gewicht', 'afstand', 'sets', 'reps'],
+        'duration': ['duur'],
+        'category': ['type'],
+        'date': ['datum'],
+    },
+    'stappen': {
+        'numeric': ['stappen'],
+        'category': ['cardio'],
+        'date': ['datum'],
+    },
+    'gewicht': {
+        'numeric': ['gewicht'],
+        'date': ['datum'],
+    },
+}
+
+# Synoniemen voor de ja/nee cardio kolom in 'stappen'
+CARDIO_VALUES = {'ja': 'ja', 'yes': 'ja', 'j': 'ja', 'nee': 'nee', 'no': 'nee', 'n': 'nee'}
+
+_DURATION_RE = re.compile(r'^\s*(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)\s*$')
+
+def to_number(value: Any) -> float:
+    """Eén waarde naar float (getallen blijven getallen, '5,2' wordt 5.2), anders NaN"""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return np.nan
+
+def duration_seconds(value: Any) -> float:
+    """
+    Eén duur naar seconden
+
+    Tekst als 'HH:MM:SS' of 'MM:SS' wordt geparsed; een getal wordt gezien als een
+    al berekend aantal seconden (zoals in de '<kolom>_sec' kolommen). Anders NaN.
+    """
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    match = _DURATION_RE.match(str(value))
+    if not match:
+        return np.nan
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+def to_numeric(series: pd.Series) -> pd.Series:
+    """Kolom naar getallen met decimale komma's; onleesbare waarden worden NaN"""
+    if is_numeric_dtype(series):
+        return series.astype(float) if series.dtype == bool else series
+    text = series.astype(str).str.strip().str.replace(',', '.', regex=False)
+    return pd.to_numeric(text.where(series.notna()), errors='coerce')
+
+def to_seconds(series: pd.Series) -> pd.Series:
+    """Duurkolom (HH:MM:SS of MM:SS) naar seconden, vectorized"""
+    parts = series.astype(str).str.extract(_DURATION_RE.pattern)
+    parts = parts.apply(pd.to_numeric, errors='coerce')
+    seconds = parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+    return seconds.where(series.notna())
+
+def _parse_date_strings(values: np.ndarray) -> pd.DatetimeIndex:
+    """
+    Parse unieke datum strings naar middernacht
+
+    Volgorde: DD/MM/YYYY (ook met '-'), DD/MM zonder jaar (huidig jaar), en als
+    laatste poging de trage automatische parser met dayfirst.
+    """
+    text = pd.Index(values, dtype=object).astype(str).str.strip().str.replace('-', '/', regex=False)
+    parsed = pd.to_datetime(text, format='%d/%m/%Y', errors='coerce').as_unit('ns').to_numpy().copy()
+
+    missing = np.isnat(parsed)
+    if missing.any():
+        with_year = text[missing] + f'/{datetime.now().year}'
+        parsed[missing] = pd.to_datetime(with_year, format='%d/%m/%Y', errors='coerce').as_unit('ns').to_numpy()
+
+    missing = np.isnat(parsed)
+    if missing.any():
+        fallback = [pd.to_datetime(v, dayfirst=True, errors='coerce') for v in np.asarray(values, dtype=object)[missing]]
+        parsed[missing] = pd.DatetimeIndex(fallback).as_unit('ns').to_numpy()
+
+    return pd.DatetimeIndex(parsed).normalize()
+
+def parse_dates(series: pd.Series) -> pd.Series:
+    """
+    Datumkolom naar datetime64 (middernacht); onleesbare datums worden NaT
+
+    Elke unieke datum string wordt maar één keer geparsed, ook als de kolom
+    duizenden rijen met dezelfde dagen bevat.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.normalize()
+    codes, uniques = pd.factorize(series)
+    values = np.full(len(series), np.datetime64('NaT'), dtype='datetime64[ns]')
+    if len(uniques):
+        parsed = _parse_date_strings(np.asarray(uniques, dtype=object)).to_numpy()
+        known = codes >= 0
+        values[known] = parsed[codes[known]]
+    return pd.Series(values, index=series.index, name=series.name)
+
+def to_datetime(series: pd.Series) -> pd.Series:
+    """Datumkolom naar datetime64, zie `parse_dates`"""
+    return parse_dates(series)
+
+def to_day(value: Union[str, date, datetime, pd.Timestamp]) -> pd.Timestamp:
+    """Eén datum (string in een van de sheet formaten, date of datetime) naar middernacht"""
+    if isinstance(value, str):
+        return _parse_date_strings(np.array([value], dtype=object))[0]
+    return pd.Timestamp(value).normalize()
+
+def date_values(df: pd.DataFrame, date_column: str = 'datum') -> pd.Series:
+    """De geparste datums van een DataFrame: de '<kolom>_dt' kolom als die er is, anders parsen"""
+    derived = f'{date_column}_dt'
+    if derived in df.columns:
+        return df[derived]
+    return parse_dates(df[date_column])
+
+def _is_sorted(values: np.ndarray) -> bool:
+    """True als de datums oplopend gesorteerd zijn met de NaT's achteraan"""
+    # NaT telt in numpy als grootste waarde, dus een gesorteerde kolom heeft de NaT's achteraan
+    n_valid = np.searchsorted(values, np.datetime64('NaT'))
+    return bool(np.isnat(values[n_valid:]).all() and not (values[1:n_valid] < values[:n_valid - 1]).any())
+
+class DateIndex:
+    """
+    Datum index op één DataFrame voor periode-selecties
+
+    De datums worden één keer opgehaald (of geparsed). Op een gesorteerde DataFrame,
+    zoals elk geladen tabblad, is een selectie een binary search en een iloc slice
+    zonder kopie van de data; anders een masker. Herhaalde selecties met dezelfde
+    (start, end) komen uit een klein geheugen. De DataFrame en de selecties worden
+    gedeeld en moeten dus als read-only behandeld worden.
+    """
+    MAX_RANGES = 64
+
+    def __init__(self, df: pd.DataFrame, date_column: str = 'datum'):
+        self._df = weakref.ref(df)
+        self.values = date_values(df, date_column).to_numpy(dtype='datetime64[ns]')
+        self.is_sorted = _is_sorted(self.values)
+        self._ranges = {}  # (start, end) -> DataFrame
+        self._lock = threading.Lock()
+
+    def rows(self, start, end) -> pd.DataFrame:
+        """Rijen met een datum tussen `start` en `end` (inclusief)"""
+        key = (start, end)
+        with self._lock:
+            hit = self._ranges.get(key)
+        if hit is not None:
+            return hit
+
+        df = self._df()
+        if df is None:
+            raise ValueError("DataFrame van deze DateIndex bestaat niet meer")
+        start_dt = to_day(start).to_datetime64()
+        end_dt = to_day(end).to_datetime64()
+        if self.is_sorted:
+            lo = np.searchsorted(self.values, start_dt, side='left')
+            hi = np.searchsorted(self.values, end_dt, side='right')
+            result = df.iloc[lo:hi]
+        else:
+            result = df[(self.values >= start_dt) & (self.values <= end_dt)]
+
+        with self._lock:
+            if len(self._ranges) >= self.MAX_RANGES:
+                self._ranges.clear()
+            self._ranges[key] = result
+        return result
+
+# (id(df), date_column) -> DateIndex; een entry verdwijnt als de DataFrame opgeruimd wordt
+_date_indexes: Dict[Tuple[int, str], DateIndex] = {}
+_date_indexes_lock = threading.Lock()
+
+def date_index(df: pd.DataFrame, date_column: str = 'datum') -> DateIndex:
+    """
+    Geef de (gedeelde) DateIndex van een DataFrame terug
+
+    Geladen tabbladen blijven hetzelfde object tot hun data versie verandert, dus de
+    index en de onthouden selecties blijven over reruns heen bruikbaar.
+    """
+    key = (id(df), date_column)
+    with _date_indexes_lock:
+        index = _date_indexes.get(key)
+    if index is not None and index._df() is df:
+        return index
+
+    index = DateIndex(df, date_column)
+    with _date_indexes_lock:
+        _date_indexes[key] = index
+    weakref.finalize(df, _date_indexes.pop, key, None)
+    return index
+
+def range_rows(df: pd.DataFrame, start, end, date_column: str = 'datum') -> pd.DataFrame:
+    """
+    Rijen met een datum tussen `start` en `end` (inclusief), zie `DateIndex`
+
+    Het resultaat is een slice van `df` en mag niet aangepast worden; gebruik `.copy()`
+    als er kolommen toegevoegd of gewijzigd moeten worden.
+    """
+    return date_index(df, date_column).rows(start, end)
+
+def day_rows(df: pd.DataFrame, day, date_column: str = 'datum') -> pd.DataFrame:
+    """Rijen van één dag; `day` mag een string in DD/MM/YYYY of DD-MM-YYYY vorm of een date zijn"""
+    return range_rows(df, day, day, date_column)
+
+def to_category(series: pd.Series, column: str) -> pd.Series:
+    """Normaliseer een categorie kolom ('cardio ' en 'Cardio' worden één waarde)"""
+    text = series.astype(str).str.strip().where(series.notna())
+    text = text.where(text != '')
+    if column == 'cardio':
+        lowered = text.str.lower()
+        text = lowered.map(CARDIO_VALUES).fillna(lowered)
+    else:
+        text = text.str.capitalize()
+    return text.astype('category')
+
+def _fix_decimal_commas(series: pd.Series) -> pd.Series:
+    """Tekstkolom met alleen getallen (met decimale komma) naar getallen, anders ongewijzigd"""
+    if is_numeric_dtype(series) or series.dropna().empty:
+        return series
+    converted = to_numeric(series)
+    if converted[series.notna()].isna().any():
+        return series
+    return converted
+
+def is_typed(tab: str, column: str) -> bool:
+    """True als de kolom een vast type heeft in het schema van dit tabblad"""
+    schema = TAB_SCHEMAS.get(tab, {})
+    return any(column in cols for cols in schema.values()) or is_derived(tab, column)
+
+def is_derived(tab: str, column: str) -> bool:
+    """True als de kolom door het schema wordt toegevoegd (en dus niet in de sheet staat)"""
+    schema = TAB_SCHEMAS.get(tab, {})
+    derived = [f'{col}_sec' for col in schema.get('duration', [])]
+    derived += [f'{col}_dt' for col in schema.get('date', [])]
+    return column in derived
+
+def normalize_tab(tab: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Geef een getypeerde kopie van een tabblad terug
+
+    Bekende kolommen krijgen het type uit `TAB_SCHEMAS`; overige tekstkolommen die
+    alleen uit getallen met een decimale komma bestaan worden ook getallen. De
+    functie is idempotent, zodat een al getypeerde DataFrame opnieuw door kan.
+    Het resultaat is gesorteerd op datum (zie `range_rows` en `day_rows`).
+    """
+    if df.empty and len(df.columns) == 0:
+        return df
+
+    df = df.copy()
+    schema = TAB_SCHEMAS.get(tab, {})
+    typed = set()
+
+    for col in schema.get('numeric', []):
+        if col in df.columns:
+            df[col] = to_numeric(df[col])
+            typed.add(col)
+
+    for col in schema.get('duration', []):
+        if col in df.columns:
+            df[f'{col}_sec'] = to_seconds(df[col])
+            typed.update([col, f'{col}_sec'])
+
+    for col in schema.get('category', []):
+        if col in df.columns:
+            df[col] = to_category(df[col], col)
+            typed.add(col)
+
+    for col in schema.get('date', []):
+        if col in df.columns:
+            df[f'{col}_dt'] = to_datetime(df[col])
+            typed.update([col, f'{col}_dt'])
+
+    for col in df.columns:
+        if col not in typed:
+            df[col] = _fix_decimal_commas(df[col])
+
+    # Sorteer op de eerste datumkolom (stabiel, zodat de volgorde binnen een dag blijft)
+    date_cols = [col for col in schema.get('date', []) if col in df.columns]
+    if date_cols:
+        df = df.sort_values(f'{date_cols[0]}_dt', kind='stable', na_position='last', ignore_index=True)
+
+    return df
@@ -1,12 +1,19 @@
 """
 Helper functies voor Google Sheets integratie
+Alle lees- en schrijfacties gaan via de opslag backend (zie storage_helper), zodat
+dezelfde functies ook met een lokale SQLite database werken. Nieuwe rijen gaan via
+de outbox (zie outbox_helper) en worden op de achtergrond geschreven
 """
 import os
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import gspread
 from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
+import data_helper
+import outbox_helper
+import storage_helper
 
 # Load environment variables
 load_dotenv()
@@ -17,7 +24,31 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
+_client = None
+_client_lock = threading.Lock()
+
 def get_sheets_client():
+    """
+    Gedeelde Google Sheets API client (één per proces, thread-safe aangemaakt)
+
+    De credentials worden één keer geladen; de client vernieuwt zijn access token
+    zelf zodra dat verloopt.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _create_sheets_client()
+        return _client
+
+def reset_sheets_client():
+    """Vergeet de gedeelde client en de gecachte sheet handles (bijv. na nieuwe credentials)"""
+    global _client
+    with _client_lock:
+        _client = None
+    if _backend is not None and hasattr(_backend, 'forget'):
+        _backend.forget()
+
+def _create_sheets_client():
     """Maak verbinding met Google Sheets API"""
     try:
         # Try Streamlit secrets first (for cloud deployment)
@@ -48,17 +79,103 @@ def get_sheets_client():
     except Exception as e:
         raise Exception(f"Fout bij verbinden met Google Sheets: {str(e)}")
 
-def get_spreadsheet(sheet_id: Optional[str] = None):
-    """Haal de sport tracking spreadsheet op"""
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> storage_helper.StorageBackend:
+    """Gedeelde opslag backend (Google Sheets of SQLite, zie STORAGE_BACKEND)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = storage_helper.create_backend(get_sheets_client)
+        return _backend
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> outbox_helper.WriteOutbox:
+    """
+    Gedeelde outbox voor nieuwe rijen, met gestarte worker
+
+    Registreert de outbox bij data_helper, zodat rijen die nog niet geschreven zijn
+    bij het laden aan de tabbladen worden toegevoegd.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = outbox_helper.WriteOutbox(
+                lambda sheet_id, tab, rows: get_backend().append_rows(sheet_id, tab, rows),
+                landed=lambda sheet_id, tab, rows: get_backend().has_rows(sheet_id, tab, rows))
+            data_helper.set_pending_provider(_outbox.pending)
+            _outbox.start()
+        return _outbox
+
+def outbox_status(sheet_id: Optional[str] = None) -> Dict[str, Any]:
+    """Stand van de outbox (zie `WriteOutbox.status`); leeg als er niet asynchroon geschreven wordt"""
+    if not outbox_helper.ASYNC_WRITES:
+        return {'pending': 0, 'error': None, 'retry_in': None, 'failed': 0, 'failed_error': None}
+    return get_outbox().status(resolve_sheet_id(sheet_id))
+
+def retry_failed_writes(sheet_id: Optional[str] = None) -> int:
+    """Zet mislukte outbox rijen van een sheet terug in de wachtrij (zie `WriteOutbox.retry_failed`)"""
+    if not outbox_helper.ASYNC_WRITES:
+        return 0
+    return get_outbox().retry_failed(resolve_sheet_id(sheet_id))
+
+def discard_failed_writes(sheet_id: Optional[str] = None) -> int:
+    """Gooi mislukte outbox rijen van een sheet weg (zie `WriteOutbox.discard_failed`)"""
+    if not outbox_helper.ASYNC_WRITES:
+        return 0
+    return get_outbox().discard_failed(resolve_sheet_id(sheet_id))
+
+def resolve_sheet_id(sheet_id: Optional[str] = None) -> str:
+    """Sheet ID, met als fallback SHEET_ID_ALEX of SHEET_ID uit de omgeving"""
     if not sheet_id:
         # Fallback naar SHEET_ID_ALEX als geen sheet_id is opgegeven
         sheet_id = os.getenv('SHEET_ID_ALEX') or os.getenv('SHEET_ID')
     
     if not sheet_id:
         raise ValueError("Geen SHEET_ID gevonden. Zet SHEET_ID_ALEX of SHEET_ID in .env bestand")
-    
+    return sheet_id
+
+def get_spreadsheet(sheet_id: Optional[str] = None):
+    """Haal de sport tracking spreadsheet op"""
     client = get_sheets_client()
-    return client.open_by_key(sheet_id)
+    return client.open_by_key(resolve_sheet_id(sheet_id))
+
+def _write_through(sheet_id: str, tab: str, rows):
+    """Zet net geschreven rijen direct in de data cache (fouten zijn niet fataal)"""
+    try:
+        data_helper.apply_write(sheet_id, tab, rows)
+    except Exception as e:
+        print(f"DEBUG: Write-through naar cache mislukt voor {tab}: {e}")
+        data_helper.invalidate(sheet_id, tab)
+
+def append_rows(tab: str, rows: List[List[Any]], sheet_id: Optional[str] = None) -> int:
+    """
+    Voeg rijen in één API call toe onderaan een tabblad en zet ze direct in de data cache
+
+    Met `ASYNC_WRITES` gaan de rijen naar de outbox en keert de functie direct terug;
+    de worker schrijft ze in een batch naar de sheet.
+
+    Args:
+        tab: Naam van het tabblad (bijv. 'voeding')
+        rows: Rijen in de kolomvolgorde van het tabblad
+        sheet_id: Google Sheet ID (optional)
+
+    Returns:
+        Aantal geschreven rijen
+    """
+    if not rows:
+        return 0
+    sheet_id = resolve_sheet_id(sheet_id)
+    if outbox_helper.ASYNC_WRITES:
+        get_outbox().enqueue(sheet_id, tab, rows)
+    else:
+        # De backend schrijft met USER_ENTERED zodat datums als datums worden opgeslagen
+        get_backend().append_rows(sheet_id, tab, rows)
+    _write_through(sheet_id, tab, rows)
+    return len(rows)
 
 def write_to_voeding(data: Dict[str, Any], sheet_id: Optional[str] = None) -> bool:
     """
@@ -77,32 +194,44 @@ def write_to_voeding(data: Dict[str, Any], sheet_id: Optional[str] = None) -> bo
     }
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        sheet = spreadsheet.worksheet('voeding')
-        
-        # Zorg voor datum in juiste formaat (ZONDER apostrofe voor Google Sheets)
-        if 'datum' not in data:
-            data['datum'] = datetime.now().strftime('%d/%m/%Y')
-        
-        # Maak row aan met juiste volgorde
-        row = [
-            data.get('datum', ''),
-            data.get('maaltijd', ''),
-            data.get('omschrijving', ''),
-            data.get('calorien', 0),
-            data.get('eiwit', 0),
-            data.get('koolhydraten', 0),
-            data.get('vetten', 0),
-            data.get('vezels', 0)
-        ]
-        
-        # Append row met value_input_option='USER_ENTERED' zodat datums als datums worden opgeslagen
-        sheet.append_row(row, value_input_option='USER_ENTERED')
+        append_rows('voeding', [_voeding_row(data)], sheet_id)
         return True
         
     except Exception as e:
         raise Exception(f"Fout bij schrijven naar voeding sheet: {str(e)}")
 
+def write_many_to_voeding(meals: List[Dict[str, Any]], sheet_id: Optional[str] = None) -> int:
+    """
+    Schrijf meerdere maaltijden in één API call naar de 'voeding' sheet
+
+    Args:
+        meals: Lijst met dicts in hetzelfde formaat als bij `write_to_voeding`
+
+    Returns:
+        Aantal geschreven rijen
+    """
+    try:
+        return append_rows('voeding', [_voeding_row(meal) for meal in meals], sheet_id)
+    except Exception as e:
+        raise Exception(f"Fout bij schrijven naar voeding sheet: {str(e)}")
+
+def _voeding_row(data: Dict[str, Any]) -> List[Any]:
+    """Rij voor de 'voeding' sheet in de juiste kolomvolgorde"""
+    # Zorg voor datum in juiste formaat (ZONDER apostrofe voor Google Sheets)
+    if 'datum' not in data:
+        data['datum'] = datetime.now().strftime('%d/%m/%Y')
+    
+    return [
+        data.get('datum', ''),
+        data.get('maaltijd', ''),
+        data.get('omschrijving', ''),
+        data.get('calorien', 0),
+        data.get('eiwit', 0),
+        data.get('koolhydraten', 0),
+        data.get('vetten', 0),
+        data.get('vezels', 0)
+    ]
+
 def write_to_activiteiten(data: Dict[str, Any], sheet_id: Optional[str] = None) -> bool:
     """
     Schrijf activiteit data naar de 'activiteiten' sheet
@@ -121,30 +250,29 @@ def write_to_activiteiten(data: Dict[str, Any], sheet_id: Optional[str] = None)
     }
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        sheet = spreadsheet.worksheet('activiteiten')
-        
-        if 'datum' not in data:
-            data['datum'] = datetime.now().strftime('%d/%m/%Y')
-        
-        row = [
-            data.get('datum', ''),
-            data.get('activiteit', ''),
-            data.get('type', ''),
-            data.get('gewicht', ''),
-            data.get('afstand', ''),
-            data.get('duur', ''),
-            data.get('sets', ''),
-            data.get('reps', ''),
-            data.get('methode', '')
-        ]
-        
-        sheet.append_row(row, value_input_option='USER_ENTERED')
+        append_rows('activiteiten', [_activiteiten_row(data)], sheet_id)
         return True
         
     except Exception as e:
         raise Exception(f"Fout bij schrijven naar activiteiten sheet: {str(e)}")
 
+def _activiteiten_row(data: Dict[str, Any]) -> List[Any]:
+    """Rij voor de 'activiteiten' sheet in de juiste kolomvolgorde"""
+    if 'datum' not in data:
+        data['datum'] = datetime.now().strftime('%d/%m/%Y')
+    
+    return [
+        data.get('datum', ''),
+        data.get('activiteit', ''),
+        data.get('type', ''),
+        data.get('gewicht', ''),
+        data.get('afstand', ''),
+        data.get('duur', ''),
+        data.get('sets', ''),
+        data.get('reps', ''),
+        data.get('methode', '')
+    ]
+
 def write_to_stappen(stappen: int, cardio: str, datum: Optional[str] = None, sheet_id: Optional[str] = None) -> bool:
     """
     Schrijf stappen data naar de 'stappen' sheet
@@ -156,14 +284,10 @@ def write_to_stappen(stappen: int, cardio: str, datum: Optional[str] = None, she
         sheet_id: Google Sheet ID (optional)
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        sheet = spreadsheet.worksheet('stappen')
-        
         if not datum:
             datum = datetime.now().strftime('%d/%m/%Y')
         
-        row = [datum, stappen, cardio]
-        sheet.append_row(row, value_input_option='USER_ENTERED')
+        append_rows('stappen', [[datum, stappen, cardio]], sheet_id)
         return True
         
     except Exception as e:
@@ -179,14 +303,10 @@ def write_to_gewicht(gewicht: float, datum: Optional[str] = None, sheet_id: Opti
         sheet_id: Google Sheet ID (optional)
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        sheet = spreadsheet.worksheet('gewicht')
-        
         if not datum:
             datum = datetime.now().strftime('%d/%m/%Y')
         
-        row = [datum, gewicht]
-        sheet.append_row(row, value_input_option='USER_ENTERED')
+        append_rows('gewicht', [[datum, gewicht]], sheet_id)
         return True
         
     except Exception as e:
@@ -207,15 +327,21 @@ def write_to_metingen(data: Dict[str, Any], datum: Optional[str] = None, sheet_i
     }
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        sheet = spreadsheet.worksheet('metingen')
+        sheet_id = resolve_sheet_id(sheet_id)
+        backend = get_backend()
+        values = backend.read_values(sheet_id, 'metingen')
+        if values is None:
+            raise ValueError("Tabblad 'metingen' bestaat niet")
         
         if not datum:
             datum = datetime.now().strftime('%d/%m')
         
-        # Haal huidige headers op (eerste rij)
-        headers = sheet.row_values(1)
+        # Huidige headers (eerste rij, zonder lege cellen aan het eind)
+        headers = list(values[0]) if values else []
+        while headers and headers[-1] == '':
+            headers.pop()
         
+        cells = []
         # Check of deze datum al bestaat
         if datum in headers:
             # Update bestaande kolom
@@ -223,17 +349,21 @@ def write_to_metingen(data: Dict[str, Any], datum: Optional[str] = None, sheet_i
         else:
             # Voeg nieuwe kolom toe
             col_index = len(headers) + 1
-            sheet.update_cell(1, col_index, datum)
+            cells.append((1, col_index, datum))
         
-        # Haal categorieën op (eerste kolom)
-        categories = sheet.col_values(1)
+        # Categorieën (eerste kolom)
+        categories = [row[0] if row else '' for row in values]
         
-        # Update elke meting
+        # Update elke meting; onbekende categorieën krijgen een nieuwe rij onderaan
         for category, value in data.items():
-            if category in categories:
-                row_index = categories.index(category) + 1
-                sheet.update_cell(row_index, col_index, value)
-        
+            if category not in categories:
+                categories.append(category)
+                cells.append((len(categories), 1, category))
+            row_index = categories.index(category) + 1
+            cells.append((row_index, col_index, value))
+        
+        # Header, metingen en nieuwe rijen in één batch update
+        backend.update_cells(sheet_id, 'metingen', cells)
         return True
         
     except Exception as e:
@@ -254,49 +384,20 @@ def save_goals(username: str, goals: Dict[str, Any], sheet_id: Optional[str] = N
     }
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        
-        # Probeer doelen sheet te vinden, of maak hem aan
-        try:
-            sheet = spreadsheet.worksheet('doelen')
-        except:
-            # Sheet bestaat niet, maak hem aan
-            sheet = spreadsheet.add_worksheet(title='doelen', rows=100, cols=10)
-            # Voeg headers toe
-            headers = ['gebruiker', 'calories', 'protein', 'carbs', 'fats', 'weight', 'target_weight', 'last_updated']
-            sheet.append_row(headers)
-        
-        # Zoek of gebruiker al bestaat
-        try:
-            cell = sheet.find(username, in_column=1)
-            row_index = cell.row
-            # Update bestaande rij
-            row = [
-                username,
-                goals.get('calories', 2000),
-                goals.get('protein', 160),
-                goals.get('carbs', 180),
-                goals.get('fats', 60),
-                goals.get('weight', 106.2),
-                goals.get('target_weight', 85.0),
-                datetime.now().strftime('%d/%m/%Y %H:%M')
-            ]
-            sheet.delete_rows(row_index)
-            sheet.insert_row(row, row_index)
-        except:
-            # Gebruiker bestaat niet, voeg nieuwe rij toe
-            row = [
-                username,
-                goals.get('calories', 2000),
-                goals.get('protein', 160),
-                goals.get('carbs', 180),
-                goals.get('fats', 60),
-                goals.get('weight', 106.2),
-                goals.get('target_weight', 85.0),
-                datetime.now().strftime('%d/%m/%Y %H:%M')
-            ]
-            sheet.append_row(row, value_input_option='USER_ENTERED')
+        sheet_id = resolve_sheet_id(sheet_id)
         
+        row = [
+            username,
+            goals.get('calories', 2000),
+            goals.get('protein', 160),
+            goals.get('carbs', 180),
+            goals.get('fats', 60),
+            goals.get('weight', 106.2),
+            goals.get('target_weight', 85.0),
+            datetime.now().strftime('%d/%m/%Y %H:%M')
+        ]
+        # Bestaande rij van de gebruiker vervangen, anders toevoegen (doelen sheet wordt zo nodig aangemaakt)
+        get_backend().upsert_row(sheet_id, 'doelen', row)
         return True
         
     except Exception as e:
@@ -310,19 +411,14 @@ def load_goals(username: str, sheet_id: Optional[str] = None) -> Optional[Dict[s
         Dict met goals of None als niet gevonden
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
+        sheet_id = resolve_sheet_id(sheet_id)
         
-        try:
-            sheet = spreadsheet.worksheet('doelen')
-        except:
-            # Sheet bestaat niet
+        # Zoek gebruiker (None als de sheet of de gebruiker niet bestaat)
+        row_data = get_backend().find_row(sheet_id, 'doelen', [username])
+        if row_data is None:
             return None
         
-        # Zoek gebruiker
         try:
-            cell = sheet.find(username, in_column=1)
-            row_data = sheet.row_values(cell.row)
-            
             # Parse row data
             goals = {
                 'calories': int(float(row_data[1])) if len(row_data) > 1 and row_data[1] else 2000,
@@ -334,7 +430,7 @@ def load_goals(username: str, sheet_id: Optional[str] = None) -> Optional[Dict[s
             }
             return goals
         except:
-            # Gebruiker niet gevonden
+            # Onleesbare rij
             return None
         
     except Exception as e:
@@ -393,41 +489,8 @@ def save_favorite_meal(username: str, meal_name: str, meal_data: dict, sheet_id:
         bool: True if successful
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        
-        # Zoek of maak favorieten sheet
-        try:
-            sheet = spreadsheet.worksheet('favorieten')
-        except:
-            # Sheet bestaat niet, maak hem aan
-            sheet = spreadsheet.add_worksheet(title='favorieten', rows=100, cols=10)
-            headers = ['gebruiker', 'naam', 'omschrijving', 'calorien', 'eiwit', 'koolhydraten', 'vetten', 'maaltijd_type', 'created']
-            sheet.append_row(headers)
-        
-        # Check of deze naam al bestaat voor gebruiker
-        try:
-            all_values = sheet.get_all_values()
-            for i, row in enumerate(all_values[1:], start=2):  # Skip header
-                if row[0] == username and row[1] == meal_name:
-                    # Update bestaande favoriet
-                    new_row = [
-                        username,
-                        meal_name,
-                        meal_data.get('omschrijving', ''),
-                        meal_data.get('calorien', 0),
-                        meal_data.get('eiwit', 0),
-                        meal_data.get('koolhydraten', 0),
-                        meal_data.get('vetten', 0),
-                        meal_data.get('maaltijd', 'Tussendoor'),
-                        datetime.now().strftime('%d/%m/%Y %H:%M')
-                    ]
-                    sheet.delete_rows(i)
-                    sheet.insert_row(new_row, i)
-                    return True
-        except:
-            pass
+        sheet_id = resolve_sheet_id(sheet_id)
         
-        # Voeg nieuwe favoriet toe
         row = [
             username,
             meal_name,
@@ -439,7 +502,8 @@ def save_favorite_meal(username: str, meal_name: str, meal_data: dict, sheet_id:
             meal_data.get('maaltijd', 'Tussendoor'),
             datetime.now().strftime('%d/%m/%Y %H:%M')
         ]
-        sheet.append_row(row, value_input_option='USER_ENTERED')
+        # Favoriet met dezelfde gebruiker en naam vervangen, anders toevoegen
+        get_backend().upsert_row(sheet_id, 'favorieten', row, key_columns=2)
         return True
         
     except Exception as e:
@@ -458,15 +522,8 @@ def load_favorite_meals(username: str, sheet_id: str = None):
         list: List of dicts met favorite meals, of lege list
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        
-        try:
-            sheet = spreadsheet.worksheet('favorieten')
-        except:
-            return []
-        
-        all_values = sheet.get_all_values()
-        if len(all_values) <= 1:  # Only headers or empty
+        all_values = get_backend().read_values(resolve_sheet_id(sheet_id), 'favorieten')
+        if not all_values or len(all_values) <= 1:  # No sheet, only headers or empty
             return []
         
         headers = all_values[0]
@@ -504,15 +561,8 @@ def get_recent_meals(username: str, sheet_id: str = None, limit: int = 5):
         list: List of unique meal descriptions
     """
     try:
-        spreadsheet = get_spreadsheet(sheet_id)
-        
-        try:
-            sheet = spreadsheet.worksheet('voeding')
-        except:
-            return []
-        
-        all_values = sheet.get_all_values()
-        if len(all_values) <= 1:
+        all_values = get_backend().read_values(resolve_sheet_id(sheet_id), 'voeding')
+        if not all_values or len(all_values) <= 1:
             return []
         
         # Get most recent entries (reverse order)
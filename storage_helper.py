@@ -0,0 +1,571 @@
+"""
+Helper functies voor de opslag van de tabbladen
+Eén interface (`StorageBackend`) voor lezen en schrijven, met twee implementaties:
+Google Sheets (lezen via de gviz CSV export, schrijven via gspread) en een lokale
+SQLite database met een index op datum en op de eerste kolom. SQLite is bedoeld
+als snelle primaire opslag voor self-hosted installaties en voor tests en load runs
+zonder netwerk.
+
+Kies de opslag met STORAGE_BACKEND=sheets (default) of STORAGE_BACKEND=sqlite.
+
+Een Google Sheet overzetten naar SQLite: python storage_helper.py <sheet_id>
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import data_helper
+import quota_helper
+import schema_helper
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sheets').lower()
+
+# Database bestand voor STORAGE_BACKEND=sqlite
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join('.cache', 'sport.db'))
+
+# Kolommen per tabblad, zoals sheets_helper ze schrijft (voor tabbladen die nog niet bestaan)
+TAB_HEADERS: Dict[str, List[str]] = {
+    'voeding': ['datum', 'maaltijd', 'omschrijving', 'calorien', 'eiwit', 'koolhydraten', 'vetten', 'vezels'],
+    'activiteiten': ['datum', 'activiteit', 'type', 'gewicht', 'afstand', 'duur', 'sets', 'reps', 'methode'],
+    'stappen': ['datum', 'stappen', 'cardio'],
+    'gewicht': ['datum', 'gewicht'],
+    'metingen': ['categorie'],
+    'doelen': ['gebruiker', 'calories', 'protein', 'carbs', 'fats', 'weight', 'target_weight', 'last_updated'],
+    'favorieten': ['gebruiker', 'naam', 'omschrijving', 'calorien', 'eiwit', 'koolhydraten', 'vetten', 'maaltijd_type', 'created'],
+}
+
+# Cel (rij, kolom, waarde), 1-based zoals in de sheet (rij 1 is de header)
+Cell = Tuple[int, int, Any]
+
+# Aantal rijen na een batch dat `has_rows` ook doorzoekt (rijen die een ander proces er later onder zette)
+HAS_ROWS_SLACK = 50
+
+def _cell_text(value: Any) -> str:
+    """Tekst zoals de CSV export een geschreven waarde teruggeeft"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value)
+
+def _matches(row: Sequence[Any], key: Sequence[Any]) -> bool:
+    """True als de eerste cellen van de rij gelijk zijn aan de key"""
+    return len(row) >= len(key) and all(_cell_text(row[i]) == _cell_text(k) for i, k in enumerate(key))
+
+def _same_cell(written: Any, stored: Any) -> bool:
+    """True als een geschreven waarde en de tekst in de sheet dezelfde waarde zijn (USER_ENTERED kan getallen en datums anders opmaken)"""
+    written, stored = _cell_text(written).strip(), _cell_text(stored).strip()
+    if written == stored:
+        return True
+    try:
+        return float(written.replace(',', '.')) == float(stored.replace(',', '.'))
+    except ValueError:
+        pass
+    return bool(schema_helper.to_day(written) == schema_helper.to_day(stored))
+
+def _same_row(stored: Sequence[Any], written: Sequence[Any]) -> bool:
+    stored = list(stored) + [''] * max(0, len(written) - len(stored))
+    return all(_same_cell(value, stored[i]) for i, value in enumerate(written))
+
+def _filter_range(df: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Rijen van een ruwe tekst-DataFrame met een 'datum' tussen `start` en `end` (inclusief)"""
+    if df.empty or 'datum' not in df.columns:
+        return df.iloc[0:0]
+    dates = schema_helper.parse_dates(df['datum'])
+    mask = (dates >= schema_helper.to_day(start)) & (dates <= schema_helper.to_day(end))
+    return df[mask].reset_index(drop=True)
+
+def _column_runs(cells: List[Cell]) -> List[Tuple[int, int, List[Any]]]:
+    """
+    Groepeer cellen tot aaneengesloten stukken van één kolom: (eerste rij, kolom, waarden)
+
+    Een cel die meerdere keren voorkomt krijgt de laatste waarde.
+    """
+    latest = {(row, col): value for row, col, value in cells}
+    runs = []
+    for (row, col) in sorted(latest, key=lambda cell: (cell[1], cell[0])):
+        if runs and runs[-1][1] == col and runs[-1][0] + len(runs[-1][2]) == row:
+            runs[-1][2].append(latest[(row, col)])
+        else:
+            runs.append((row, col, [latest[(row, col)]]))
+    return runs
+
+class StorageBackend:
+    """
+    Interface voor de opslag van de tabbladen van één of meer sheets
+
+    Gelezen data is ruw: alle waarden als tekst, precies zoals de CSV export ze
+    levert; typeren gebeurt in data_helper / schema_helper.
+    """
+    # True als data_helper lokale Parquet snapshots moet bijhouden (trage, externe opslag)
+    snapshots = False
+
+    def read_tab(self, sheet_id: str, tab: str, timeout: float = data_helper.TAB_TIMEOUT) -> pd.DataFrame:
+        """Heel tabblad als ruwe tekst-DataFrame"""
+        raise NotImplementedError
+
+    def read_range(self, sheet_id: str, tab: str, start, end) -> pd.DataFrame:
+        """Rijen met een 'datum' tussen `start` en `end` (inclusief) als ruwe tekst-DataFrame"""
+        return _filter_range(self.read_tab(sheet_id, tab), start, end)
+
+    def read_values(self, sheet_id: str, tab: str) -> Optional[List[List[str]]]:
+        """Alle rijen inclusief header als lijsten tekst, of None als het tabblad niet bestaat"""
+        raise NotImplementedError
+
+    def find_row(self, sheet_id: str, tab: str, key: Sequence[Any]) -> Optional[List[str]]:
+        """Eerste rij waarvan de eerste cellen gelijk zijn aan `key`, of None"""
+        values = self.read_values(sheet_id, tab) or []
+        return next((row for row in values[1:] if _matches(row, key)), None)
+
+    def has_rows(self, sheet_id: str, tab: str, rows: List[List[Any]]) -> bool:
+        """
+        True als `rows` aaneengesloten en in volgorde onderaan het tabblad staan
+
+        Voor een schrijfactie met onbekende afloop (timeout of 5xx): zo wordt een batch
+        die toch aangekomen is niet nog eens toegevoegd.
+        """
+        if not rows:
+            return True
+        values = (self.read_values(sheet_id, tab) or [])[1:]  # Skip header
+        tail = values[-(len(rows) + HAS_ROWS_SLACK):]
+        return any(all(_same_row(tail[start + i], row) for i, row in enumerate(rows))
+                   for start in range(len(tail) - len(rows), -1, -1))
+
+    def append_row(self, sheet_id: str, tab: str, row: List[Any]):
+        """Voeg één rij toe onderaan het tabblad"""
+        self.append_rows(sheet_id, tab, [row])
+
+    def append_rows(self, sheet_id: str, tab: str, rows: List[List[Any]]):
+        """Voeg meerdere rijen in één keer toe onderaan het tabblad"""
+        raise NotImplementedError
+
+    def upsert_row(self, sheet_id: str, tab: str, row: List[Any], key_columns: int = 1):
+        """
+        Vervang de rij met dezelfde eerste `key_columns` cellen, of voeg de rij toe
+
+        Een tabblad dat nog niet bestaat wordt aangemaakt met de header uit `TAB_HEADERS`.
+        """
+        raise NotImplementedError
+
+    def update_cells(self, sheet_id: str, tab: str, cells: List[Cell]):
+        """Schrijf losse cellen (1-based rij en kolom, rij 1 is de header)"""
+        raise NotImplementedError
+
+    def revision(self, sheet_id: str) -> Optional[str]:
+        """Revisie die verandert bij elke wijziging (zie `data_helper.set_revision_provider`)"""
+        return None
+
+class GoogleSheetsBackend(StorageBackend):
+    """
+    Google Sheets: lezen via de publieke gviz CSV export (met snapshots in data_helper),
+    schrijven en metadata via gspread
+
+    Spreadsheet en Worksheet handles worden per sheet ID bewaard: de eerste actie op
+    een sheet haalt één keer de metadata van alle tabbladen op, daarna kost een
+    schrijfactie alleen nog de API call zelf.
+
+    Voor `upsert_row` wordt per tabblad een index key -> rijnummer bijgehouden; een
+    bekende key wordt na een controle van de key cellen van die rij (rijen kunnen
+    verschoven zijn door handmatige wijzigingen of een ander proces) met één range
+    update op zijn plek overschreven. Een onbekende key, een index ouder dan
+    `CACHE_TTL` of een rij die niet meer klopt kost een scan van het tabblad.
+
+    Args:
+        get_client: Functie die een (gedeelde) geautoriseerde gspread client teruggeeft
+    """
+    snapshots = True
+
+    def __init__(self, get_client: Callable[[], Any]):
+        self.get_client = get_client
+        self._lock = threading.Lock()
+        self._spreadsheets = {}  # sheet_id -> Spreadsheet
+        self._worksheets = {}    # sheet_id -> (loaded_at, {tab: Worksheet})
+        self._row_indexes = {}   # (sheet_id, tab, key_columns) -> (loaded_at, {key: rijnummer})
+
+    def spreadsheet(self, sheet_id: str):
+        with self._lock:
+            spreadsheet = self._spreadsheets.get(sheet_id)
+        if spreadsheet is None:
+            spreadsheet = quota_helper.call('read', lambda: self.get_client().open_by_key(sheet_id))
+            with self._lock:
+                self._spreadsheets[sheet_id] = spreadsheet
+        return spreadsheet
+
+    def worksheet(self, sheet_id: str, tab: str, create: bool = False):
+        """Het tabblad, of None als het niet bestaat (met `create` wordt het aangemaakt)"""
+        with self._lock:
+            loaded_at, worksheets = self._worksheets.get(sheet_id, (0.0, None))
+        # Een ontbrekend tabblad kan intussen aangemaakt zijn: metadata hooguit eens per TTL opnieuw ophalen
+        if worksheets is None or (tab not in worksheets and time.time() - loaded_at > data_helper.CACHE_TTL):
+            # Eén metadata call voor alle tabbladen
+            spreadsheet = self.spreadsheet(sheet_id)
+            worksheets = {sheet.title: sheet for sheet in quota_helper.call('read', spreadsheet.worksheets)}
+            with self._lock:
+                self._worksheets[sheet_id] = (time.time(), worksheets)
+        sheet = worksheets.get(tab)
+        if sheet is not None or not create:
+            return sheet
+
+        spreadsheet = self.spreadsheet(sheet_id)
+        sheet = quota_helper.call('write', lambda: spreadsheet.add_worksheet(title=tab, rows=100, cols=10),
+                                  idempotent=False)
+        quota_helper.call('write', lambda: sheet.append_row(TAB_HEADERS[tab]), idempotent=False)
+        with self._lock:
+            worksheets[tab] = sheet
+        return sheet
+
+    def forget(self, sheet_id: Optional[str] = None):
+        """Vergeet de handles van één sheet (of alle sheets), bijv. na een verwijderd tabblad"""
+        with self._lock:
+            if sheet_id is None:
+                self._spreadsheets.clear()
+                self._worksheets.clear()
+                self._row_indexes.clear()
+            else:
+                self._spreadsheets.pop(sheet_id, None)
+                self._worksheets.pop(sheet_id, None)
+                for index_key in [k for k in self._row_indexes if k[0] == sheet_id]:
+                    del self._row_indexes[index_key]
+
+    def _on_sheet(self, sheet_id: str, tab: str, action: Callable[[Any], Any],
+                  create: bool = False, required: bool = True):
+        """
+        Voer `action(worksheet)` uit met de gecachte handle
+
+        De API calls in `action` gaan zelf via `quota_helper.call` (rate limit en retries).
+        Bij een 400/404 (tabblad verwijderd of hernoemd sinds de handle bewaard is), of
+        als een verplicht tabblad niet in de bewaarde metadata staat, worden de handles
+        vergeten en wordt het één keer opnieuw geprobeerd. Zo'n verzoek is door de API
+        geweigerd, dus er wordt niets dubbel geschreven.
+
+        Args:
+            required: Geef WorksheetNotFound als het tabblad niet bestaat (anders krijgt
+                `action` None)
+        """
+        import gspread
+
+        def attempt():
+            sheet = self.worksheet(sheet_id, tab, create)
+            if sheet is None and required:
+                raise gspread.WorksheetNotFound(tab)
+            return action(sheet)
+
+        try:
+            return attempt()
+        except (gspread.WorksheetNotFound, gspread.exceptions.APIError) as e:
+            if isinstance(e, gspread.exceptions.APIError) and getattr(e.response, 'status_code', None) not in (400, 404):
+                raise
+            print(f"DEBUG: Handle van {tab} verouderd, metadata opnieuw ophalen: {e}")
+            self.forget(sheet_id)
+            return attempt()
+
+    def read_tab(self, sheet_id: str, tab: str, timeout: float = data_helper.TAB_TIMEOUT) -> pd.DataFrame:
+        return data_helper.fetch_tab(sheet_id, tab, timeout)
+
+    def read_values(self, sheet_id: str, tab: str) -> Optional[List[List[str]]]:
+        return self._on_sheet(sheet_id, tab, lambda sheet: quota_helper.call('read', sheet.get_all_values)
+                              if sheet is not None else None, required=False)
+
+    def find_row(self, sheet_id: str, tab: str, key: Sequence[Any]) -> Optional[List[str]]:
+        if len(key) != 1:
+            return super().find_row(sheet_id, tab, key)
+
+        def find(sheet):
+            if sheet is None:
+                return None
+            cell = quota_helper.call('read', lambda: sheet.find(_cell_text(key[0]), in_column=1))
+            return quota_helper.call('read', lambda: sheet.row_values(cell.row)) if cell is not None else None
+
+        return self._on_sheet(sheet_id, tab, find, required=False)
+
+    def append_rows(self, sheet_id: str, tab: str, rows: List[List[Any]]):
+        # USER_ENTERED zodat datums als datums worden opgeslagen
+        self._on_sheet(sheet_id, tab, lambda sheet: quota_helper.call(
+            'write', lambda: sheet.append_rows(rows, value_input_option='USER_ENTERED'), idempotent=False))
+
+    def _indexed_row(self, sheet_id: str, tab: str, key_columns: int, key: tuple) -> Optional[int]:
+        """Rijnummer van een key uit een verse index (None als onbekend of verlopen)"""
+        with self._lock:
+            loaded_at, index = self._row_indexes.get((sheet_id, tab, key_columns), (0.0, {}))
+        if time.time() - loaded_at > data_helper.CACHE_TTL:
+            return None
+        return index.get(key)
+
+    def _row_holds(self, sheet, row_nr: int, key: tuple) -> bool:
+        """True als rij `row_nr` in de sheet nog de key cellen `key` heeft"""
+        from gspread.utils import rowcol_to_a1
+        target = f"{rowcol_to_a1(row_nr, 1)}:{rowcol_to_a1(row_nr, len(key))}"
+        values = quota_helper.call('read', lambda: sheet.get(target))
+        cells = list(values[0]) if values else []
+        return tuple(_cell_text(cell) for cell in (cells + [''] * len(key))[:len(key)]) == key
+
+    def _scan_rows(self, sheet, sheet_id: str, tab: str, key_columns: int) -> Dict[tuple, int]:
+        """Bouw de index key -> rijnummer opnieuw op uit het hele tabblad (bij dubbele keys telt de eerste)"""
+        index = {}
+        for i, existing in enumerate(quota_helper.call('read', sheet.get_all_values)[1:], start=2):  # Skip header
+            index.setdefault(tuple(_cell_text(cell) for cell in existing[:key_columns]), i)
+        with self._lock:
+            self._row_indexes[(sheet_id, tab, key_columns)] = (time.time(), index)
+        return index
+
+    def _remember_row(self, sheet_id: str, tab: str, key_columns: int, key: tuple, row_nr: Optional[int]):
+        with self._lock:
+            entry = self._row_indexes.get((sheet_id, tab, key_columns))
+            if entry is None:
+                return
+            if row_nr is None:
+                # Positie onbekend: de volgende upsert scant opnieuw
+                del self._row_indexes[(sheet_id, tab, key_columns)]
+            else:
+                entry[1][key] = row_nr
+
+    def upsert_row(self, sheet_id: str, tab: str, row: List[Any], key_columns: int = 1):
+        from gspread.utils import rowcol_to_a1
+        key = tuple(_cell_text(cell) for cell in row[:key_columns])
+
+        def upsert(sheet):
+            row_nr = self._indexed_row(sheet_id, tab, key_columns, key)
+            if row_nr is not None and not self._row_holds(sheet, row_nr, key):
+                # Rijen verschoven sinds de index gemaakt is: nooit een niet-gecontroleerde rij overschrijven
+                print(f"DEBUG: Rij {row_nr} van {tab} bevat de key niet meer, index opnieuw opbouwen")
+                row_nr = None
+            if row_nr is None:
+                row_nr = self._scan_rows(sheet, sheet_id, tab, key_columns).get(key)
+            if row_nr is not None:
+                # Rij op zijn plek overschrijven: één range update, geen verschuiving van andere rijen
+                target = f"{rowcol_to_a1(row_nr, 1)}:{rowcol_to_a1(row_nr, len(row))}"
+                quota_helper.call('write', lambda: sheet.update([row], target, value_input_option='USER_ENTERED'))
+                return
+            response = quota_helper.call('write', lambda: sheet.append_row(row, value_input_option='USER_ENTERED'),
+                                         idempotent=False)
+            # Bijv. {'updates': {'updatedRange': "'doelen'!A5:H5"}}
+            updated = (response or {}).get('updates', {}).get('updatedRange', '')
+            match = re.search(r'!\$?[A-Z]+\$?(\d+)', updated)
+            self._remember_row(sheet_id, tab, key_columns, key, int(match.group(1)) if match else None)
+
+        self._on_sheet(sheet_id, tab, upsert, create=True)
+
+    def update_cells(self, sheet_id: str, tab: str, cells: List[Cell]):
+        if not cells:
+            return
+        from gspread.utils import rowcol_to_a1
+
+        # Eén values.batchUpdate request met een range per aaneengesloten stuk kolom
+        data = [{'range': f"{rowcol_to_a1(row, col)}:{rowcol_to_a1(row + len(values) - 1, col)}",
+                 'values': [[value] for value in values]}
+                for row, col, values in _column_runs(cells)]
+        self._on_sheet(sheet_id, tab, lambda sheet: quota_helper.call(
+            'write', lambda: sheet.batch_update(data, value_input_option='USER_ENTERED')))
+
+    def revision(self, sheet_id: str) -> Optional[str]:
+        # Eén lichte Drive metadata call
+        return quota_helper.call('read', lambda: self.get_client().get_file_drive_metadata(sheet_id))['modifiedTime']
+
+class SQLiteBackend(StorageBackend):
+    """
+    Lokale SQLite opslag van alle tabbladen in één database bestand
+
+    Elke rij staat als JSON lijst met tekst in `rows`, met het sheet rijnummer, de
+    geparste datum (ISO, geïndexeerd voor `read_range`) en de eerste cel (geïndexeerd
+    voor `find_row` en `upsert_row`). Elke schrijfactie verhoogt de revisie van de sheet.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tabs (
+                    sheet_id TEXT NOT NULL, tab TEXT NOT NULL, header TEXT NOT NULL,
+                    PRIMARY KEY (sheet_id, tab));
+                CREATE TABLE IF NOT EXISTS rows (
+                    sheet_id TEXT NOT NULL, tab TEXT NOT NULL, row_nr INTEGER NOT NULL,
+                    day TEXT, key TEXT, cells TEXT NOT NULL,
+                    PRIMARY KEY (sheet_id, tab, row_nr));
+                CREATE INDEX IF NOT EXISTS rows_by_day ON rows (sheet_id, tab, day);
+                CREATE INDEX IF NOT EXISTS rows_by_key ON rows (sheet_id, tab, key);
+                CREATE TABLE IF NOT EXISTS revisions (
+                    sheet_id TEXT PRIMARY KEY, revision INTEGER NOT NULL);
+            """)
+
+    def _header(self, sheet_id: str, tab: str) -> Optional[List[str]]:
+        found = self._conn.execute(
+            "SELECT header FROM tabs WHERE sheet_id = ? AND tab = ?", (sheet_id, tab)).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def _ensure_tab(self, sheet_id: str, tab: str) -> List[str]:
+        header = self._header(sheet_id, tab)
+        if header is None:
+            header = list(TAB_HEADERS.get(tab, []))
+            self._set_header(sheet_id, tab, header)
+        return header
+
+    def _set_header(self, sheet_id: str, tab: str, header: List[str]):
+        self._conn.execute("INSERT OR REPLACE INTO tabs (sheet_id, tab, header) VALUES (?, ?, ?)",
+                           (sheet_id, tab, json.dumps(header)))
+
+    def _bump(self, sheet_id: str):
+        self._conn.execute("""
+            INSERT INTO revisions (sheet_id, revision) VALUES (?, 1)
+            ON CONFLICT (sheet_id) DO UPDATE SET revision = revision + 1""", (sheet_id,))
+
+    @staticmethod
+    def _row_record(header: List[str], row: Sequence[Any]) -> Tuple[Optional[str], str, str]:
+        """(day, key, cells) voor een rij"""
+        cells = [_cell_text(value) for value in row]
+        day = None
+        if 'datum' in header and header.index('datum') < len(cells):
+            parsed = schema_helper.parse_dates(pd.Series([cells[header.index('datum')]]))[0]
+            day = None if pd.isna(parsed) else parsed.strftime('%Y-%m-%d')
+        key = cells[0] if cells else ''
+        return day, key, json.dumps(cells)
+
+    def _next_row_nr(self, sheet_id: str, tab: str) -> int:
+        found = self._conn.execute("SELECT MAX(row_nr) FROM rows WHERE sheet_id = ? AND tab = ?",
+                                   (sheet_id, tab)).fetchone()
+        return (found[0] or 1) + 1
+
+    def _frame(self, header: List[str], records: List[Tuple[str]]) -> pd.DataFrame:
+        rows = [json.loads(cells) for (cells,) in records]
+        width = len(header)
+        rows = [(row + [''] * width)[:width] for row in rows]
+        return pd.DataFrame(rows, columns=header, dtype=str)
+
+    def read_tab(self, sheet_id: str, tab: str, timeout: float = data_helper.TAB_TIMEOUT) -> pd.DataFrame:
+        with self._lock:
+            header = self._header(sheet_id, tab)
+            if header is None:
+                return pd.DataFrame(columns=TAB_HEADERS.get(tab, []), dtype=str)
+            records = self._conn.execute(
+                "SELECT cells FROM rows WHERE sheet_id = ? AND tab = ? ORDER BY row_nr",
+                (sheet_id, tab)).fetchall()
+        return self._frame(header, records)
+
+    def read_range(self, sheet_id: str, tab: str, start, end) -> pd.DataFrame:
+        start_day = schema_helper.to_day(start).strftime('%Y-%m-%d')
+        end_day = schema_helper.to_day(end).strftime('%Y-%m-%d')
+        with self._lock:
+            header = self._header(sheet_id, tab)
+            if header is None:
+                return pd.DataFrame(columns=TAB_HEADERS.get(tab, []), dtype=str)
+            records = self._conn.execute(
+                "SELECT cells FROM rows WHERE sheet_id = ? AND tab = ? AND day BETWEEN ? AND ? ORDER BY row_nr",
+                (sheet_id, tab, start_day, end_day)).fetchall()
+        return self._frame(header, records)
+
+    def read_values(self, sheet_id: str, tab: str) -> Optional[List[List[str]]]:
+        with self._lock:
+            header = self._header(sheet_id, tab)
+            if header is None:
+                return None
+            records = self._conn.execute(
+                "SELECT cells FROM rows WHERE sheet_id = ? AND tab = ? ORDER BY row_nr",
+                (sheet_id, tab)).fetchall()
+        return [header] + [json.loads(cells) for (cells,) in records]
+
+    def find_row(self, sheet_id: str, tab: str, key: Sequence[Any]) -> Optional[List[str]]:
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT cells FROM rows WHERE sheet_id = ? AND tab = ? AND key = ? ORDER BY row_nr",
+                (sheet_id, tab, _cell_text(key[0]))).fetchall()
+        rows = [json.loads(cells) for (cells,) in records]
+        return next((row for row in rows if _matches(row, key)), None)
+
+    def append_rows(self, sheet_id: str, tab: str, rows: List[List[Any]]):
+        with self._lock, self._conn:
+            header = self._ensure_tab(sheet_id, tab)
+            row_nr = self._next_row_nr(sheet_id, tab)
+            self._conn.executemany(
+                "INSERT INTO rows (sheet_id, tab, row_nr, day, key, cells) VALUES (?, ?, ?, ?, ?, ?)",
+                [(sheet_id, tab, row_nr + i, *self._row_record(header, row)) for i, row in enumerate(rows)])
+            self._bump(sheet_id)
+
+    def upsert_row(self, sheet_id: str, tab: str, row: List[Any], key_columns: int = 1):
+        key = row[:key_columns]
+        with self._lock, self._conn:
+            header = self._ensure_tab(sheet_id, tab)
+            candidates = self._conn.execute(
+                "SELECT row_nr, cells FROM rows WHERE sheet_id = ? AND tab = ? AND key = ? ORDER BY row_nr",
+                (sheet_id, tab, _cell_text(key[0]))).fetchall()
+            row_nr = next((nr for nr, cells in candidates if _matches(json.loads(cells), key)), None)
+            if row_nr is None:
+                row_nr = self._next_row_nr(sheet_id, tab)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rows (sheet_id, tab, row_nr, day, key, cells) VALUES (?, ?, ?, ?, ?, ?)",
+                (sheet_id, tab, row_nr, *self._row_record(header, row)))
+            self._bump(sheet_id)
+
+    def update_cells(self, sheet_id: str, tab: str, cells: List[Cell]):
+        with self._lock, self._conn:
+            header = self._ensure_tab(sheet_id, tab)
+            for row_nr, col, value in cells:
+                if row_nr == 1:
+                    header = (header + [''] * col)[:max(len(header), col)]
+                    header[col - 1] = _cell_text(value)
+                    self._set_header(sheet_id, tab, header)
+                    continue
+                found = self._conn.execute(
+                    "SELECT cells FROM rows WHERE sheet_id = ? AND tab = ? AND row_nr = ?",
+                    (sheet_id, tab, row_nr)).fetchone()
+                row = json.loads(found[0]) if found else []
+                row = (row + [''] * col)[:max(len(row), col)]
+                row[col - 1] = value
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rows (sheet_id, tab, row_nr, day, key, cells) VALUES (?, ?, ?, ?, ?, ?)",
+                    (sheet_id, tab, row_nr, *self._row_record(header, row)))
+            self._bump(sheet_id)
+
+    def revision(self, sheet_id: str) -> Optional[str]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT revision FROM revisions WHERE sheet_id = ?", (sheet_id,)).fetchone()
+        return str(found[0] if found else 0)
+
+    def import_values(self, sheet_id: str, tab: str, values: List[List[Any]]):
+        """Vervang een heel tabblad (header + rijen), bijv. bij het overzetten van een Google Sheet"""
+        if not values:
+            return
+        header = [_cell_text(value) for value in values[0]]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rows WHERE sheet_id = ? AND tab = ?", (sheet_id, tab))
+            self._set_header(sheet_id, tab, header)
+            self._conn.executemany(
+                "INSERT INTO rows (sheet_id, tab, row_nr, day, key, cells) VALUES (?, ?, ?, ?, ?, ?)",
+                [(sheet_id, tab, row_nr, *self._row_record(header, row))
+                 for row_nr, row in enumerate(values[1:], start=2)])
+            self._bump(sheet_id)
+
+def create_backend(get_client: Optional[Callable[[], Any]] = None) -> StorageBackend:
+    """
+    Maak de backend uit STORAGE_BACKEND
+
+    Args:
+        get_client: gspread client factory, nodig voor de Google Sheets backend
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        return SQLiteBackend(SQLITE_PATH)
+    if STORAGE_BACKEND != 'sheets':
+        raise ValueError(f"Onbekende STORAGE_BACKEND: {STORAGE_BACKEND} (kies 'sheets' of 'sqlite')")
+    return GoogleSheetsBackend(get_client)
+
+def copy_sheet(source: StorageBackend, target: SQLiteBackend, sheet_id: str,
+               tabs: Optional[List[str]] = None):
+    """Kopieer de tabbladen van een sheet naar SQLite (tabbladen die niet bestaan worden overgeslagen)"""
+    for tab in tabs or data_helper.SHEET_TABS + ['favorieten']:
+        values = source.read_values(sheet_id, tab)
+        if values is None:
+            print(f"DEBUG: Tabblad {tab} bestaat niet, overgeslagen")
+            continue
+        target.import_values(sheet_id, tab, values)
+        print(f"DEBUG: {tab}: {len(values) - 1} rijen gekopieerd")
+
+if __name__ == '__main__':
+    import sheets_helper
+    copy_sheet(GoogleSheetsBackend(sheets_helper.get_sheets_client), SQLiteBackend(SQLITE_PATH), sys.argv[1])